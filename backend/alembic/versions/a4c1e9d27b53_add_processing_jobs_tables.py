@@ -0,0 +1,66 @@
+"""add_processing_jobs_tables
+
+Revision ID: a4c1e9d27b53
+Revises: 3239b25c9bf5
+Create Date: 2026-10-16 10:12:41.503118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4c1e9d27b53'
+down_revision = '3239b25c9bf5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Create processing_jobs table
+    op.create_table(
+        'processing_jobs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('job_type', sa.String(length=50), nullable=False),
+        sa.Column('status', sa.Enum('QUEUED', 'RUNNING', 'COMPLETED', 'FAILED', name='jobstatus'), nullable=False),
+        sa.Column('created_by', sa.Integer(), nullable=True),
+        sa.Column('error_message', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True, server_default=sa.text('CURRENT_TIMESTAMP')),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.Column('heartbeat_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['created_by'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_processing_jobs_id'), 'processing_jobs', ['id'], unique=False)
+    op.create_index(op.f('ix_processing_jobs_status'), 'processing_jobs', ['status'], unique=False)
+
+    # Create processing_job_items table (one row per document, holds the chunk checkpoint)
+    op.create_table(
+        'processing_job_items',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('job_id', sa.Integer(), nullable=False),
+        sa.Column('document_id', sa.Integer(), nullable=False),
+        sa.Column('status', sa.Enum('QUEUED', 'RUNNING', 'COMPLETED', 'FAILED', name='jobstatus'), nullable=False),
+        sa.Column('completed_chunks', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('total_chunks', sa.Integer(), nullable=True),
+        sa.Column('error_message', sa.Text(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['job_id'], ['processing_jobs.id'], ),
+        sa.ForeignKeyConstraint(['document_id'], ['documents.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_processing_job_items_id'), 'processing_job_items', ['id'], unique=False)
+    op.create_index(op.f('ix_processing_job_items_job_id'), 'processing_job_items', ['job_id'], unique=False)
+    op.create_index(op.f('ix_processing_job_items_document_id'), 'processing_job_items', ['document_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_processing_job_items_document_id'), table_name='processing_job_items')
+    op.drop_index(op.f('ix_processing_job_items_job_id'), table_name='processing_job_items')
+    op.drop_index(op.f('ix_processing_job_items_id'), table_name='processing_job_items')
+    op.drop_table('processing_job_items')
+    op.drop_index(op.f('ix_processing_jobs_status'), table_name='processing_jobs')
+    op.drop_index(op.f('ix_processing_jobs_id'), table_name='processing_jobs')
+    op.drop_table('processing_jobs')
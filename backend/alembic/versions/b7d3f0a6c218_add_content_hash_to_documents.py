@@ -0,0 +1,27 @@
+"""add_content_hash_to_documents
+
+Revision ID: b7d3f0a6c218
+Revises: a4c1e9d27b53
+Create Date: 2026-10-16 11:04:27.318842
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d3f0a6c218'
+down_revision = 'a4c1e9d27b53'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Add content_hash column to documents table (backfill with backfill_content_hashes.py)
+    op.add_column('documents', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    op.create_index(op.f('ix_documents_content_hash'), 'documents', ['content_hash'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_documents_content_hash'), table_name='documents')
+    op.drop_column('documents', 'content_hash')
@@ -0,0 +1,27 @@
+"""add_draft_quote_to_enquiries
+
+Revision ID: c3e8a1f49d27
+Revises: b7d3f0a6c218
+Create Date: 2026-10-16 14:22:09.571204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3e8a1f49d27'
+down_revision = 'b7d3f0a6c218'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Stored draft quote and the fingerprint of the inputs it was computed from
+    op.add_column('enquiries', sa.Column('draft_quote', sa.JSON(), nullable=True))
+    op.add_column('enquiries', sa.Column('draft_quote_fingerprint', sa.String(length=64), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('enquiries', 'draft_quote_fingerprint')
+    op.drop_column('enquiries', 'draft_quote')
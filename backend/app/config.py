@@ -14,6 +14,80 @@ class Settings(BaseSettings):
     CHROMA_PERSIST_DIR: str = "./chroma_db"
     CHROMA_COLLECTION_NAME: str = "ezzo_knowledge_base"
     
+    # Embedding backend: "openai", "hashing" (local, no downloads) or "sentence_transformers" (local, optional package).
+    # Each backend/model has its own collection; copy vectors over with migrate_embeddings.py before switching.
+    EMBEDDING_BACKEND: str = "openai"
+    OPENAI_EMBEDDING_MODEL: str = "text-embedding-ada-002"
+    HASHING_EMBEDDING_DIMENSION: int = 1024
+    SENTENCE_TRANSFORMER_MODEL: str = "all-MiniLM-L6-v2"
+    
+    # Embeddings (batched requests; OpenAI allows up to 2048 inputs per request)
+    EMBEDDING_BATCH_MAX_TOKENS: int = 100000
+    EMBEDDING_BATCH_MAX_INPUTS: int = 2048
+    
+    # Local embedding cache (SQLite, LRU-evicted)
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_PATH: str = "./embedding_cache/embeddings.sqlite3"
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 50000
+    
+    # Shared OpenAI connection pool and per-model limits (app/services/llm_gateway.py)
+    LLM_HTTP2: bool = True  # Needs the h2 package; falls back to HTTP/1.1 keep-alive without it
+    LLM_MAX_CONNECTIONS: int = 100
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    LLM_KEEPALIVE_EXPIRY_SECONDS: float = 30.0
+    LLM_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    LLM_TIMEOUT_SECONDS: float = 120.0
+    LLM_MODEL_TIMEOUTS: Dict[str, float] = {}  # Per-model overrides, e.g. {"gpt-4o": 60}
+    LLM_DEFAULT_CONCURRENCY: int = 32  # In-flight requests per model
+    LLM_MODEL_CONCURRENCY: Dict[str, int] = {}  # Per-model overrides, e.g. {"text-embedding-ada-002": 8}
+    LLM_QUEUE_TIMEOUT_SECONDS: float = 30.0  # Max wait for a free slot before failing
+    
+    # Response cache for deterministic (temperature=0) classifier calls
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_MAX_ENTRIES: int = 5000
+    LLM_CACHE_TTL_SECONDS: int = 86400
+    LLM_CACHE_PATH: str = "./llm_cache/responses.sqlite3"  # Empty keeps the cache in memory only
+    
+    # Local intent classifier (answers confident cases before calling the LLM)
+    INTENT_CLASSIFIER_ENABLED: bool = True
+    INTENT_CLASSIFIER_THRESHOLD: float = 0.9  # Minimum model probability to skip the LLM
+    INTENT_CLASSIFIER_MIN_EXAMPLES: int = 5  # Learned (not seed) examples per class before the model is trusted
+    INTENT_CLASSIFIER_HISTORY_LIMIT: int = 20000  # Enquiry messages loaded for training at startup
+    
+    # Local parser for decision tree answers (numbers with units, yes/no, choices) before the LLM
+    ANSWER_PARSER_ENABLED: bool = True
+    ANSWER_PARSER_THRESHOLD: float = 0.9  # Minimum parse confidence to skip the LLM
+    
+    # Decision tree turns: "combined" analyzes each reply in one completion,
+    # "multi_call" keeps the separate intent/sideways/drawing/parse calls
+    TREE_TURN_MODE: str = "combined"
+    DECISION_TREE_MAX_PATH_LENGTH: int = 50  # Trees that can ask more questions than this are rejected at save
+    
+    # Draft quotes: worker threads for the concurrent pricing pipeline steps
+    QUOTE_PIPELINE_WORKERS: int = 8
+    # Price index over the prices extracted at ingest time (answers exact/fuzzy item matches without the LLM)
+    PRICE_INDEX_ENABLED: bool = True
+    PRICE_INDEX_FUZZY_THRESHOLD: float = 0.85
+    PRICE_INDEX_REFRESH_SECONDS: int = 60  # Picks up documents ingested by other processes
+    # Business rules are cached in memory; the admin API invalidates its own process immediately
+    RULE_CACHE_REFRESH_SECONDS: int = 60  # Picks up rule changes made through other processes
+    
+    # Ingestion pipeline (match the RPM/TPM limits of your OpenAI account tier)
+    INGESTION_WORKERS: int = 8
+    INGESTION_DOCUMENT_WORKERS: int = 2
+    OPENAI_RPM_LIMIT: int = 500
+    OPENAI_TPM_LIMIT: int = 200000
+    OPENAI_MAX_RETRIES: int = 5
+    OPENAI_BACKOFF_BASE_SECONDS: float = 1.0
+    OPENAI_BACKOFF_MAX_SECONDS: float = 60.0
+    INGESTION_CHECKPOINT_CHUNKS: int = 20  # Chunks stored between job checkpoints
+    EXTRACTION_MODE: str = "multi_row"  # "multi_row" also stores every priced table row; "single" keeps one item per chunk
+    
+    # Background processing jobs
+    JOB_WORKER_ENABLED: bool = True  # Run a worker thread inside the API process (disable when using job_worker.py)
+    JOB_POLL_INTERVAL_SECONDS: float = 2.0
+    JOB_STALE_AFTER_SECONDS: int = 600  # Running jobs without a heartbeat for this long are resumed
+    
     # JWT
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
@@ -27,6 +101,13 @@ class Settings(BaseSettings):
     # File Upload
     UPLOAD_DIR: str = "./uploads"
     MAX_FILE_SIZE: int = 10485760  # 10MB
+    MAX_IMAGE_SIZE: int = 5242880  # 5MB, enquiry image uploads
+    MAX_BULK_UPLOAD_SIZE: int = 524288000  # 500MB per bulk upload request (files and zips together)
+    MAX_ZIP_UNCOMPRESSED_SIZE: int = 1073741824  # 1GB of extracted content per zip archive
+    MAX_ZIP_MEMBERS: int = 1000  # Entries per zip archive (folders included)
+    BULK_IMPORT_DIR: str = "./imports"  # Server-side folders for bulk import must live under here
+    DEDUPLICATE_UPLOADS: bool = True  # Byte-identical uploads share one file and reuse summary/vectors
+    PARSED_TEXT_DIR: str = "./parsed_text"  # Compressed extracted text, keyed by file hash
     
     # Product Drawings (kept for backward compatibility, but unused)
     PRODUCT_DRAWINGS: ClassVar[Dict[str, str]] = {}
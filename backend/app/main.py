@@ -1,4 +1,5 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, status
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
@@ -8,6 +9,9 @@ from app.config import settings
 from app.database import init_db, get_db
 from app.models import User, UserRole
 from app.auth import create_user
+from app.services.job_queue import job_queue
+from app.services.intent_classifier import intent_classifier
+from app.services.file_storage import upload_size_limit
 from app.routers import auth, documents, enquiries, admin, knowledge, decision_trees, business_rules
 
 # Suppress ChromaDB telemetry warnings
@@ -28,6 +32,15 @@ async def lifespan(app: FastAPI):
     # Skip admin user check - handled separately
     print("Admin setup skipped for faster startup")
     
+    # Background worker for document processing jobs
+    if settings.JOB_WORKER_ENABLED:
+        job_queue.start()
+        print("Document processing worker started")
+    
+    # Train the local intent classifier from past enquiries
+    if settings.INTENT_CLASSIFIER_ENABLED:
+        intent_classifier.train_in_background()
+    
     print(f"Server running on http://localhost:8000")
     print(f"API docs available at http://localhost:8000/docs")
     
@@ -35,6 +48,7 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     print("Shutting down...")
+    job_queue.stop()
 
 
 # Create FastAPI app
@@ -45,7 +59,24 @@ app = FastAPI(
     lifespan=lifespan
 )
 
-# CORS middleware
+
+# Reject oversized uploads early
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    """Reject uploads whose declared size is already over the limit, before the body is read"""
+    limit = upload_size_limit(request.url.path)
+    content_length = request.headers.get("content-length")
+    
+    if limit is not None and content_length and content_length.isdigit() and int(content_length) > limit:
+        return JSONResponse(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            content={"detail": f"Upload too large. Max size: {limit} bytes"}
+        )
+    
+    return await call_next(request)
+
+
+# CORS middleware (added last so it also wraps the upload size check)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.cors_origins_list,
@@ -34,6 +34,22 @@ class QuoteStatus(str, enum.Enum):
     SENT_TO_CUSTOMER = "sent_to_customer"
 
 
+class JobStatus(str, enum.Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+# Document status shown while a processing job (or one of its items) is in each state
+JOB_DOCUMENT_STATUS = {
+    JobStatus.QUEUED: DocumentStatus.PROCESSING,
+    JobStatus.RUNNING: DocumentStatus.PROCESSING,
+    JobStatus.COMPLETED: DocumentStatus.PROCESSED,
+    JobStatus.FAILED: DocumentStatus.FAILED,
+}
+
+
 class ProductDocumentType(str, enum.Enum):
     TECHNICAL_DRAWING = "technical_drawing"
     CATALOG = "catalog"
@@ -67,6 +83,7 @@ class Document(Base):
     file_path = Column(String(500), nullable=False)
     file_type = Column(String(50))
     file_size = Column(Integer)
+    content_hash = Column(String(64), index=True)  # SHA-256 of the file; identical uploads share files/vectors
     status = Column(SQLEnum(DocumentStatus), default=DocumentStatus.UPLOADED)
     uploaded_by = Column(Integer, ForeignKey("users.id"))
     summary = Column(Text)
@@ -76,6 +93,7 @@ class Document(Base):
     
     # Relationships
     product_links = relationship("ProductDocument", back_populates="document")
+    job_items = relationship("ProcessingJobItem", back_populates="document", cascade="all, delete-orphan")
 
 
 class ProductDocument(Base):
@@ -151,6 +169,8 @@ class Enquiry(Base):
     status = Column(SQLEnum(EnquiryStatus), default=EnquiryStatus.COLLECTING_INFO)
     collected_data = Column(JSON, default=dict)
     service_tree_id = Column(Integer, ForeignKey("decision_trees.id"), nullable=True)
+    draft_quote = Column(JSON, nullable=True)  # Last computed DraftQuotePreview
+    draft_quote_fingerprint = Column(String(64), nullable=True)  # Inputs it was computed from
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -210,3 +230,38 @@ class AuditLog(Base):
     previous_state = Column(JSON)
     new_state = Column(JSON)
     created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class ProcessingJob(Base):
+    __tablename__ = "processing_jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    job_type = Column(String(50), nullable=False)  # 'process', 'reprocess', 'reprocess_all'
+    status = Column(SQLEnum(JobStatus), default=JobStatus.QUEUED, nullable=False, index=True)
+    created_by = Column(Integer, ForeignKey("users.id"))
+    error_message = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    heartbeat_at = Column(DateTime)  # Refreshed by the worker; a stale heartbeat means the worker died
+    
+    # Relationships
+    items = relationship("ProcessingJobItem", back_populates="job", order_by="ProcessingJobItem.id")
+
+
+class ProcessingJobItem(Base):
+    __tablename__ = "processing_job_items"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(Integer, ForeignKey("processing_jobs.id"), nullable=False, index=True)
+    document_id = Column(Integer, ForeignKey("documents.id", ondelete="CASCADE"), nullable=False, index=True)
+    status = Column(SQLEnum(JobStatus), default=JobStatus.QUEUED, nullable=False)
+    completed_chunks = Column(Integer, default=0, nullable=False)  # Checkpoint - chunks already stored
+    total_chunks = Column(Integer)
+    error_message = Column(Text)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    
+    # Relationships
+    job = relationship("ProcessingJob", back_populates="items")
+    document = relationship("Document", back_populates="job_items")
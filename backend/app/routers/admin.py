@@ -365,7 +365,7 @@ def get_document_content(
     db: Session = Depends(get_db)
 ):
     """Get document content for viewing/editing"""
-    from app.services.document_parser import document_parser
+    from app.services.parsed_text_store import parsed_text_store
     import os
     
     document = db.query(Document).filter(Document.id == document_id).first()
@@ -391,8 +391,8 @@ def get_document_content(
             }
     
     try:
-        # Parse document to get text content
-        text = document_parser.parse_document(document.file_path, document.file_type)
+        # Get text content (parsed once, then served from the parsed text store)
+        text = parsed_text_store.get_text(document.file_path, document.file_type)
         return {"content": text}
     except Exception as e:
         import traceback
@@ -420,6 +420,7 @@ def update_document_content(
 ):
     """Update document content"""
     from app.models import DocumentStatus
+    from app.services.file_storage import write_document_content
     
     document = db.query(Document).filter(Document.id == document_id).first()
     if not document:
@@ -429,12 +430,8 @@ def update_document_content(
         )
     
     try:
-        # Write updated content to file
-        with open(document.file_path, 'w', encoding='utf-8') as f:
-            f.write(content_data['content'])
-        
-        # Update file size
-        document.file_size = len(content_data['content'].encode('utf-8'))
+        # Write updated content to file (updates size and content hash)
+        write_document_content(db, document, content_data['content'])
         
         # Mark as needing reprocessing
         document.status = DocumentStatus.UPLOADED
@@ -453,16 +450,14 @@ def update_document_content(
         )
 
 
-@router.post("/documents/{document_id}/reprocess")
+@router.post("/documents/{document_id}/reprocess", status_code=status.HTTP_202_ACCEPTED)
 def reprocess_document(
     document_id: int,
     current_user: User = Depends(get_current_admin),
     db: Session = Depends(get_db)
 ):
-    """Reprocess a single document"""
-    from app.services.document_parser import document_parser
-    from app.services.vector_store import vector_store
-    from app.models import DocumentStatus
+    """Queue a single document for reprocessing"""
+    from app.services.job_queue import job_queue
     
     document = db.query(Document).filter(Document.id == document_id).first()
     if not document:
@@ -471,110 +466,12 @@ def reprocess_document(
             detail="Document not found"
         )
     
-    # Delete old chunks from vector store first
-    try:
-        vector_store.delete_document_chunks(document.id)
-    except Exception as e:
-        print(f"Warning: Could not delete old chunks for document {document.id}: {str(e)}")
-    
-    # Update status to processing
-    document.status = DocumentStatus.PROCESSING
-    db.commit()
+    # Already queued or running - hand back the existing job
+    job = job_queue.find_active_job(db, document.id)
+    if not job:
+        job = job_queue.enqueue(db, "reprocess", [document], created_by=current_user.id)
     
-    try:
-        # Parse document
-        text = document_parser.parse_document(document.file_path, document.file_type)
-        
-        # Generate summary
-        summary = document_parser.generate_summary(text)
-        document.summary = summary
-        
-        # Chunk text
-        chunks = document_parser.chunk_text(text)
-        
-        # Store chunks in ChromaDB with extracted pricing data
-        import time
-        for idx, chunk_text in enumerate(chunks):
-            # Extract structured data with retry logic
-            max_retries = 3
-            structured_data = None
-            
-            for retry in range(max_retries):
-                try:
-                    structured_data = document_parser.extract_structured_data(chunk_text)
-                    break
-                except Exception as e:
-                    if 'rate_limit' in str(e).lower() and retry < max_retries - 1:
-                        wait_time = (retry + 1) * 2
-                        print(f"Rate limit hit, waiting {wait_time}s before retry {retry + 1}/{max_retries}")
-                        time.sleep(wait_time)
-                    else:
-                        print(f"Error extracting structured data (attempt {retry + 1}): {str(e)}")
-                        structured_data = {
-                            'item_name': None,
-                            'base_price': None,
-                            'price_unit': None,
-                            'conditions': [],
-                            'location': None
-                        }
-                        break
-            
-            # Build metadata
-            metadata = {
-                'document_id': document.id,
-                'document_name': document.original_filename,
-                'chunk_index': idx,
-                'source': f"{document.original_filename} chunk {idx+1}"
-            }
-            
-            # Helper function to safely add metadata
-            def safe_add_metadata(key, value, convert_fn=str):
-                if value is not None:
-                    try:
-                        if isinstance(value, list):
-                            if value:
-                                metadata[key] = ' | '.join(str(item) for item in value if item is not None)
-                        else:
-                            converted = convert_fn(value)
-                            if converted is not None:
-                                metadata[key] = converted
-                    except (ValueError, TypeError):
-                        pass
-            
-            # Add structured data to metadata
-            if structured_data:
-                safe_add_metadata('base_price', structured_data.get('base_price'), float)
-                safe_add_metadata('price_unit', structured_data.get('price_unit'), str)
-                safe_add_metadata('item_name', structured_data.get('item_name'), str)
-                safe_add_metadata('location', structured_data.get('location'), str)
-                safe_add_metadata('conditions', structured_data.get('conditions'), str)
-            
-            # Add to vector store
-            vector_store.add_chunk(
-                chunk_id=f"doc_{document.id}_chunk_{idx}",
-                content=chunk_text,
-                metadata=metadata
-            )
-        
-        # Update document status
-        document.status = DocumentStatus.PROCESSED
-        document.processed_at = datetime.utcnow()
-        document.error_message = None
-        db.commit()
-        db.refresh(document)
-        
-        return {"message": "Document reprocessed successfully"}
-        
-    except Exception as e:
-        # Update status to failed
-        document.status = DocumentStatus.FAILED
-        document.error_message = str(e)
-        db.commit()
-        
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error reprocessing document: {str(e)}"
-        )
+    return {"message": "Document reprocessing queued", "job_id": job.id}
 
 
 @router.delete("/documents/{document_id}")
@@ -584,7 +481,7 @@ def delete_document(
     db: Session = Depends(get_db)
 ):
     """Delete a document and its chunks"""
-    import os
+    from app.services.file_storage import delete_document_file
     from app.services.vector_store import vector_store
     
     document = db.query(Document).filter(Document.id == document_id).first()
@@ -597,12 +494,8 @@ def delete_document(
     # Delete from vector store (ChromaDB)
     vector_store.delete_document_chunks(document.id)
     
-    # Delete file
-    try:
-        if os.path.exists(document.file_path):
-            os.remove(document.file_path)
-    except Exception as e:
-        print(f"Error deleting file: {str(e)}")
+    # Delete file (kept while an identical upload still uses it)
+    delete_document_file(db, document)
     
     # Delete document from database
     db.delete(document)
@@ -5,6 +5,7 @@ from app.database import get_db
 from app.models import BusinessRule, User, UserRole
 from app.schemas import BusinessRuleCreate, BusinessRuleUpdate, BusinessRuleResponse
 from app.auth import get_current_user
+from app.services.rules_engine import rules_engine
 
 router = APIRouter(prefix="/api/business-rules", tags=["business_rules"])
 
@@ -76,6 +77,7 @@ def create_business_rule(
     db.add(new_rule)
     db.commit()
     db.refresh(new_rule)
+    rules_engine.invalidate()
     
     return new_rule
 
@@ -121,6 +123,7 @@ def update_business_rule(
     
     db.commit()
     db.refresh(rule)
+    rules_engine.invalidate()
     
     return rule
 
@@ -148,6 +151,7 @@ def toggle_business_rule(
     rule.is_active = not rule.is_active
     db.commit()
     db.refresh(rule)
+    rules_engine.invalidate()
     
     return rule
 
@@ -174,6 +178,7 @@ def delete_business_rule(
     
     db.delete(rule)
     db.commit()
+    rules_engine.invalidate()
     
     return None
 
@@ -5,10 +5,22 @@ from app.database import get_db
 from app.models import User, DecisionTree
 from app.schemas import DecisionTreeCreate, DecisionTreeUpdate, DecisionTreeResponse
 from app.auth import get_current_admin
+from app.services.tree_engine import tree_engine
+from app.services.tree_validator import tree_validator
 
 router = APIRouter(prefix="/api/decision-trees", tags=["Decision Trees"])
 
 
+def _validate_tree_config(tree_config: dict):
+    """Reject trees with cycles, dangling or missing branches and unreachable questions"""
+    report = tree_validator.validate(tree_config)
+    if not report["valid"]:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid decision tree: {'; '.join(report['errors'])}"
+        )
+
+
 @router.get("/", response_model=List[DecisionTreeResponse])
 def list_decision_trees(
     current_user: User = Depends(get_current_admin),
@@ -35,6 +47,22 @@ def get_decision_tree(
     return tree
 
 
+@router.get("/{tree_id}/validation")
+def validate_decision_tree(
+    tree_id: int,
+    current_user: User = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """Check a stored tree for cycles, dangling branches and unreachable questions"""
+    tree = db.query(DecisionTree).filter(DecisionTree.id == tree_id).first()
+    if not tree:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Decision tree not found"
+        )
+    return tree_validator.validate(tree.tree_config)
+
+
 @router.post("/", response_model=DecisionTreeResponse)
 def create_decision_tree(
     tree_data: DecisionTreeCreate,
@@ -54,11 +82,14 @@ def create_decision_tree(
             detail=f"Decision tree for '{tree_data.service_name}' already exists"
         )
     
+    tree_config = tree_data.tree_config.dict()
+    _validate_tree_config(tree_config)
+    
     tree = DecisionTree(
         service_name=tree_data.service_name,
         display_name=tree_data.display_name,
         description=tree_data.description,
-        tree_config=tree_data.tree_config.dict(),
+        tree_config=tree_config,
         created_by=current_user.id
     )
     
@@ -91,13 +122,18 @@ def update_decision_tree(
     if tree_data.description is not None:
         tree.description = tree_data.description
     if tree_data.tree_config is not None:
-        tree.tree_config = tree_data.tree_config.dict()
+        tree_config = tree_data.tree_config.dict()
+        _validate_tree_config(tree_config)
+        tree.tree_config = tree_config
     if tree_data.is_active is not None:
         tree.is_active = tree_data.is_active
     
     db.commit()
     db.refresh(tree)
     
+    # Recompile on next use
+    tree_engine.invalidate(tree.id)
+    
     return tree
 
 
@@ -118,6 +154,7 @@ def delete_decision_tree(
     
     db.delete(tree)
     db.commit()
+    tree_engine.invalidate(tree_id)
     
     return {"message": "Decision tree deleted successfully"}
 
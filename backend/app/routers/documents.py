@@ -1,36 +1,51 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 import os
-import uuid
+import zipfile
+from datetime import datetime
 from pathlib import Path
 from app.database import get_db
-from app.models import User, Document, DocumentStatus, ProductDocument, ProductDocumentType
-from app.schemas import DocumentResponse, DocumentSummaryUpdate
+from app.models import User, Document, DocumentStatus, ProductDocument, ProductDocumentType, ProcessingJob, JobStatus
+from app.schemas import DocumentResponse, DocumentSummaryUpdate, ProcessingJobResponse, BulkUploadResponse
 from app.auth import get_current_admin
 from app.config import settings
 from app.services.document_parser import document_parser
 from app.services.vector_store import vector_store
+from app.services.job_queue import job_queue
+from app.services.parsed_text_store import parsed_text_store
+from app.services.file_storage import (
+    save_upload, unique_upload_path, find_identical_document, delete_document_file, write_document_content,
+    extract_zip_documents, resolve_import_directory, import_directory_documents, FileTooLargeError
+)
 
 router = APIRouter(prefix="/api/documents", tags=["Documents"])
 
+ALLOWED_DOCUMENT_TYPES = ['pdf', 'csv', 'txt', 'text']
+
 
 @router.post("/upload", response_model=DocumentResponse)
 async def upload_document(
     file: UploadFile = File(...),
+    reuse_existing: bool = True,
     current_user: User = Depends(get_current_admin),
     db: Session = Depends(get_db)
 ):
-    """Upload a document (admin only)"""
+    """Upload a document (admin only)
+    
+    Byte-identical uploads (same SHA-256) share the existing file on disk. With
+    reuse_existing, the summary and vectors of an already processed identical
+    document are copied so the new document is processed without any OpenAI calls.
+    """
     
     # Validate file type
-    allowed_types = ['pdf', 'csv', 'txt', 'text']
     file_ext = file.filename.split('.')[-1].lower()
     
-    if file_ext not in allowed_types:
+    if file_ext not in ALLOWED_DOCUMENT_TYPES:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"File type .{file_ext} not allowed. Allowed types: {', '.join(allowed_types)}"
+            detail=f"File type .{file_ext} not allowed. Allowed types: {', '.join(ALLOWED_DOCUMENT_TYPES)}"
         )
     
     # Create upload directory if not exists
@@ -38,35 +53,38 @@ async def upload_document(
     upload_dir.mkdir(parents=True, exist_ok=True)
     
     # Generate unique filename
-    unique_filename = f"{uuid.uuid4().hex}_{file.filename}"
-    file_path = upload_dir / unique_filename
+    unique_filename, file_path = unique_upload_path(upload_dir, file.filename)
     
-    # Save file
+    # Stream file to disk, hashing as we go
     try:
-        contents = await file.read()
-        
-        # Check file size
-        if len(contents) > settings.MAX_FILE_SIZE:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"File too large. Max size: {settings.MAX_FILE_SIZE} bytes"
-            )
-        
-        with open(file_path, 'wb') as f:
-            f.write(contents)
+        file_size, content_hash = await save_upload(file, file_path, settings.MAX_FILE_SIZE)
+    except FileTooLargeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error saving file: {str(e)}"
         )
     
+    # Identical content already stored - keep one copy on disk
+    existing = find_identical_document(db, content_hash) if settings.DEDUPLICATE_UPLOADS else None
+    if existing:
+        os.remove(file_path)
+        unique_filename = existing.filename
+        file_path = existing.file_path
+        print(f"Upload {file.filename} is identical to document {existing.id}, sharing its file")
+    
     # Create document record
     document = Document(
         filename=unique_filename,
         original_filename=file.filename,
         file_path=str(file_path),
         file_type=file_ext,
-        file_size=len(contents),
+        file_size=file_size,
+        content_hash=content_hash,
         uploaded_by=current_user.id,
         status=DocumentStatus.UPLOADED
     )
@@ -75,9 +93,210 @@ async def upload_document(
     db.commit()
     db.refresh(document)
     
+    # Reuse summary and vectors of the processed twin
+    if existing and reuse_existing and existing.status == DocumentStatus.PROCESSED:
+        try:
+            copied = vector_store.copy_document_chunks(existing.id, document.id, document.original_filename)
+            document.summary = existing.summary
+            document.status = DocumentStatus.PROCESSED
+            document.processed_at = datetime.utcnow()
+            db.commit()
+            db.refresh(document)
+            print(f"Reused {copied} chunks of document {existing.id} for document {document.id}")
+        except Exception as e:
+            # Leave it as uploaded (without any copied chunks) so it can be processed normally
+            print(f"Error reusing processed data of document {existing.id}: {str(e)}")
+            db.rollback()
+            try:
+                vector_store.delete_document_chunks(document.id)
+            except Exception as cleanup_err:
+                print(f"Error removing copied chunks of document {document.id}: {str(cleanup_err)}")
+    
     return document
 
 
+@router.post("/bulk-upload", response_model=BulkUploadResponse, status_code=status.HTTP_202_ACCEPTED)
+async def bulk_upload_documents(
+    files: List[UploadFile] = File(default=[]),
+    server_directory: Optional[str] = Form(None),
+    reuse_existing: bool = True,
+    current_user: User = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """Upload many documents at once and queue them for processing (admin only)
+    
+    Accepts any mix of documents and .zip archives, plus optionally server_directory -
+    a folder under BULK_IMPORT_DIR on the server. All Document rows are written in one
+    transaction and queued as a single processing job; poll GET /jobs/{job_id} for
+    per-file and aggregate progress. Deduplication works as in /upload.
+    """
+    
+    # Create upload directory if not exists
+    upload_dir = Path(settings.UPLOAD_DIR)
+    upload_dir.mkdir(parents=True, exist_ok=True)
+    
+    import_dir = None
+    if server_directory:
+        try:
+            import_dir = resolve_import_directory(server_directory)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+    
+    if not files and import_dir is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No files provided"
+        )
+    
+    stored = []   # Files written to the upload directory
+    skipped = []  # Files rejected, with the reason
+    
+    # Stream files to disk, hashing as we go
+    for file in files:
+        file_ext = file.filename.split('.')[-1].lower()
+        
+        if file_ext == 'zip':
+            zip_filename, zip_path = unique_upload_path(upload_dir, file.filename)
+            try:
+                await save_upload(file, zip_path, settings.MAX_BULK_UPLOAD_SIZE)
+                zip_stored, zip_skipped = await run_in_threadpool(
+                    extract_zip_documents, zip_path, upload_dir, ALLOWED_DOCUMENT_TYPES
+                )
+                stored.extend(zip_stored)
+                skipped.extend(zip_skipped)
+            except (FileTooLargeError, zipfile.BadZipFile) as e:
+                skipped.append({'filename': file.filename, 'reason': str(e)})
+            finally:
+                if os.path.exists(zip_path):
+                    os.remove(zip_path)
+            continue
+        
+        if file_ext not in ALLOWED_DOCUMENT_TYPES:
+            skipped.append({'filename': file.filename, 'reason': f"File type .{file_ext} not allowed"})
+            continue
+        
+        unique_filename, file_path = unique_upload_path(upload_dir, file.filename)
+        try:
+            file_size, content_hash = await save_upload(file, file_path, settings.MAX_FILE_SIZE)
+        except FileTooLargeError as e:
+            skipped.append({'filename': file.filename, 'reason': str(e)})
+            continue
+        
+        stored.append({
+            'original_filename': file.filename,
+            'file_ext': file_ext,
+            'unique_filename': unique_filename,
+            'file_path': str(file_path),
+            'file_size': file_size,
+            'content_hash': content_hash
+        })
+    
+    # Copy documents from the server-side import folder
+    if import_dir is not None:
+        dir_stored, dir_skipped = await run_in_threadpool(
+            import_directory_documents, import_dir, upload_dir, ALLOWED_DOCUMENT_TYPES
+        )
+        stored.extend(dir_stored)
+        skipped.extend(dir_skipped)
+    
+    written_paths = [entry['file_path'] for entry in stored]
+    copied_document_ids = []  # Chunks copied into the vector store, dropped again if the transaction fails
+    
+    try:
+        # Create all document records in one transaction
+        documents = []
+        batch_files = {}  # content_hash -> (filename, path) for files stored by this request
+        for entry in stored:
+            content_hash = entry['content_hash']
+            existing = find_identical_document(db, content_hash) if settings.DEDUPLICATE_UPLOADS else None
+            
+            # Identical content already stored (earlier or in this batch) - keep one copy on disk
+            if existing:
+                twin = (existing.filename, existing.file_path)
+            elif settings.DEDUPLICATE_UPLOADS and content_hash in batch_files:
+                twin = batch_files[content_hash]
+            else:
+                twin = None
+                batch_files[content_hash] = (entry['unique_filename'], entry['file_path'])
+            
+            if twin:
+                os.remove(entry['file_path'])
+                entry['unique_filename'], entry['file_path'] = twin
+            
+            document = Document(
+                filename=entry['unique_filename'],
+                original_filename=entry['original_filename'],
+                file_path=entry['file_path'],
+                file_type=entry['file_ext'],
+                file_size=entry['file_size'],
+                content_hash=content_hash,
+                uploaded_by=current_user.id,
+                status=DocumentStatus.UPLOADED
+            )
+            db.add(document)
+            documents.append((document, existing))
+        
+        db.flush()
+        
+        # Reuse summary and vectors of processed twins, queue everything else
+        to_process = []
+        reused_count = 0
+        for document, existing in documents:
+            if existing and reuse_existing and existing.status == DocumentStatus.PROCESSED:
+                try:
+                    copied_document_ids.append(document.id)
+                    vector_store.copy_document_chunks(existing.id, document.id, document.original_filename)
+                    document.summary = existing.summary
+                    document.status = DocumentStatus.PROCESSED
+                    document.processed_at = datetime.utcnow()
+                    reused_count += 1
+                    continue
+                except Exception as e:
+                    print(f"Error reusing processed data of document {existing.id}: {str(e)}")
+            to_process.append(document)
+        
+        # Commits the documents together with the job
+        job = None
+        if to_process:
+            job = job_queue.enqueue(db, "process", to_process, created_by=current_user.id)
+        else:
+            db.commit()
+        
+    except Exception as e:
+        db.rollback()
+        # The documents were never saved - don't leave their copied chunks searchable
+        for document_id in copied_document_ids:
+            try:
+                vector_store.delete_document_chunks(document_id)
+            except Exception as cleanup_err:
+                print(f"Error removing copied chunks of document {document_id}: {str(cleanup_err)}")
+        # Remove the files this request wrote
+        for file_path in written_paths:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error saving documents: {str(e)}"
+        )
+    
+    for document, _ in documents:
+        db.refresh(document)
+    
+    print(f"Bulk upload: {len(documents)} documents ({reused_count} reused), {len(skipped)} skipped")
+    
+    return BulkUploadResponse(
+        job_id=job.id if job else None,
+        total_files=len(documents),
+        queued_count=len(to_process),
+        reused_count=reused_count,
+        documents=[document for document, _ in documents],
+        skipped=skipped
+    )
+
+
 @router.get("/", response_model=List[DocumentResponse])
 def list_documents(
     skip: int = 0,
@@ -90,6 +309,53 @@ def list_documents(
     return documents
 
 
+def _serialize_job(job: ProcessingJob) -> ProcessingJobResponse:
+    """Build the job status payload with document and chunk progress totals"""
+    items = job.items
+    return ProcessingJobResponse(
+        id=job.id,
+        job_type=job.job_type,
+        status=job.status,
+        total_documents=len(items),
+        completed_documents=sum(1 for item in items if item.status == JobStatus.COMPLETED),
+        failed_documents=sum(1 for item in items if item.status == JobStatus.FAILED),
+        completed_chunks=sum(item.completed_chunks or 0 for item in items),
+        total_chunks=sum(item.total_chunks or 0 for item in items),
+        error_message=job.error_message,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+        items=items
+    )
+
+
+@router.get("/jobs", response_model=List[ProcessingJobResponse])
+def list_processing_jobs(
+    limit: int = 20,
+    current_user: User = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """List recent document processing jobs (admin only)"""
+    jobs = db.query(ProcessingJob).order_by(ProcessingJob.id.desc()).limit(limit).all()
+    return [_serialize_job(job) for job in jobs]
+
+
+@router.get("/jobs/{job_id}", response_model=ProcessingJobResponse)
+def get_processing_job(
+    job_id: int,
+    current_user: User = Depends(get_current_admin),
+    db: Session = Depends(get_db)
+):
+    """Get the status and progress of a processing job (poll this after queueing work)"""
+    job = db.query(ProcessingJob).filter(ProcessingJob.id == job_id).first()
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    return _serialize_job(job)
+
+
 @router.get("/{document_id}", response_model=DocumentResponse)
 def get_document(
     document_id: int,
@@ -106,13 +372,16 @@ def get_document(
     return document
 
 
-@router.post("/{document_id}/process", response_model=DocumentResponse)
+@router.post("/{document_id}/process", response_model=ProcessingJobResponse, status_code=status.HTTP_202_ACCEPTED)
 def process_document(
     document_id: int,
     current_user: User = Depends(get_current_admin),
     db: Session = Depends(get_db)
 ):
-    """Process a document - parse, chunk, and add to knowledge base"""
+    """Queue a document for processing - parse, chunk, and add to knowledge base
+    
+    Returns the processing job right away; poll GET /jobs/{job_id} for progress.
+    """
     
     document = db.query(Document).filter(Document.id == document_id).first()
     if not document:
@@ -127,199 +396,12 @@ def process_document(
             detail="Document already processed"
         )
     
-    # Update status to processing
-    document.status = DocumentStatus.PROCESSING
-    db.commit()
-    
-    try:
-        # Parse document
-        text = document_parser.parse_document(document.file_path, document.file_type)
-        
-        # Generate summary
-        summary = document_parser.generate_summary(text)
-        document.summary = summary
-        
-        # Chunk text
-        chunks = document_parser.chunk_text(text)
-        
-        # Store chunks in ChromaDB with extracted pricing data
-        for idx, chunk_text in enumerate(chunks):
-            # Extract structured data (pricing, etc.) from chunk with retry logic
-            import time
-            max_retries = 3
-            structured_data = None
-            
-            for retry in range(max_retries):
-                try:
-                    structured_data = document_parser.extract_structured_data(chunk_text)
-                    break
-                except Exception as e:
-                    if 'rate_limit' in str(e).lower() and retry < max_retries - 1:
-                        # Wait and retry for rate limits
-                        wait_time = (retry + 1) * 2  # 2, 4, 6 seconds
-                        print(f"Rate limit hit, waiting {wait_time}s before retry {retry + 1}/{max_retries}")
-                        time.sleep(wait_time)
-                    else:
-                        print(f"Error extracting structured data (attempt {retry + 1}): {str(e)}")
-                        structured_data = {
-                            'item_name': None,
-                            'base_price': None,
-                            'price_unit': None,
-                            'conditions': [],
-                            'location': None
-                        }
-                        break
-            
-            # Build metadata - ChromaDB only accepts str, int, float, bool
-            metadata = {
-                'document_id': document.id,
-                'document_name': document.original_filename,
-                'chunk_index': idx,
-                'source': f"{document.original_filename} chunk {idx+1}"
-            }
-            
-            # Add pricing data if available (filter out None and ensure correct types)
-            def safe_add_metadata(key, value, convert_fn=str):
-                """Safely add metadata only if value is not None and can be converted"""
-                if value is not None:
-                    try:
-                        # Handle lists specially - convert to string
-                        if isinstance(value, list):
-                            if value:  # Only if list is not empty
-                                metadata[key] = ' | '.join(str(item) for item in value if item is not None)
-                        else:
-                            converted = convert_fn(value)
-                            # Ensure we don't add None after conversion
-                            if converted is not None:
-                                metadata[key] = converted
-                    except (ValueError, TypeError):
-                        # Skip if conversion fails
-                        pass
-            
-            # Add structured data to metadata
-            if structured_data:
-                safe_add_metadata('base_price', structured_data.get('base_price'), float)
-                safe_add_metadata('price_unit', structured_data.get('price_unit'), str)
-                safe_add_metadata('item_name', structured_data.get('item_name'), str)
-                safe_add_metadata('location', structured_data.get('location'), str)
-                safe_add_metadata('conditions', structured_data.get('conditions'), str)
-            
-            # Add to vector store with pricing metadata
-            vector_store.add_chunk(
-                chunk_id=f"doc_{document.id}_chunk_{idx}",
-                content=chunk_text,
-                metadata=metadata
-            )
-        
-        # Update document status
-        document.status = DocumentStatus.PROCESSED
-        from datetime import datetime
-        document.processed_at = datetime.utcnow()
-        db.commit()
-        db.refresh(document)
-        
-        # Auto-detect and link products if this is a catalog/drawing
-        try:
-            _auto_link_products(db, document, text)
-        except Exception as e:
-            print(f"Error auto-linking products: {str(e)}")
-            # Don't fail the whole processing if auto-link fails
-        
-        return document
-        
-    except Exception as e:
-        # Update status to failed
-        document.status = DocumentStatus.FAILED
-        document.error_message = str(e)
-        db.commit()
-        
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error processing document: {str(e)}"
-        )
-
-
-def _auto_link_products(db: Session, document: Document, document_text: str):
-    """Automatically detect products in document and create links"""
-    from openai import OpenAI
-    
-    client = OpenAI(api_key=settings.OPENAI_API_KEY)
+    # Already queued or running - hand back the existing job
+    job = job_queue.find_active_job(db, document.id)
+    if not job:
+        job = job_queue.enqueue(db, "process", [document], created_by=current_user.id)
     
-    # Use AI to detect products and document type
-    prompt = f"""Analyze this document and identify:
-1. What products are mentioned (e.g., cat ladder, court marking, glass partition, flooring, railing, etc.)
-2. What type of document this is (catalog, technical_drawing, brochure, or spec_sheet)
-
-Document filename: {document.original_filename}
-Document text excerpt (first 2000 chars): {document_text[:2000]}
-
-Return JSON with:
-{{
-    "products": ["product1", "product2"],  // Use snake_case like "cat_ladder", "court_marking"
-    "document_type": "catalog" // or "technical_drawing", "brochure", "spec_sheet"
-}}
-
-Common products to look for:
-- cat_ladder, access_ladder
-- court_marking, line_marking  
-- glass_partition, glass_panel
-- handrail, safety_rail
-- flooring, vinyl_flooring, wood_flooring, cork_flooring, spc_flooring, lvt_flooring
-- staircase, staircase_railing
-- canopy, sunshade
-- bike_rack
-- led_lantern
-- artificial_grass
-- ezz_green (LED products)
-- rolling_tower, aluminium_tower
-
-If it's a general catalog covering multiple products, list all. If focused on one product, return just that one.
-If filename contains clear product names, prioritize those."""
-
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "You are a product categorization assistant."},
-                {"role": "user", "content": prompt}
-            ],
-            response_format={"type": "json_object"},
-            temperature=0,
-            max_tokens=200
-        )
-        
-        result = json.loads(response.choices[0].message.content)
-        products = result.get('products', [])
-        doc_type = result.get('document_type', 'catalog')
-        
-        print(f"Auto-detected products for {document.original_filename}: {products}, type: {doc_type}")
-        
-        # Create links for each detected product
-        for product_name in products:
-            # Check if link already exists
-            existing = db.query(ProductDocument).filter(
-                ProductDocument.product_name == product_name,
-                ProductDocument.document_id == document.id,
-                ProductDocument.document_type == doc_type
-            ).first()
-            
-            if not existing:
-                product_doc = ProductDocument(
-                    product_name=product_name,
-                    document_type=ProductDocumentType(doc_type),
-                    document_id=document.id,
-                    display_order=0,
-                    is_active=True
-                )
-                db.add(product_doc)
-                print(f"Auto-linked {product_name} to document {document.id}")
-        
-        db.commit()
-        
-    except Exception as e:
-        print(f"Error in auto product detection: {str(e)}")
-        # Don't raise - this is optional enhancement
-        pass
+    return _serialize_job(job)
 
 
 @router.patch("/{document_id}/summary", response_model=DocumentResponse)
@@ -406,12 +488,8 @@ def delete_document(
     # Delete from vector store (ChromaDB)
     vector_store.delete_document_chunks(document.id)
     
-    # Delete file
-    try:
-        if os.path.exists(document.file_path):
-            os.remove(document.file_path)
-    except Exception as e:
-        print(f"Error deleting file: {str(e)}")
+    # Delete file (kept while an identical upload still uses it)
+    delete_document_file(db, document)
     
     # Delete document from database
     db.delete(document)
@@ -420,15 +498,16 @@ def delete_document(
     return {"message": "Document deleted successfully"}
 
 
-@router.post("/reprocess-all")
+@router.post("/reprocess-all", status_code=status.HTTP_202_ACCEPTED)
 def reprocess_all_documents(
     current_user: User = Depends(get_current_admin),
     db: Session = Depends(get_db)
 ):
-    """Reprocess ALL documents to extract pricing data (admin only)"""
+    """Queue ALL documents for reprocessing to extract pricing data (admin only)
     
-    processed_count = 0
-    failed_docs = []
+    Runs as a background job that checkpoints per chunk window, so an interrupted
+    run resumes where it stopped. Poll GET /jobs/{job_id} for progress.
+    """
     
     # Get all processed documents (lowercase status from DB)
     documents = db.query(Document).filter(
@@ -438,119 +517,16 @@ def reprocess_all_documents(
     if not documents:
         return {
             "message": "No documents to reprocess",
-            "processed_count": 0
+            "total_documents": 0
         }
     
-    for document in documents:
-        try:
-            # Delete old chunks from vector store first
-            try:
-                vector_store.delete_document_chunks(document.id)
-                print(f"Deleted old chunks for document {document.id}")
-            except Exception as del_err:
-                print(f"Warning: Could not delete old chunks for document {document.id}: {str(del_err)}")
-            
-            # Re-parse and process
-            text = document_parser.parse_document(document.file_path, document.file_type)
-            
-            # Re-generate summary
-            summary = document_parser.generate_summary(text)
-            document.summary = summary
-            
-            # Chunk text
-            chunks = document_parser.chunk_text(text)
-            
-            # Store chunks with pricing extraction
-            import time
-            for idx, chunk_text in enumerate(chunks):
-                # Extract structured data with retry logic
-                max_retries = 3
-                structured_data = None
-                
-                for retry in range(max_retries):
-                    try:
-                        structured_data = document_parser.extract_structured_data(chunk_text)
-                        break
-                    except Exception as e:
-                        if 'rate_limit' in str(e).lower() and retry < max_retries - 1:
-                            wait_time = (retry + 1) * 2
-                            print(f"Rate limit hit, waiting {wait_time}s before retry {retry + 1}/{max_retries}")
-                            time.sleep(wait_time)
-                        else:
-                            print(f"Error extracting structured data (attempt {retry + 1}): {str(e)}")
-                            structured_data = {
-                                'item_name': None,
-                                'base_price': None,
-                                'price_unit': None,
-                                'conditions': [],
-                                'location': None
-                            }
-                            break
-                
-                # Build metadata
-                metadata = {
-                    'document_id': document.id,
-                    'document_name': document.original_filename,
-                    'chunk_index': idx,
-                    'source': f"{document.original_filename} chunk {idx+1}"
-                }
-                
-                # Helper function to safely add metadata
-                def safe_add_metadata(key, value, convert_fn=str):
-                    if value is not None:
-                        try:
-                            if isinstance(value, list):
-                                if value:
-                                    metadata[key] = ' | '.join(str(item) for item in value if item is not None)
-                            else:
-                                converted = convert_fn(value)
-                                if converted is not None:
-                                    metadata[key] = converted
-                        except (ValueError, TypeError):
-                            pass
-                
-                # Add structured data to metadata
-                if structured_data:
-                    safe_add_metadata('base_price', structured_data.get('base_price'), float)
-                    safe_add_metadata('price_unit', structured_data.get('price_unit'), str)
-                    safe_add_metadata('item_name', structured_data.get('item_name'), str)
-                    safe_add_metadata('location', structured_data.get('location'), str)
-                    safe_add_metadata('conditions', structured_data.get('conditions'), str)
-                
-                # Add to vector store
-                vector_store.add_chunk(
-                    chunk_id=f"doc_{document.id}_chunk_{idx}",
-                    content=chunk_text,
-                    metadata=metadata
-                )
-            
-            processed_count += 1
-            print(f"Reprocessed document {document.id}: {document.original_filename}")
-            
-            # Commit after each document to avoid timeout
-            db.commit()
-            
-        except Exception as e:
-            print(f"Error reprocessing document {document.id}: {str(e)}")
-            failed_docs.append({
-                'id': document.id,
-                'filename': document.original_filename,
-                'error': str(e)
-            })
-            # Rollback on error to ensure clean state for next document
-            db.rollback()
+    job = job_queue.enqueue(db, "reprocess_all", documents, created_by=current_user.id)
     
-    response = {
-        "message": f"Reprocessed {processed_count} documents successfully",
-        "processed_count": processed_count,
+    return {
+        "message": f"Queued {len(documents)} documents for reprocessing",
+        "job_id": job.id,
         "total_documents": len(documents)
     }
-    
-    if failed_docs:
-        response["failed_count"] = len(failed_docs)
-        response["failed_documents"] = failed_docs
-    
-    return response
 
 
 @router.get("/{document_id}/content")
@@ -569,8 +545,8 @@ def get_document_content(
         )
     
     try:
-        # Parse document to get text content
-        text = document_parser.parse_document(document.file_path, document.file_type)
+        # Get text content (parsed once, then served from the parsed text store)
+        text = parsed_text_store.get_text(document.file_path, document.file_type)
         return {"content": text}
     except Exception as e:
         raise HTTPException(
@@ -596,12 +572,8 @@ def update_document_content(
         )
     
     try:
-        # Write updated content to file
-        with open(document.file_path, 'w', encoding='utf-8') as f:
-            f.write(content_data['content'])
-        
-        # Update file size
-        document.file_size = len(content_data['content'].encode('utf-8'))
+        # Write updated content to file (updates size and content hash)
+        write_document_content(db, document, content_data['content'])
         
         # Mark as needing reprocessing
         document.status = DocumentStatus.UPLOADED
@@ -620,13 +592,13 @@ def update_document_content(
         )
 
 
-@router.post("/{document_id}/reprocess")
+@router.post("/{document_id}/reprocess", status_code=status.HTTP_202_ACCEPTED)
 def reprocess_document(
     document_id: int,
     current_user: User = Depends(get_current_admin),
     db: Session = Depends(get_db)
 ):
-    """Reprocess a single document"""
+    """Queue a single document for reprocessing"""
     
     document = db.query(Document).filter(Document.id == document_id).first()
     if not document:
@@ -635,111 +607,12 @@ def reprocess_document(
             detail="Document not found"
         )
     
-    # Delete old chunks from vector store first
-    try:
-        vector_store.delete_document_chunks(document.id)
-    except Exception as e:
-        print(f"Warning: Could not delete old chunks for document {document.id}: {str(e)}")
-    
-    # Update status to processing
-    document.status = DocumentStatus.PROCESSING
-    db.commit()
+    # Already queued or running - hand back the existing job
+    job = job_queue.find_active_job(db, document.id)
+    if not job:
+        job = job_queue.enqueue(db, "reprocess", [document], created_by=current_user.id)
     
-    try:
-        # Parse document
-        text = document_parser.parse_document(document.file_path, document.file_type)
-        
-        # Generate summary
-        summary = document_parser.generate_summary(text)
-        document.summary = summary
-        
-        # Chunk text
-        chunks = document_parser.chunk_text(text)
-        
-        # Store chunks in ChromaDB with extracted pricing data
-        import time
-        for idx, chunk_text in enumerate(chunks):
-            # Extract structured data with retry logic
-            max_retries = 3
-            structured_data = None
-            
-            for retry in range(max_retries):
-                try:
-                    structured_data = document_parser.extract_structured_data(chunk_text)
-                    break
-                except Exception as e:
-                    if 'rate_limit' in str(e).lower() and retry < max_retries - 1:
-                        wait_time = (retry + 1) * 2
-                        print(f"Rate limit hit, waiting {wait_time}s before retry {retry + 1}/{max_retries}")
-                        time.sleep(wait_time)
-                    else:
-                        print(f"Error extracting structured data (attempt {retry + 1}): {str(e)}")
-                        structured_data = {
-                            'item_name': None,
-                            'base_price': None,
-                            'price_unit': None,
-                            'conditions': [],
-                            'location': None
-                        }
-                        break
-            
-            # Build metadata
-            metadata = {
-                'document_id': document.id,
-                'document_name': document.original_filename,
-                'chunk_index': idx,
-                'source': f"{document.original_filename} chunk {idx+1}"
-            }
-            
-            # Helper function to safely add metadata
-            def safe_add_metadata(key, value, convert_fn=str):
-                if value is not None:
-                    try:
-                        if isinstance(value, list):
-                            if value:
-                                metadata[key] = ' | '.join(str(item) for item in value if item is not None)
-                        else:
-                            converted = convert_fn(value)
-                            if converted is not None:
-                                metadata[key] = converted
-                    except (ValueError, TypeError):
-                        pass
-            
-            # Add structured data to metadata
-            if structured_data:
-                safe_add_metadata('base_price', structured_data.get('base_price'), float)
-                safe_add_metadata('price_unit', structured_data.get('price_unit'), str)
-                safe_add_metadata('item_name', structured_data.get('item_name'), str)
-                safe_add_metadata('location', structured_data.get('location'), str)
-                safe_add_metadata('conditions', structured_data.get('conditions'), str)
-            
-            # Add to vector store
-            vector_store.add_chunk(
-                chunk_id=f"doc_{document.id}_chunk_{idx}",
-                content=chunk_text,
-                metadata=metadata
-            )
-        
-        # Update document status
-        document.status = DocumentStatus.PROCESSED
-        from datetime import datetime
-        document.processed_at = datetime.utcnow()
-        document.error_message = None
-        db.commit()
-        db.refresh(document)
-        
-        return {"message": "Document reprocessed successfully"}
-        
-    except Exception as e:
-        # Update status to failed
-        document.status = DocumentStatus.FAILED
-        document.error_message = str(e)
-        db.commit()
-        
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error reprocessing document: {str(e)}"
-        )
+    return {"message": "Document reprocessing queued", "job_id": job.id}
 
 
 @router.delete("/")
@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
 from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import List
 import json
@@ -16,6 +17,8 @@ from app.schemas import (
 from app.auth import get_current_user
 from app.services.ai_assistant import ai_assistant
 from app.services.quote_engine import quote_engine
+from app.services.tree_engine import tree_engine
+from app.services.file_storage import save_upload, FileTooLargeError
 from app.config import settings
 
 router = APIRouter(prefix="/api/enquiries", tags=["Enquiries"])
@@ -94,18 +97,14 @@ def get_enquiry(
     return enquiry
 
 
-@router.post("/{enquiry_id}/message", response_model=AIResponse)
-def send_message(
-    enquiry_id: int,
-    message_data: EnquiryMessageCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    """Send a message in an enquiry (customer asks/answers)"""
-    
+# The async chat handlers below use the request's sync Session only through these
+# helpers, run in the threadpool, so no query or commit blocks the event loop.
+
+def _get_customer_enquiry(db: Session, enquiry_id: int, customer_id: int, open_only: bool = False) -> Enquiry:
+    """The customer's enquiry (404 if not theirs); with open_only, 400 unless it still takes messages"""
     enquiry = db.query(Enquiry).filter(
         Enquiry.id == enquiry_id,
-        Enquiry.customer_id == current_user.id
+        Enquiry.customer_id == customer_id
     ).first()
     
     if not enquiry:
@@ -114,25 +113,27 @@ def send_message(
             detail="Enquiry not found"
         )
     
-    if enquiry.status not in [EnquiryStatus.COLLECTING_INFO, EnquiryStatus.DRAFT_READY]:
+    if open_only and enquiry.status not in [EnquiryStatus.COLLECTING_INFO, EnquiryStatus.DRAFT_READY]:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Cannot send message in current enquiry status"
         )
     
-    # Save customer message
+    return enquiry
+
+
+def _save_customer_message(db: Session, enquiry: Enquiry, content: str):
     customer_message = EnquiryMessage(
         enquiry_id=enquiry.id,
         role="customer",
-        content=message_data.content
+        content=content
     )
     db.add(customer_message)
     db.commit()
-    
-    # Get AI response
-    ai_response = ai_assistant.process_enquiry(db, enquiry, message_data.content)
-    
-    # Save AI response
+
+
+def _save_ai_response(db: Session, enquiry: Enquiry, ai_response: AIResponse, extract_requirements: bool):
+    """Save the assistant's reply and, when the draft is ready, price and attach it"""
     assistant_message = EnquiryMessage(
         enquiry_id=enquiry.id,
         role="assistant",
@@ -142,59 +143,89 @@ def send_message(
     
     # Update status and show draft if ready
     if ai_response.draft_available:
-        enquiry.status = EnquiryStatus.DRAFT_READY
-        
-        # Only extract data if NOT using a decision tree
-        # (tree data is already in collected_data)
-        if not enquiry.service_tree_id:
-            try:
-                # Build conversation text
-                conversation_text = f"Initial request: {enquiry.initial_message}\n\n"
-                for msg in enquiry.messages:
-                    conversation_text += f"{msg.role}: {msg.content}\n"
-                
-                # Use AI to extract structured requirements
-                extracted_data = ai_assistant.extract_requirements(conversation_text)
-                print(f"Extracted data from conversation: {extracted_data}")
-                
-                # Store in collected_data
-                if extracted_data:
-                    enquiry.collected_data = extracted_data
-            except Exception as extract_err:
-                print(f"Error extracting data: {str(extract_err)}")
-        
-        db.commit()
-        
-        # Generate and show draft quote to user
+        _attach_draft_quote(db, enquiry, ai_response, extract_requirements)
+    
+    db.commit()
+
+
+def _attach_draft_quote(db: Session, enquiry: Enquiry, ai_response: AIResponse, extract_requirements: bool):
+    """Mark the enquiry draft-ready, attach the draft quote and auto-submit it when complete
+    
+    With extract_requirements, structured data is first pulled out of a free-form
+    (non-tree) conversation.
+    """
+    enquiry.status = EnquiryStatus.DRAFT_READY
+    
+    # Only extract data if NOT using a decision tree
+    # (tree data is already in collected_data)
+    if extract_requirements and not enquiry.service_tree_id:
         try:
-            draft = quote_engine.calculate_draft_quote(db, enquiry)
+            # Build conversation text
+            conversation_text = f"Initial request: {enquiry.initial_message}\n\n"
+            for msg in enquiry.messages:
+                conversation_text += f"{msg.role}: {msg.content}\n"
             
-            # ALWAYS show the draft to the user
-            ai_response.draft_quote = draft
+            # Use AI to extract structured requirements
+            extracted_data = ai_assistant.extract_requirements(conversation_text)
+            print(f"Extracted data from conversation: {extracted_data}")
             
-            # Auto-submit to admin if all info is available
-            if draft.can_submit and draft.base_price > 0:
-                # Create quote (no KnowledgeChunk dependency)
-                quote = quote_engine.create_quote_from_draft(
-                    db, enquiry.id, draft, source_chunk_ids=[]
-                )
-                
-                # Update enquiry status
-                enquiry.status = EnquiryStatus.SENT_TO_ADMIN
-                db.commit()
-                
-        except Exception as e:
-            print(f"Error generating draft quote: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            # Store in collected_data
+            if extracted_data:
+                enquiry.collected_data = extracted_data
+        except Exception as extract_err:
+            print(f"Error extracting data: {str(extract_err)}")
     
     db.commit()
     
+    # Generate and show draft quote to user
+    try:
+        draft = quote_engine.calculate_draft_quote(db, enquiry)
+        
+        # ALWAYS show the draft to the user
+        ai_response.draft_quote = draft
+        
+        # Auto-submit to admin if all info is available
+        if draft.can_submit and draft.base_price > 0:
+            # Create quote (no KnowledgeChunk dependency)
+            quote = quote_engine.create_quote_from_draft(
+                db, enquiry.id, draft, source_chunk_ids=[]
+            )
+            
+            # Update enquiry status
+            enquiry.status = EnquiryStatus.SENT_TO_ADMIN
+            db.commit()
+            
+    except Exception as e:
+        print(f"Error generating draft quote: {str(e)}")
+        import traceback
+        traceback.print_exc()
+
+
+@router.post("/{enquiry_id}/message", response_model=AIResponse)
+async def send_message(
+    enquiry_id: int,
+    message_data: EnquiryMessageCreate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Send a message in an enquiry (customer asks/answers)"""
+    
+    enquiry = await run_in_threadpool(_get_customer_enquiry, db, enquiry_id, current_user.id, True)
+    
+    # Save customer message
+    await run_in_threadpool(_save_customer_message, db, enquiry, message_data.content)
+    
+    # Get AI response
+    ai_response = await ai_assistant.process_enquiry_async(db, enquiry, message_data.content)
+    
+    # Save AI response, pricing the draft if ready
+    await run_in_threadpool(_save_ai_response, db, enquiry, ai_response, True)
+    
     return ai_response
 
 
 @router.post("/{enquiry_id}/message/stream")
-def send_message_stream(
+async def send_message_stream(
     enquiry_id: int,
     message_data: EnquiryMessageCreate,
     current_user: User = Depends(get_current_user),
@@ -202,45 +233,26 @@ def send_message_stream(
 ):
     """Send a message in an enquiry with streaming AI response"""
     
-    enquiry = db.query(Enquiry).filter(
-        Enquiry.id == enquiry_id,
-        Enquiry.customer_id == current_user.id
-    ).first()
+    enquiry = await run_in_threadpool(_get_customer_enquiry, db, enquiry_id, current_user.id, True)
     
-    if not enquiry:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Enquiry not found"
-        )
-    
-    if enquiry.status not in [EnquiryStatus.COLLECTING_INFO, EnquiryStatus.DRAFT_READY]:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Cannot send message in current enquiry status"
-        )
+    # Store enquiry_id for use in generator (before the commit expires the instance)
+    enquiry_id_stored = enquiry.id
     
     # Save customer message
-    customer_message = EnquiryMessage(
-        enquiry_id=enquiry.id,
-        role="customer",
-        content=message_data.content
-    )
-    db.add(customer_message)
-    db.commit()
-    
-    # Store enquiry_id for use in generator
-    enquiry_id_stored = enquiry.id
+    await run_in_threadpool(_save_customer_message, db, enquiry, message_data.content)
     
-    def generate_stream():
+    async def generate_stream():
         try:
             # Re-fetch enquiry in the generator context to avoid session issues
-            enquiry_fresh = db.query(Enquiry).filter(Enquiry.id == enquiry_id_stored).first()
+            enquiry_fresh = await run_in_threadpool(
+                lambda: db.query(Enquiry).filter(Enquiry.id == enquiry_id_stored).first()
+            )
             if not enquiry_fresh:
                 yield f"data: {json.dumps({{'type': 'error', 'message': 'Enquiry not found'}})}\n\n"
                 return
             
             # Get streaming AI response
-            for chunk in ai_assistant.process_enquiry_stream(db, enquiry_fresh, message_data.content):
+            async for chunk in ai_assistant.process_enquiry_stream_async(db, enquiry_fresh, message_data.content):
                 yield f"data: {json.dumps(chunk)}\n\n"
             
             # Send completion signal
@@ -304,19 +316,14 @@ async def upload_image_to_enquiry(
     unique_filename = f"{uuid.uuid4().hex}_{file.filename}"
     file_path = upload_dir / unique_filename
     
-    # Save file
+    # Stream file to disk (images are capped at MAX_IMAGE_SIZE)
     try:
-        contents = await file.read()
-        
-        # Check file size (max 5MB for images)
-        if len(contents) > 5242880:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Image too large. Max size: 5MB"
-            )
-        
-        with open(file_path, 'wb') as f:
-            f.write(contents)
+        await save_upload(file, file_path, settings.MAX_IMAGE_SIZE)
+    except FileTooLargeError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Image too large. Max size: {settings.MAX_IMAGE_SIZE / (1024 * 1024):.3g}MB"
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -400,7 +407,7 @@ async def upload_image_to_enquiry(
 
 
 @router.post("/{enquiry_id}/answer", response_model=AIResponse)
-def answer_question(
+async def answer_question(
     enquiry_id: int,
     answer_data: EnquiryAnswerRequest,
     current_user: User = Depends(get_current_user),
@@ -408,72 +415,26 @@ def answer_question(
 ):
     """Answer a specific question from the AI"""
     
-    enquiry = db.query(Enquiry).filter(
-        Enquiry.id == enquiry_id,
-        Enquiry.customer_id == current_user.id
-    ).first()
-    
-    if not enquiry:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Enquiry not found"
-        )
+    enquiry = await run_in_threadpool(_get_customer_enquiry, db, enquiry_id, current_user.id)
     
     # Store answer in collected_data
     if not enquiry.collected_data:
         enquiry.collected_data = {}
     
-    enquiry.collected_data[answer_data.question_key] = answer_data.answer
+    # May overwrite an earlier answer - let the tree cursor rewind to it
+    tree_engine.record_answer(enquiry.collected_data, answer_data.question_key, answer_data.answer)
     
-    # Save customer answer as message
-    customer_message = EnquiryMessage(
-        enquiry_id=enquiry.id,
-        role="customer",
-        content=f"{answer_data.question_key}: {answer_data.answer}"
-    )
-    db.add(customer_message)
-    db.commit()
+    from sqlalchemy.orm.attributes import flag_modified
+    flag_modified(enquiry, "collected_data")
     
-    # Get AI response
-    ai_response = ai_assistant.process_enquiry(db, enquiry)
+    # Save customer answer as message (commits the answer too)
+    await run_in_threadpool(_save_customer_message, db, enquiry, f"{answer_data.question_key}: {answer_data.answer}")
     
-    # Save AI response
-    assistant_message = EnquiryMessage(
-        enquiry_id=enquiry.id,
-        role="assistant",
-        content=ai_response.message
-    )
-    db.add(assistant_message)
-    
-    # Update status and show draft if ready
-    if ai_response.draft_available:
-        enquiry.status = EnquiryStatus.DRAFT_READY
-        db.commit()
-        
-        # Generate and show draft quote to user
-        try:
-            draft = quote_engine.calculate_draft_quote(db, enquiry)
-            
-            # ALWAYS show the draft to the user
-            ai_response.draft_quote = draft
-            
-            # Auto-submit to admin if all info is available
-            if draft.can_submit and draft.base_price > 0:
-                # Create quote (no KnowledgeChunk dependency)
-                quote = quote_engine.create_quote_from_draft(
-                    db, enquiry.id, draft, source_chunk_ids=[]
-                )
-                
-                # Update enquiry status
-                enquiry.status = EnquiryStatus.SENT_TO_ADMIN
-                db.commit()
-                
-        except Exception as e:
-            print(f"Error generating draft quote: {str(e)}")
-            import traceback
-            traceback.print_exc()
+    # Get AI response
+    ai_response = await ai_assistant.process_enquiry_async(db, enquiry)
     
-    db.commit()
+    # Save AI response, pricing the draft if ready
+    await run_in_threadpool(_save_ai_response, db, enquiry, ai_response, False)
     
     return ai_response
 
@@ -618,13 +579,11 @@ def generate_conversation_title(
     current_user: User = Depends(get_current_user),
 ):
     """Generate a creative conversation title based on the first message"""
-    from openai import OpenAI
     from app.config import settings
+    from app.services.llm_gateway import llm_gateway
 
     try:
-        client = OpenAI(api_key=settings.OPENAI_API_KEY)
-
-        response = client.chat.completions.create(
+        response = llm_gateway.client.chat.completions.create(
             model=settings.OPENAI_MODEL,
             messages=[
                 {
@@ -6,6 +6,12 @@ from app.models import User, KnowledgeChunk
 from app.schemas import KnowledgeChunkResponse, KnowledgeSearchRequest, KnowledgeSearchResult
 from app.auth import get_current_user, get_current_admin
 from app.services.vector_store import vector_store
+from app.services.llm_cache import llm_cache
+from app.services.intent_classifier import intent_classifier
+from app.services.answer_parser import answer_parser
+from app.services.llm_gateway import llm_gateway
+from app.services.price_index import price_index
+from app.services.rules_engine import rules_engine
 
 router = APIRouter(prefix="/api/kb", tags=["Knowledge Base"])
 
@@ -109,5 +115,11 @@ def get_kb_stats(
     return {
         "total_chunks": total_chunks,
         "chunks_with_price": chunks_with_price,
-        "vector_store": vector_stats
+        "vector_store": vector_stats,
+        "llm_cache": llm_cache.stats(),
+        "intent_classifier": intent_classifier.stats(),
+        "answer_parser": answer_parser.stats(),
+        "llm_gateway": llm_gateway.stats(),
+        "price_index": price_index.stats(),
+        "business_rules": rules_engine.stats()
     }
@@ -1,7 +1,7 @@
 from pydantic import BaseModel, EmailStr, Field
 from typing import Optional, List, Dict, Any
 from datetime import datetime
-from app.models import UserRole, DocumentStatus, EnquiryStatus, QuoteStatus, ProductDocumentType
+from app.models import UserRole, DocumentStatus, EnquiryStatus, QuoteStatus, ProductDocumentType, JobStatus
 
 
 # User Schemas
@@ -46,6 +46,7 @@ class DocumentResponse(BaseModel):
     original_filename: str
     file_type: Optional[str]
     file_size: Optional[int]
+    content_hash: Optional[str] = None
     status: DocumentStatus
     summary: Optional[str]
     created_at: datetime
@@ -60,6 +61,50 @@ class DocumentSummaryUpdate(BaseModel):
     summary: str
 
 
+class BulkUploadSkippedFile(BaseModel):
+    filename: str
+    reason: str
+
+
+class BulkUploadResponse(BaseModel):
+    job_id: Optional[int]  # Poll GET /api/documents/jobs/{job_id} for per-file progress
+    total_files: int
+    queued_count: int
+    reused_count: int
+    documents: List[DocumentResponse]
+    skipped: List[BulkUploadSkippedFile] = []
+
+
+# Processing Job Schemas
+class ProcessingJobItemResponse(BaseModel):
+    document_id: int
+    status: JobStatus
+    completed_chunks: int
+    total_chunks: Optional[int]
+    error_message: Optional[str]
+    started_at: Optional[datetime]
+    finished_at: Optional[datetime]
+    
+    class Config:
+        from_attributes = True
+
+
+class ProcessingJobResponse(BaseModel):
+    id: int
+    job_type: str
+    status: JobStatus
+    total_documents: int
+    completed_documents: int
+    failed_documents: int
+    completed_chunks: int
+    total_chunks: int
+    error_message: Optional[str]
+    created_at: datetime
+    started_at: Optional[datetime]
+    finished_at: Optional[datetime]
+    items: List[ProcessingJobItemResponse] = []
+
+
 # Product Document Schemas
 class ProductDocumentCreate(BaseModel):
     product_name: str
@@ -224,6 +269,7 @@ class DraftQuotePreview(BaseModel):
     source_references: List[str]
     missing_info: List[str] = []
     can_submit: bool
+    timings: Optional[Dict[str, float]] = None  # Per-step pipeline wall time (ms)
 
 
 # Audit Schemas
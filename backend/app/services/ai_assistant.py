@@ -1,19 +1,71 @@
 from typing import List, Dict, Any, Tuple, Optional
-from openai import OpenAI
+from starlette.concurrency import run_in_threadpool, iterate_in_threadpool
 from sqlalchemy.orm import Session
+import asyncio
 import json
 from app.config import settings
 from app.models import Enquiry, EnquiryMessage, KnowledgeChunk, DecisionTree, EnquiryStatus, ProductDocument, Document
 from app.services.vector_store import vector_store
+from app.services.llm_cache import llm_cache
+from app.services.llm_gateway import llm_gateway
+from app.services.intent_classifier import intent_classifier, last_assistant_message
 from app.services.quote_engine import quote_engine
 from app.schemas import AIQuestion, AIResponse
 
 
+# Functions offered to the model once the customer is in the quote process
+QUOTE_FUNCTIONS = [
+    {
+        "name": "ask_question",
+        "description": "Ask the customer a clarifying question",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "question_key": {
+                    "type": "string",
+                    "description": "Unique key for this question (e.g., 'area', 'location')"
+                },
+                "question": {
+                    "type": "string",
+                    "description": "The question to ask the customer"
+                },
+                "question_type": {
+                    "type": "string",
+                    "enum": ["text", "choice", "boolean", "number"],
+                    "description": "Type of answer expected"
+                },
+                "choices": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "For choice type questions, list of options"
+                }
+            },
+            "required": ["question_key", "question", "question_type"]
+        }
+    },
+    {
+        "name": "draft_ready",
+        "description": "CALL THIS FUNCTION to generate the actual draft quote. Call it when: 1) Customer explicitly says 'give me a quote', 'generate quote', 'provide quote', etc. OR 2) Customer confirms after you've summarized the information. You MUST have service type, quantity/area collected before calling.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "summary": {
+                    "type": "string",
+                    "description": "Brief summary of the quote details (e.g., 'Vinyl flooring for 31 sqm at Singapore Bedok 42 Street')"
+                }
+            },
+            "required": ["summary"]
+        }
+    }
+]
+
+
 class AIAssistant:
     """AI Assistant for customer interaction using GPT-5"""
     
     def __init__(self):
-        self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
+        self.client = llm_gateway.client
+        self.async_client = llm_gateway.async_client
         self.vision_model = "gpt-4o"  # GPT-4 with vision for image analysis
         self.system_prompt = """You are a professional sales assistant for Ezzo Sales, a quotation system.
 
@@ -136,23 +188,7 @@ Remember: Build rapport with conversation first, offer quotes when appropriate,
         if tree:
             return self._process_with_tree(db, enquiry, tree, user_message)
         
-        # Get conversation history
-        messages = self._build_conversation_history(enquiry, db)
-        
-        # Add user message if provided
-        if user_message:
-            messages.append({
-                "role": "user",
-                "content": user_message
-            })
-        
-        # Search knowledge base for relevant information
-        kb_context = self._search_knowledge_base(enquiry.initial_message)
-        
-        # Add KB context to system message
-        if kb_context:
-            kb_text = "\n\nRelevant information from knowledge base:\n" + kb_context
-            messages[0]["content"] += kb_text
+        messages = self._build_chat_messages(db, enquiry, user_message)
         
         # Check if this is a general question or quote request
         message_to_check = enquiry.initial_message
@@ -164,50 +200,7 @@ Remember: Build rapport with conversation first, offer quotes when appropriate,
         try:
             # Only use function calling for quote requests
             if is_quote_request:
-                functions = [
-                    {
-                        "name": "ask_question",
-                        "description": "Ask the customer a clarifying question",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "question_key": {
-                                    "type": "string",
-                                    "description": "Unique key for this question (e.g., 'area', 'location')"
-                                },
-                                "question": {
-                                    "type": "string",
-                                    "description": "The question to ask the customer"
-                                },
-                                "question_type": {
-                                    "type": "string",
-                                    "enum": ["text", "choice", "boolean", "number"],
-                                    "description": "Type of answer expected"
-                                },
-                                "choices": {
-                                    "type": "array",
-                                    "items": {"type": "string"},
-                                    "description": "For choice type questions, list of options"
-                                }
-                            },
-                            "required": ["question_key", "question", "question_type"]
-                        }
-                    },
-                    {
-                        "name": "draft_ready",
-                        "description": "CALL THIS FUNCTION to generate the actual draft quote. Call it when: 1) Customer explicitly says 'give me a quote', 'generate quote', 'provide quote', etc. OR 2) Customer confirms after you've summarized the information. You MUST have service type, quantity/area collected before calling.",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "summary": {
-                                    "type": "string",
-                                    "description": "Brief summary of the quote details (e.g., 'Vinyl flooring for 31 sqm at Singapore Bedok 42 Street')"
-                                }
-                            },
-                            "required": ["summary"]
-                        }
-                    }
-                ]
+                functions = QUOTE_FUNCTIONS
             else:
                 functions = None
             
@@ -218,42 +211,7 @@ Remember: Build rapport with conversation first, offer quotes when appropriate,
                 functions=functions
             )
             
-            choice = response.choices[0]
-            
-            # Check if function was called
-            if choice.finish_reason == "function_call" or (hasattr(choice.message, 'function_call') and choice.message.function_call):
-                function_call = choice.message.function_call
-                function_name = function_call.name
-                function_args = json.loads(function_call.arguments)
-                
-                if function_name == "ask_question":
-                    return AIResponse(
-                        message=choice.message.content or function_args.get("question"),
-                        questions=[AIQuestion(
-                            key=function_args.get("question_key"),
-                            question=function_args.get("question"),
-                            type=function_args.get("question_type"),
-                            choices=function_args.get("choices"),
-                            required=True
-                        )],
-                        draft_available=False
-                    )
-                
-                elif function_name == "draft_ready":
-                    summary_msg = function_args.get("summary", "")
-                    default_msg = "Alright, the draft quotation would be:"
-                    return AIResponse(
-                        message=summary_msg if summary_msg else default_msg,
-                        questions=[],
-                        draft_available=True
-                    )
-            
-            # Regular response
-            return AIResponse(
-                message=choice.message.content,
-                questions=[],
-                draft_available=self._check_if_ready(enquiry)
-            )
+            return self._response_from_choice(response.choices[0], enquiry)
             
         except Exception as e:
             print(f"Error in AI processing: {str(e)}")
@@ -263,202 +221,192 @@ Remember: Build rapport with conversation first, offer quotes when appropriate,
                 draft_available=False
             )
     
-    def process_enquiry_stream(
+    def _response_from_choice(self, choice, enquiry: Enquiry) -> AIResponse:
+        """Turn a (non-streamed) chat completion choice into an AIResponse"""
+        # Check if function was called
+        if choice.finish_reason == "function_call" or (hasattr(choice.message, 'function_call') and choice.message.function_call):
+            function_call = choice.message.function_call
+            function_name = function_call.name
+            function_args = json.loads(function_call.arguments)
+            
+            if function_name == "ask_question":
+                return AIResponse(
+                    message=choice.message.content or function_args.get("question"),
+                    questions=[AIQuestion(
+                        key=function_args.get("question_key"),
+                        question=function_args.get("question"),
+                        type=function_args.get("question_type"),
+                        choices=function_args.get("choices"),
+                        required=True
+                    )],
+                    draft_available=False
+                )
+            
+            elif function_name == "draft_ready":
+                summary_msg = function_args.get("summary", "")
+                default_msg = "Alright, the draft quotation would be:"
+                return AIResponse(
+                    message=summary_msg if summary_msg else default_msg,
+                    questions=[],
+                    draft_available=True
+                )
+        
+        # Regular response
+        return AIResponse(
+            message=choice.message.content,
+            questions=[],
+            draft_available=self._check_if_ready(enquiry)
+        )
+    
+    # ------------------------------------------------------------------
+    # Async chat path
+    #
+    # LLM calls are awaited on the event loop so a slow completion doesn't hold a
+    # threadpool worker. Everything that touches the request's (sync) Session -
+    # queries, commits, lazy loads of expired attributes - and other blocking work
+    # (KB search, the decision tree flow, draft quote pricing) runs in the threadpool.
+    # ------------------------------------------------------------------
+    
+    def _load_turn_state(self, db: Session, enquiry: Enquiry) -> Optional[DecisionTree]:
+        """Load the enquiry, its messages and its assigned tree, so the async flow reads them without lazy loads"""
+        db.refresh(enquiry)
+        enquiry.messages
+        if enquiry.service_tree_id:
+            return db.query(DecisionTree).filter(DecisionTree.id == enquiry.service_tree_id).first()
+        return None
+    
+    def _assign_tree(self, db: Session, enquiry: Enquiry, tree: DecisionTree):
+        """Assign a matched tree to the enquiry and reload what the commit expired"""
+        enquiry.service_tree_id = tree.id
+        db.commit()
+        print(f"Matched service tree: {tree.service_name} (ID: {tree.id})")
+        db.refresh(tree)
+        self._load_turn_state(db, enquiry)
+    
+    @staticmethod
+    def _recent_history(enquiry: Enquiry) -> str:
+        conv_history = ""
+        for msg in enquiry.messages[-4:]:
+            conv_history += f"{msg.role}: {msg.content}\n"
+        return conv_history
+    
+    async def process_enquiry_async(
         self,
         db: Session,
         enquiry: Enquiry,
         user_message: str = None
-    ):
-        """Process enquiry with streaming response"""
-        
+    ) -> AIResponse:
+        """Async counterpart of process_enquiry"""
         from app.services.tree_engine import tree_engine
         
-        # First check if enquiry has a decision tree assigned
-        tree = None
-        if enquiry.service_tree_id:
-            tree = db.query(DecisionTree).filter(DecisionTree.id == enquiry.service_tree_id).first()
+        tree = await run_in_threadpool(self._load_turn_state, db, enquiry)
         
-        # If no tree assigned yet, check if user explicitly wants a quote
+        message_to_check = enquiry.initial_message
+        if user_message:
+            message_to_check = message_to_check + " " + user_message
+        
+        is_quote_request = False
         if not tree:
-            # Build message to match against
-            message_to_match = enquiry.initial_message
-            if user_message:
-                message_to_match = message_to_match + " " + user_message
+            conv_history = self._recent_history(enquiry)
             
-            # Build conversation history for context
-            conv_history = ""
-            if enquiry.messages:
-                recent_msgs = enquiry.messages[-4:]  # Last 4 messages for context
-                for msg in recent_msgs:
-                    conv_history += f"{msg.role}: {msg.content}\n"
+            # Both quote checks are independent, so ask them at the same time
+            wants_quote, is_quote_request = await asyncio.gather(
+                self._user_wants_quote_async(user_message or enquiry.initial_message, conv_history),
+                self._user_wants_quote_async(message_to_check)
+            )
             
-            # Only match tree if user explicitly wants a quote
-            if self._user_wants_quote(user_message or enquiry.initial_message, conv_history):
-                tree = tree_engine.match_service(db, message_to_match)
+            if wants_quote:
+                tree = await tree_engine.match_service_async(db, message_to_check)
                 if tree:
-                    # Assign the tree to the enquiry
-                    enquiry.service_tree_id = tree.id
-                    db.commit()
-                    print(f"Matched service tree: {tree.service_name} (ID: {tree.id})")
-        
-        # Check if user wants to see a drawing (before tree processing)
-        # Only check if there's a user message (not on initial enquiry creation)
-        if user_message and self._user_wants_drawing(user_message, enquiry):
-            # Detect which product they're asking about
-            product_name = self._detect_product(user_message, enquiry)
-            
-            if product_name:
-                # Detect document type from user request
-                message_lower = user_message.lower()
-                if 'catalog' in message_lower or 'catalogue' in message_lower:
-                    doc_type = 'catalog'
-                elif 'brochure' in message_lower:
-                    doc_type = 'brochure'
-                elif 'spec' in message_lower or 'specification' in message_lower:
-                    doc_type = 'spec_sheet'
-                else:
-                    doc_type = 'technical_drawing'  # Default
-                
-                # Query database for product document with fallback
-                product_doc = db.query(ProductDocument).join(Document).filter(
-                    ProductDocument.product_name == product_name,
-                    ProductDocument.document_type == doc_type,
-                    ProductDocument.is_active == True
-                ).order_by(ProductDocument.display_order).first()
-                
-                # If not found, try any type for this product
-                if not product_doc:
-                    product_doc = db.query(ProductDocument).join(Document).filter(
-                        ProductDocument.product_name == product_name,
-                        ProductDocument.is_active == True
-                    ).order_by(
-                        # Priority: technical_drawing > catalog > brochure > spec_sheet
-                        ProductDocument.document_type.desc(),
-                        ProductDocument.display_order
-                    ).first()
-                
-                if product_doc:
-                    # Show the product document
-                    product_display = product_name.replace('_', ' ').title()
-                    doc_type_display = product_doc.document_type.replace('_', ' ')
-                    drawing_response = f"Here's the {doc_type_display} for the {product_display}:"
-                    
-                    # Save the message
-                    drawing_msg = EnquiryMessage(
-                        enquiry_id=enquiry.id,
-                        role="assistant",
-                        content=drawing_response
-                    )
-                    db.add(drawing_msg)
-                    db.commit()
-                    
-                    # Stream the drawing response
-                    yield {
-                        'type': 'drawing',
-                        'message': drawing_response,
-                        'drawing_url': f'/api/documents/drawings/{product_name}?document_type={product_doc.document_type}',
-                        'filename': product_doc.document.original_filename
-                    }
-                    yield {'type': 'done'}
-                    return
+                    await run_in_threadpool(self._assign_tree, db, enquiry, tree)
         
-        # If we have a decision tree, use tree-based questioning
         if tree:
-            # Refresh the enquiry object to ensure it's bound to the session
-            db.refresh(enquiry)
-            yield from self._process_with_tree_stream(db, enquiry, tree, user_message)
-            return
-        
-        # Refresh the enquiry object to ensure it's bound to the session
-        db.refresh(enquiry)
+            return await run_in_threadpool(self._process_with_tree, db, enquiry, tree, user_message)
         
-        # Get conversation history
-        messages = self._build_conversation_history(enquiry, db)
+        messages = await run_in_threadpool(self._build_chat_messages, db, enquiry, user_message)
         
-        # Add user message if provided
-        if user_message:
-            messages.append({
-                "role": "user",
-                "content": user_message
-            })
-        
-        # Search knowledge base for relevant information
-        kb_context = self._search_knowledge_base(enquiry.initial_message)
+        try:
+            response = await self.async_client.chat.completions.create(
+                model=settings.OPENAI_MODEL,
+                messages=messages,
+                temperature=0.7,
+                functions=QUOTE_FUNCTIONS if is_quote_request else None
+            )
+            
+            return self._response_from_choice(response.choices[0], enquiry)
+            
+        except Exception as e:
+            print(f"Error in AI processing: {str(e)}")
+            return AIResponse(
+                message="I apologize, but I'm having trouble processing your request. Please try again.",
+                questions=[],
+                draft_available=False
+            )
+    
+    async def process_enquiry_stream_async(
+        self,
+        db: Session,
+        enquiry: Enquiry,
+        user_message: str = None
+    ):
+        """Process enquiry with streaming response (async counterpart of process_enquiry)"""
+        from app.services.tree_engine import tree_engine
         
-        # Add KB context to system message
-        if kb_context:
-            kb_text = "\n\nRelevant information from knowledge base:\n" + kb_context
-            messages[0]["content"] += kb_text
+        tree = await run_in_threadpool(self._load_turn_state, db, enquiry)
         
-        # Check if this is a general question or quote request
         message_to_check = enquiry.initial_message
         if user_message:
             message_to_check = message_to_check + " " + user_message
-        is_quote_request = self._user_wants_quote(message_to_check)
         
-        # Get streaming AI response
-        try:
-            # Only use function calling for quote requests
-            if is_quote_request:
-                functions = [
-                    {
-                        "name": "ask_question",
-                        "description": "Ask the customer a clarifying question",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "question_key": {
-                                    "type": "string",
-                                    "description": "Unique key for this question (e.g., 'area', 'location')"
-                                },
-                                "question": {
-                                    "type": "string",
-                                    "description": "The question to ask the customer"
-                                },
-                                "question_type": {
-                                    "type": "string",
-                                    "enum": ["text", "choice", "boolean", "number"],
-                                    "description": "Type of answer expected"
-                                },
-                                "choices": {
-                                    "type": "array",
-                                    "items": {"type": "string"},
-                                    "description": "For choice type questions, list of options"
-                                }
-                            },
-                            "required": ["question_key", "question", "question_type"]
-                        }
-                    },
-                    {
-                        "name": "draft_ready",
-                        "description": "CALL THIS FUNCTION to generate the actual draft quote. Call it when: 1) Customer explicitly says 'give me a quote', 'generate quote', 'provide quote', etc. OR 2) Customer confirms after you've summarized the information. You MUST have service type, quantity/area collected before calling.",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "summary": {
-                                    "type": "string",
-                                    "description": "Brief summary of the quote details (e.g., 'Vinyl flooring for 31 sqm at Singapore Bedok 42 Street')"
-                                }
-                            },
-                            "required": ["summary"]
-                        }
-                    }
-                ]
-            else:
-                functions = None
+        # Quote intent and drawing detection don't depend on each other - run them concurrently
+        checks = {}
+        if not tree:
+            conv_history = self._recent_history(enquiry)
+            checks['wants_quote'] = self._user_wants_quote_async(user_message or enquiry.initial_message, conv_history)
+            checks['is_quote_request'] = self._user_wants_quote_async(message_to_check)
+        # With a tree in combined mode, the tree's turn analysis covers drawing requests
+        if user_message and not (tree and settings.TREE_TURN_MODE == "combined"):
+            checks['wants_drawing'] = self._user_wants_drawing_async(user_message, enquiry)
+        
+        results = dict(zip(checks.keys(), await asyncio.gather(*checks.values())))
+        
+        if results.get('wants_quote'):
+            tree = await tree_engine.match_service_async(db, message_to_check)
+            if tree:
+                await run_in_threadpool(self._assign_tree, db, enquiry, tree)
+        
+        if results.get('wants_drawing'):
+            product_name = await self._detect_product_async(user_message, enquiry)
             
-            response = self.client.chat.completions.create(
+            drawing_event = None
+            if product_name:
+                drawing_event = await run_in_threadpool(self._product_document_event, db, enquiry, product_name, user_message)
+            if drawing_event:
+                yield drawing_event
+                yield {'type': 'done'}
+                return
+        
+        # Tree turns are mostly bookkeeping plus one analysis call; run the sync flow off the loop
+        if tree:
+            async for event in iterate_in_threadpool(self._process_with_tree_stream(db, enquiry, tree, user_message)):
+                yield event
+            return
+        
+        messages = await run_in_threadpool(self._build_chat_messages, db, enquiry, user_message)
+        
+        try:
+            response = await self.async_client.chat.completions.create(
                 model=settings.OPENAI_MODEL,
                 messages=messages,
                 temperature=0.7,
                 stream=True,
-                functions=functions
+                functions=QUOTE_FUNCTIONS if results.get('is_quote_request') else None
             )
             
             full_content = ""
             function_call_data = None
             
-            for chunk in response:
+            async for chunk in response:
                 if chunk.choices[0].delta.content:
                     content = chunk.choices[0].delta.content
                     full_content += content
@@ -477,150 +425,225 @@ Remember: Build rapport with conversation first, offer quotes when appropriate,
                     if chunk.choices[0].delta.function_call.arguments:
                         function_call_data['arguments'] += chunk.choices[0].delta.function_call.arguments
             
-            # Handle function calls
-            if function_call_data and function_call_data['name']:
-                try:
-                    function_args = json.loads(function_call_data['arguments'])
+            # Saving the reply may price a draft quote (blocking calls) - keep it off the loop
+            async for event in iterate_in_threadpool(
+                self._finish_stream_turn(db, enquiry, full_content, function_call_data)
+            ):
+                yield event
+            
+        except Exception as e:
+            print(f"Error in AI streaming: {str(e)}")
+            import traceback
+            traceback.print_exc()
+            yield {
+                'type': 'error',
+                'message': "I apologize, but I'm having trouble processing your request. Please try again."
+            }
+    
+    def _finish_stream_turn(
+        self,
+        db: Session,
+        enquiry: Enquiry,
+        full_content: str,
+        function_call_data: Optional[Dict[str, str]]
+    ):
+        """Save a streamed (non-tree) reply and act on any function call; yields the follow-up events"""
+        # Handle function calls
+        if function_call_data and function_call_data['name']:
+            try:
+                function_args = json.loads(function_call_data['arguments'])
+                
+                if function_call_data['name'] == "ask_question":
+                    # Save AI response
+                    assistant_message = EnquiryMessage(
+                        enquiry_id=enquiry.id,
+                        role="assistant",
+                        content=full_content or function_args.get("question")
+                    )
+                    db.add(assistant_message)
+                    db.commit()
                     
-                    if function_call_data['name'] == "ask_question":
-                        # Save AI response
-                        assistant_message = EnquiryMessage(
-                            enquiry_id=enquiry.id,
-                            role="assistant",
-                            content=full_content or function_args.get("question")
-                        )
-                        db.add(assistant_message)
-                        db.commit()
+                    yield {
+                        'type': 'question',
+                        'question_key': function_args.get("question_key"),
+                        'question': function_args.get("question"),
+                        'question_type': function_args.get("question_type"),
+                        'choices': function_args.get("choices"),
+                        'required': True
+                    }
+                    return
+                
+                elif function_call_data['name'] == "draft_ready":
+                    # Save AI response
+                    assistant_message = EnquiryMessage(
+                        enquiry_id=enquiry.id,
+                        role="assistant",
+                        content=full_content or function_args.get("summary", "Alright, the draft quotation would be:")
+                    )
+                    db.add(assistant_message)
+                    
+                    # Update status and generate draft quote
+                    enquiry.status = EnquiryStatus.DRAFT_READY
+                    
+                    # Only extract data if NOT using a decision tree
+                    if not enquiry.service_tree_id:
+                        try:
+                            # Build conversation text
+                            conversation_text = f"Initial request: {enquiry.initial_message}\n\n"
+                            for msg in enquiry.messages:
+                                conversation_text += f"{msg.role}: {msg.content}\n"
+                            
+                            # Use AI to extract structured requirements
+                            extracted_data = self.extract_requirements(conversation_text)
+                            print(f"Extracted data from conversation: {extracted_data}")
+                            
+                            # Store in collected_data
+                            if extracted_data:
+                                enquiry.collected_data = extracted_data
+                        except Exception as extract_err:
+                            print(f"Error extracting data: {str(extract_err)}")
+                    
+                    db.commit()
+                    
+                    # Generate and show draft quote to user
+                    try:
+                        draft = quote_engine.calculate_draft_quote(db, enquiry)
                         
                         yield {
-                            'type': 'question',
-                            'question_key': function_args.get("question_key"),
-                            'question': function_args.get("question"),
-                            'question_type': function_args.get("question_type"),
-                            'choices': function_args.get("choices"),
-                            'required': True
+                            'type': 'draft_ready',
+                            'message': full_content or function_args.get("summary", "Alright, the draft quotation would be:"),
+                            'draft_quote': draft.dict() if draft else None
                         }
-                        return
-                    
-                    elif function_call_data['name'] == "draft_ready":
-                        # Save AI response
-                        assistant_message = EnquiryMessage(
-                            enquiry_id=enquiry.id,
-                            role="assistant",
-                            content=full_content or function_args.get("summary", "Alright, the draft quotation would be:")
-                        )
-                        db.add(assistant_message)
-                        
-                        # Update status and generate draft quote
-                        enquiry.status = EnquiryStatus.DRAFT_READY
-                        
-                        # Only extract data if NOT using a decision tree
-                        if not enquiry.service_tree_id:
-                            try:
-                                # Build conversation text
-                                conversation_text = f"Initial request: {enquiry.initial_message}\n\n"
-                                for msg in enquiry.messages:
-                                    conversation_text += f"{msg.role}: {msg.content}\n"
-                                
-                                # Use AI to extract structured requirements
-                                extracted_data = self.extract_requirements(conversation_text)
-                                print(f"Extracted data from conversation: {extracted_data}")
-                                
-                                # Store in collected_data
-                                if extracted_data:
-                                    enquiry.collected_data = extracted_data
-                            except Exception as extract_err:
-                                print(f"Error extracting data: {str(extract_err)}")
-                        
-                        db.commit()
                         
-                        # Generate and show draft quote to user
-                        try:
-                            draft = quote_engine.calculate_draft_quote(db, enquiry)
+                        # Auto-submit to admin if all info is available
+                        if draft and draft.can_submit and draft.base_price > 0:
+                            # Create quote (no KnowledgeChunk dependency)
+                            quote = quote_engine.create_quote_from_draft(
+                                db, enquiry.id, draft, source_chunk_ids=[]
+                            )
                             
-                            yield {
-                                'type': 'draft_ready',
-                                'message': full_content or function_args.get("summary", "Alright, the draft quotation would be:"),
-                                'draft_quote': draft.dict() if draft else None
-                            }
+                            # Update enquiry status
+                            enquiry.status = EnquiryStatus.SENT_TO_ADMIN
+                            db.commit()
                             
-                            # Auto-submit to admin if all info is available
-                            if draft and draft.can_submit and draft.base_price > 0:
-                                # Create quote (no KnowledgeChunk dependency)
-                                quote = quote_engine.create_quote_from_draft(
-                                    db, enquiry.id, draft, source_chunk_ids=[]
-                                )
-                                
-                                # Update enquiry status
-                                enquiry.status = EnquiryStatus.SENT_TO_ADMIN
-                                db.commit()
-                                
-                        except Exception as e:
-                            print(f"Error generating draft quote: {str(e)}")
-                            import traceback
-                            traceback.print_exc()
-                        
-                        return
-                
-                except json.JSONDecodeError:
-                    pass
+                    except Exception as e:
+                        print(f"Error generating draft quote: {str(e)}")
+                        import traceback
+                        traceback.print_exc()
+                    
+                    return
             
-            # Regular response - save to database
-            assistant_message = EnquiryMessage(
-                enquiry_id=enquiry.id,
-                role="assistant",
-                content=full_content
-            )
-            db.add(assistant_message)
+            except json.JSONDecodeError:
+                pass
+        
+        # Regular response - save to database
+        assistant_message = EnquiryMessage(
+            enquiry_id=enquiry.id,
+            role="assistant",
+            content=full_content
+        )
+        db.add(assistant_message)
+        db.commit()
+        
+        # Check if AI should offer to create a quote
+        if not enquiry.service_tree_id and self._should_offer_quote(enquiry, full_content):
+            # Append quote offer to the response
+            quote_offer = "\n\nWould you like me to create a detailed quote for this?"
+            
+            # Save the quote offer as part of the message
+            assistant_message.content = full_content + quote_offer
             db.commit()
             
-            # Check if AI should offer to create a quote
-            if not enquiry.service_tree_id and self._should_offer_quote(enquiry, full_content):
-                # Append quote offer to the response
-                quote_offer = "\n\nWould you like me to create a detailed quote for this?"
-                
-                # Save the quote offer as part of the message
-                assistant_message.content = full_content + quote_offer
-                db.commit()
-                
-                # Yield the quote offer
+            # Yield the quote offer
+            yield {
+                'type': 'content',
+                'content': quote_offer
+            }
+            
+            # Mark that we've offered a quote
+            collected_data = enquiry.collected_data or {}
+            collected_data['_quote_offered'] = True
+            enquiry.collected_data = collected_data
+            
+            from sqlalchemy.orm.attributes import flag_modified
+            flag_modified(enquiry, "collected_data")
+        db.commit()
+        
+        # Check if draft is ready
+        if self._check_if_ready(enquiry):
+            enquiry.status = EnquiryStatus.DRAFT_READY
+            db.commit()
+            
+            try:
+                draft = quote_engine.calculate_draft_quote(db, enquiry)
                 yield {
-                    'type': 'content',
-                    'content': quote_offer
+                    'type': 'draft_ready',
+                    'message': full_content,
+                    'draft_quote': draft.dict() if draft else None
                 }
-                
-                # Mark that we've offered a quote
-                collected_data = enquiry.collected_data or {}
-                collected_data['_quote_offered'] = True
-                enquiry.collected_data = collected_data
-                
-                from sqlalchemy.orm.attributes import flag_modified
-                flag_modified(enquiry, "collected_data")
+            except Exception as e:
+                print(f"Error generating draft quote: {str(e)}")
+    
+    def _product_document_event(
+        self,
+        db: Session,
+        enquiry: Enquiry,
+        product_name: str,
+        user_message: str
+    ) -> Optional[Dict[str, Any]]:
+        """Find the product document the user asked to see and save the reply; returns the stream event or None"""
+        # Detect document type from user request
+        message_lower = user_message.lower()
+        if 'catalog' in message_lower or 'catalogue' in message_lower:
+            doc_type = 'catalog'
+        elif 'brochure' in message_lower:
+            doc_type = 'brochure'
+        elif 'spec' in message_lower or 'specification' in message_lower:
+            doc_type = 'spec_sheet'
+        else:
+            doc_type = 'technical_drawing'  # Default
+        
+        # Query database for product document with fallback
+        product_doc = db.query(ProductDocument).join(Document).filter(
+            ProductDocument.product_name == product_name,
+            ProductDocument.document_type == doc_type,
+            ProductDocument.is_active == True
+        ).order_by(ProductDocument.display_order).first()
+        
+        # If not found, try any type for this product
+        if not product_doc:
+            product_doc = db.query(ProductDocument).join(Document).filter(
+                ProductDocument.product_name == product_name,
+                ProductDocument.is_active == True
+            ).order_by(
+                # Priority: technical_drawing > catalog > brochure > spec_sheet
+                ProductDocument.document_type.desc(),
+                ProductDocument.display_order
+            ).first()
+        
+        if product_doc:
+            # Show the product document
+            product_display = product_name.replace('_', ' ').title()
+            doc_type_display = product_doc.document_type.replace('_', ' ')
+            drawing_response = f"Here's the {doc_type_display} for the {product_display}:"
+            
+            # Save the message
+            drawing_msg = EnquiryMessage(
+                enquiry_id=enquiry.id,
+                role="assistant",
+                content=drawing_response
+            )
+            db.add(drawing_msg)
             db.commit()
             
-            # Check if draft is ready
-            if self._check_if_ready(enquiry):
-                enquiry.status = EnquiryStatus.DRAFT_READY
-                db.commit()
-                
-                try:
-                    draft = quote_engine.calculate_draft_quote(db, enquiry)
-                    yield {
-                        'type': 'draft_ready',
-                        'message': full_content,
-                        'draft_quote': draft.dict() if draft else None
-                    }
-                except Exception as e:
-                    print(f"Error generating draft quote: {str(e)}")
-            
-        except Exception as e:
-            print(f"Error in AI streaming: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            yield {
-                'type': 'error',
-                'message': "I apologize, but I'm having trouble processing your request. Please try again."
+            return {
+                'type': 'drawing',
+                'message': drawing_response,
+                'drawing_url': f'/api/documents/drawings/{product_name}?document_type={product_doc.document_type}',
+                'filename': product_doc.document.original_filename
             }
+        
+        return None
     
     def _process_with_tree_stream(
         self,
@@ -677,12 +700,22 @@ Remember: Build rapport with conversation first, offer quotes when appropriate,
                 not collected_data[next_q.key].get('confirmed')
             )
             
+            # One combined analysis call per turn, unless the old multi-call path is selected
+            turn = None
+            if settings.TREE_TURN_MODE == "combined":
+                context_value = collected_data[next_q.key].get('value') if is_context_confirmation else None
+                turn = self._analyze_turn(user_message, next_q, context_value)
+            
             if is_context_confirmation:
                 # User is responding to context confirmation
                 # Check if they're confirming or correcting
-                confirmation_intent = self._check_user_intent(user_message)
+                if turn:
+                    confirmed = turn['confirmed']
+                else:
+                    confirmation_intent = self._check_user_intent(user_message)
+                    confirmed = 'yes' in user_message.lower() or 'correct' in user_message.lower() or 'yep' in user_message.lower()
                 
-                if 'yes' in user_message.lower() or 'correct' in user_message.lower() or 'yep' in user_message.lower():
+                if confirmed:
                     # User confirmed context value
                     context_entry = collected_data[next_q.key]
                     context_entry['confirmed'] = True
@@ -698,11 +731,15 @@ Remember: Build rapport with conversation first, offer quotes when appropriate,
                     next_q = tree_engine.get_next_question(tree, collected_data)
                 else:
                     # User is providing a different answer (correction)
-                    parsed_answer = tree_engine.parse_answer(
-                        user_message, 
-                        next_q.type, 
-                        next_q.choices
-                    )
+                    if turn:
+                        parsed_answer = turn['parsed_answer']
+                    else:
+                        parsed_answer = tree_engine.parse_answer(
+                            user_message, 
+                            next_q.type, 
+                            next_q.choices,
+                            next_q.question
+                        )
                     
                     if parsed_answer is not None or (next_q.type == 'boolean' and isinstance(parsed_answer, bool)):
                         collected_data[next_q.key] = parsed_answer
@@ -725,67 +762,20 @@ Remember: Build rapport with conversation first, offer quotes when appropriate,
             else:
                 # Normal answer processing
                 # First check if user wants to see a drawing
-                if self._user_wants_drawing(user_message, enquiry):
+                wants_drawing = turn['wants_drawing'] if turn else self._user_wants_drawing(user_message, enquiry)
+                if wants_drawing:
                     # Detect which product they're asking about
                     product_name = self._detect_product(user_message, enquiry)
                     
-                    if product_name:
-                        # Detect document type from user request
-                        message_lower = user_message.lower()
-                        if 'catalog' in message_lower or 'catalogue' in message_lower:
-                            doc_type = 'catalog'
-                        elif 'brochure' in message_lower:
-                            doc_type = 'brochure'
-                        elif 'spec' in message_lower or 'specification' in message_lower:
-                            doc_type = 'spec_sheet'
-                        else:
-                            doc_type = 'technical_drawing'  # Default
-                        
-                        # Query database for product document with fallback
-                        product_doc = db.query(ProductDocument).join(Document).filter(
-                            ProductDocument.product_name == product_name,
-                            ProductDocument.document_type == doc_type,
-                            ProductDocument.is_active == True
-                        ).order_by(ProductDocument.display_order).first()
-                        
-                        # If not found, try any type for this product
-                        if not product_doc:
-                            product_doc = db.query(ProductDocument).join(Document).filter(
-                                ProductDocument.product_name == product_name,
-                                ProductDocument.is_active == True
-                            ).order_by(
-                                # Priority: technical_drawing > catalog > brochure > spec_sheet
-                                ProductDocument.document_type.desc(),
-                                ProductDocument.display_order
-                            ).first()
-                        
-                        if product_doc:
-                            # Show the product document
-                            product_display = product_name.replace('_', ' ').title()
-                            doc_type_display = product_doc.document_type.replace('_', ' ')
-                            drawing_response = f"Here's the {doc_type_display} for the {product_display}:"
-                            
-                            # Save the message
-                            drawing_msg = EnquiryMessage(
-                                enquiry_id=enquiry.id,
-                                role="assistant",
-                                content=drawing_response
-                            )
-                            db.add(drawing_msg)
-                            db.commit()
-                            
-                            # Yield drawing response
-                            yield {
-                                'type': 'drawing',
-                                'message': drawing_response,
-                                'drawing_url': f'/api/documents/drawings/{product_name}?document_type={product_doc.document_type}',
-                                'filename': product_doc.document.original_filename
-                            }
-                            yield {'type': 'done'}
-                            return
+                    drawing_event = self._product_document_event(db, enquiry, product_name, user_message) if product_name else None
+                    if drawing_event:
+                        yield drawing_event
+                        yield {'type': 'done'}
+                        return
                 
                 # Check if user is going sideways (asking a different question)
-                if self._is_sideways_question(user_message, next_q.type, next_q.question):
+                is_sideways = turn['is_sideways'] if turn else self._is_sideways_question(user_message, next_q.type, next_q.question)
+                if is_sideways:
                     # Answer their sideways question
                     sideways_answer = self._answer_sideways_question(user_message, enquiry, db)
                     
@@ -822,11 +812,15 @@ Remember: Build rapport with conversation first, offer quotes when appropriate,
                     return
                 
                 # Try to parse the answer based on question type
-                parsed_answer = tree_engine.parse_answer(
-                    user_message,
-                    next_q.type,
-                    next_q.choices
-                )
+                if turn:
+                    parsed_answer = turn['parsed_answer']
+                else:
+                    parsed_answer = tree_engine.parse_answer(
+                        user_message,
+                        next_q.type,
+                        next_q.choices,
+                        next_q.question
+                    )
             
                 print(f"Parsed answer for {next_q.key}: {parsed_answer} (type: {type(parsed_answer)})")
                 
@@ -848,7 +842,7 @@ Remember: Build rapport with conversation first, offer quotes when appropriate,
                     next_q = tree_engine.get_next_question(tree, collected_data)
                 else:
                     # Parsing failed - check if user wants to skip or proceed anyway
-                    user_intent = self._check_user_intent(user_message)
+                    user_intent = turn['intent'] if turn else self._check_user_intent(user_message)
                     
                     if user_intent == "skip" or user_intent == "proceed_anyway":
                         # User wants to skip this question - mark as empty string for optional questions
@@ -1018,12 +1012,32 @@ Remember: Build rapport with conversation first, offer quotes when appropriate,
         
         # If user provided a message AND tree has asked a question, process the answer
         if user_message and next_q and tree_has_asked_question:
+                # One combined analysis call per turn, unless the old multi-call path is selected
+                turn = self._analyze_turn(user_message, next_q) if settings.TREE_TURN_MODE == "combined" else None
+                
+                if turn and turn['is_sideways']:
+                    # Answer their side question, then repeat the pending one
+                    sideways_answer = self._answer_sideways_question(user_message, enquiry, db)
+                    return AIResponse(
+                        message=f"{sideways_answer}\n\nNow, back to your quote - {next_q.question}",
+                        questions=[next_q],
+                        draft_available=False
+                    )
+                
                 # Parse the answer based on question type
-                parsed_answer = tree_engine.parse_answer(
-                    user_message, 
-                    next_q.type, 
-                    next_q.choices
-                )
+                if turn:
+                    parsed_answer = turn['parsed_answer']
+                else:
+                    parsed_answer = tree_engine.parse_answer(
+                        user_message, 
+                        next_q.type, 
+                        next_q.choices,
+                        next_q.question
+                    )
+                
+                # Optional questions the user wants to skip are stored empty, as in the streaming flow
+                if parsed_answer is None and turn and turn['intent'] in ("skip", "proceed_anyway") and not next_q.required:
+                    parsed_answer = ""
                 
                 # Only store if we got a valid answer
                 if parsed_answer is not None:
@@ -1097,6 +1111,28 @@ Remember: Build rapport with conversation first, offer quotes when appropriate,
             draft_available=True
         )
     
+    def _build_chat_messages(self, db: Session, enquiry: Enquiry, user_message: str = None) -> List[Dict[str, str]]:
+        """Conversation history plus the new message, with knowledge base context in the system prompt"""
+        # Get conversation history
+        messages = self._build_conversation_history(enquiry, db)
+        
+        # Add user message if provided
+        if user_message:
+            messages.append({
+                "role": "user",
+                "content": user_message
+            })
+        
+        # Search knowledge base for relevant information
+        kb_context = self._search_knowledge_base(enquiry.initial_message)
+        
+        # Add KB context to system message
+        if kb_context:
+            kb_text = "\n\nRelevant information from knowledge base:\n" + kb_context
+            messages[0]["content"] += kb_text
+        
+        return messages
+    
     def _build_conversation_history(self, enquiry: Enquiry, db: Session = None) -> List[Dict[str, str]]:
         """Build conversation history for AI"""
         messages = [{"role": "system", "content": self.system_prompt}]
@@ -1221,20 +1257,19 @@ Only include fields that were clearly mentioned in the conversation."""
             traceback.print_exc()
             return {}
     
-    def _user_wants_quote(self, message: str, conversation_history: str = "") -> bool:
-        """Check if user explicitly wants a quote using AI"""
-        try:
-            # Build the full context
-            full_context = message
-            if conversation_history:
-                full_context = f"Recent conversation:\n{conversation_history}\n\nLatest user message: {message}"
-            
-            response = self.client.chat.completions.create(
-                model=settings.OPENAI_MODEL,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": """Determine if the user explicitly wants to START THE FORMAL QUOTE PROCESS.
+    def _quote_intent_request(self, message: str, conversation_history: str = "") -> Dict[str, Any]:
+        """Completion parameters for the quote intent check"""
+        # Build the full context
+        full_context = message
+        if conversation_history:
+            full_context = f"Recent conversation:\n{conversation_history}\n\nLatest user message: {message}"
+        
+        return dict(
+            model=settings.OPENAI_MODEL,
+            messages=[
+                {
+                    "role": "system",
+                    "content": """Determine if the user explicitly wants to START THE FORMAL QUOTE PROCESS.
 
 Return JSON: {"wants_quote": true/false}
 
@@ -1287,37 +1322,66 @@ Examples:
 - "how much" → {"wants_quote": false}
 - "Hello" → {"wants_quote": false}
 - "aluminum" (just answering a question) → {"wants_quote": false}"""
-                    },
-                    {
-                        "role": "user",
-                        "content": full_context
-                    }
-                ],
-                temperature=0,
-                response_format={"type": "json_object"},
-                max_tokens=50
-            )
-            
-            result = json.loads(response.choices[0].message.content)
-            return result.get('wants_quote', False)
+                },
+                {
+                    "role": "user",
+                    "content": full_context
+                }
+            ],
+            temperature=0,
+            response_format={"type": "json_object"},
+            max_tokens=50
+        )
+    
+    def _quote_intent_result(self, response, message: str, context: str) -> bool:
+        """Read a quote intent completion and teach the local classifier its answer"""
+        result = json.loads(response.choices[0].message.content)
+        wants_quote = bool(result.get('wants_quote', False))
+        intent_classifier.record('wants_quote', message, wants_quote, context)
+        return wants_quote
+    
+    def _user_wants_quote(self, message: str, conversation_history: str = "") -> bool:
+        """Check if user explicitly wants a quote using AI"""
+        # Local classifier settles greetings, "yes"/"ok" and explicit requests without a round trip
+        context = last_assistant_message(conversation_history)
+        local_answer = intent_classifier.predict('wants_quote', message, context)
+        if local_answer is not None:
+            return local_answer
+        
+        try:
+            response = llm_cache.create(self.client, **self._quote_intent_request(message, conversation_history))
+            return self._quote_intent_result(response, message, context)
         except Exception as e:
             print(f"Error checking quote intent: {str(e)}")
             return False
     
-    def _user_wants_drawing(self, message: str, enquiry: Enquiry) -> bool:
-        """Detect if user wants to see a product drawing/design"""
+    async def _user_wants_quote_async(self, message: str, conversation_history: str = "") -> bool:
+        """_user_wants_quote using the async client"""
+        context = last_assistant_message(conversation_history)
+        local_answer = intent_classifier.predict('wants_quote', message, context)
+        if local_answer is not None:
+            return local_answer
+        
         try:
-            # Build context about what product they're discussing
-            product_context = ""
-            if enquiry.initial_message:
-                product_context = f"Customer request: {enquiry.initial_message}\n"
-            
-            response = self.client.chat.completions.create(
-                model=settings.OPENAI_MODEL,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": """Determine if the user wants to see a product drawing, design, or visual.
+            response = await llm_cache.acreate(self.async_client, **self._quote_intent_request(message, conversation_history))
+            return self._quote_intent_result(response, message, context)
+        except Exception as e:
+            print(f"Error checking quote intent: {str(e)}")
+            return False
+    
+    def _drawing_intent_request(self, message: str, enquiry: Enquiry) -> Dict[str, Any]:
+        """Completion parameters for the drawing request check"""
+        # Build context about what product they're discussing
+        product_context = ""
+        if enquiry.initial_message:
+            product_context = f"Customer request: {enquiry.initial_message}\n"
+        
+        return dict(
+            model=settings.OPENAI_MODEL,
+            messages=[
+                {
+                    "role": "system",
+                    "content": """Determine if the user wants to see a product drawing, design, or visual.
 
 Return JSON: {"wants_drawing": true/false}
 
@@ -1347,42 +1411,71 @@ Examples:
 - "thank you" → {"wants_drawing": false}
 - "yes" → {"wants_drawing": false}
 - "aluminum" → {"wants_drawing": false}"""
-                    },
-                    {
-                        "role": "user",
-                        "content": f"{product_context}User message: {message}"
-                    }
-                ],
-                temperature=0,
-                response_format={"type": "json_object"},
-                max_tokens=50
-            )
-            
-            result = json.loads(response.choices[0].message.content)
-            return result.get('wants_drawing', False)
+                },
+                {
+                    "role": "user",
+                    "content": f"{product_context}User message: {message}"
+                }
+            ],
+            temperature=0,
+            response_format={"type": "json_object"},
+            max_tokens=50
+        )
+    
+    def _drawing_intent_result(self, response, message: str) -> bool:
+        """Read a drawing request completion and teach the local classifier its answer"""
+        result = json.loads(response.choices[0].message.content)
+        wants_drawing = bool(result.get('wants_drawing', False))
+        intent_classifier.record('wants_drawing', message, wants_drawing)
+        return wants_drawing
+    
+    def _drawing_keyword_fallback(self, message: str) -> bool:
+        """Fallback: check for explicit keywords"""
+        drawing_keywords = ['show me', 'can i see', 'what does it look like', 'drawing', 'design', 'picture']
+        return any(keyword in message.lower() for keyword in drawing_keywords)
+    
+    def _user_wants_drawing(self, message: str, enquiry: Enquiry) -> bool:
+        """Detect if user wants to see a product drawing/design"""
+        local_answer = intent_classifier.predict('wants_drawing', message)
+        if local_answer is not None:
+            return local_answer
+        
+        try:
+            response = llm_cache.create(self.client, **self._drawing_intent_request(message, enquiry))
+            return self._drawing_intent_result(response, message)
         except Exception as e:
             print(f"Error detecting drawing request: {str(e)}")
-            # Fallback: check for explicit keywords
-            drawing_keywords = ['show me', 'can i see', 'what does it look like', 'drawing', 'design', 'picture']
-            return any(keyword in message.lower() for keyword in drawing_keywords)
+            return self._drawing_keyword_fallback(message)
     
-    def _detect_product(self, message: str, enquiry: Enquiry) -> Optional[str]:
-        """Detect which product the user is asking about"""
+    async def _user_wants_drawing_async(self, message: str, enquiry: Enquiry) -> bool:
+        """_user_wants_drawing using the async client"""
+        local_answer = intent_classifier.predict('wants_drawing', message)
+        if local_answer is not None:
+            return local_answer
+        
         try:
-            # Build context
-            context = f"Initial request: {enquiry.initial_message}\n"
-            if enquiry.messages:
-                recent_msgs = enquiry.messages[-3:]
-                for msg in recent_msgs:
-                    context += f"{msg.role}: {msg.content}\n"
-            context += f"Current message: {message}"
-            
-            response = self.client.chat.completions.create(
-                model=settings.OPENAI_MODEL,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": """Identify the product being discussed.
+            response = await llm_cache.acreate(self.async_client, **self._drawing_intent_request(message, enquiry))
+            return self._drawing_intent_result(response, message)
+        except Exception as e:
+            print(f"Error detecting drawing request: {str(e)}")
+            return self._drawing_keyword_fallback(message)
+    
+    def _detect_product_request(self, message: str, enquiry: Enquiry) -> Dict[str, Any]:
+        """Completion parameters for product detection"""
+        # Build context
+        context = f"Initial request: {enquiry.initial_message}\n"
+        if enquiry.messages:
+            recent_msgs = enquiry.messages[-3:]
+            for msg in recent_msgs:
+                context += f"{msg.role}: {msg.content}\n"
+        context += f"Current message: {message}"
+        
+        return dict(
+            model=settings.OPENAI_MODEL,
+            messages=[
+                {
+                    "role": "system",
+                    "content": """Identify the product being discussed.
 
 Return JSON: {"product": "product_identifier"}
 
@@ -1413,42 +1506,66 @@ Examples:
 - "vinyl flooring options" → {"product": "vinyl_flooring"}
 - "hello" → {"product": null}
 - "thank you" → {"product": null}"""
-                    },
-                    {
-                        "role": "user",
-                        "content": context
-                    }
-                ],
-                temperature=0,
-                response_format={"type": "json_object"},
-                max_tokens=50
-            )
-            
-            result = json.loads(response.choices[0].message.content)
-            return result.get('product')
+                },
+                {
+                    "role": "user",
+                    "content": context
+                }
+            ],
+            temperature=0,
+            response_format={"type": "json_object"},
+            max_tokens=50
+        )
+    
+    def _detect_product_fallback(self, message: str) -> Optional[str]:
+        """Fallback: simple keyword matching"""
+        message_lower = message.lower()
+        if 'cat ladder' in message_lower or 'access ladder' in message_lower:
+            return 'cat_ladder'
+        elif 'court marking' in message_lower or 'line marking' in message_lower:
+            return 'court_marking'
+        elif 'glass partition' in message_lower or 'glass panel' in message_lower:
+            return 'glass_partition'
+        elif 'wood' in message_lower and 'floor' in message_lower:
+            return 'wood_flooring'
+        elif 'vinyl' in message_lower and 'floor' in message_lower:
+            return 'vinyl_flooring'
+        elif 'cork' in message_lower and 'floor' in message_lower:
+            return 'cork_flooring'
+        elif 'spc' in message_lower or 'lvt' in message_lower:
+            return 'spc_flooring' if 'spc' in message_lower else 'lvt_flooring'
+        elif 'stair' in message_lower:
+            return 'staircase'
+        elif 'canopy' in message_lower or 'sunshade' in message_lower:
+            return 'canopy'
+        return None
+    
+    def _detect_product(self, message: str, enquiry: Enquiry) -> Optional[str]:
+        """Detect which product the user is asking about"""
+        # A product named outright in the message needs no LLM call
+        local_product = intent_classifier.detect_product(message)
+        if local_product:
+            return local_product
+        
+        try:
+            response = llm_cache.create(self.client, **self._detect_product_request(message, enquiry))
+            return json.loads(response.choices[0].message.content).get('product')
         except Exception as e:
             print(f"Error detecting product: {str(e)}")
-            # Fallback: simple keyword matching
-            message_lower = message.lower()
-            if 'cat ladder' in message_lower or 'access ladder' in message_lower:
-                return 'cat_ladder'
-            elif 'court marking' in message_lower or 'line marking' in message_lower:
-                return 'court_marking'
-            elif 'glass partition' in message_lower or 'glass panel' in message_lower:
-                return 'glass_partition'
-            elif 'wood' in message_lower and 'floor' in message_lower:
-                return 'wood_flooring'
-            elif 'vinyl' in message_lower and 'floor' in message_lower:
-                return 'vinyl_flooring'
-            elif 'cork' in message_lower and 'floor' in message_lower:
-                return 'cork_flooring'
-            elif 'spc' in message_lower or 'lvt' in message_lower:
-                return 'spc_flooring' if 'spc' in message_lower else 'lvt_flooring'
-            elif 'stair' in message_lower:
-                return 'staircase'
-            elif 'canopy' in message_lower or 'sunshade' in message_lower:
-                return 'canopy'
-            return None
+            return self._detect_product_fallback(message)
+    
+    async def _detect_product_async(self, message: str, enquiry: Enquiry) -> Optional[str]:
+        """_detect_product using the async client"""
+        local_product = intent_classifier.detect_product(message)
+        if local_product:
+            return local_product
+        
+        try:
+            response = await llm_cache.acreate(self.async_client, **self._detect_product_request(message, enquiry))
+            return json.loads(response.choices[0].message.content).get('product')
+        except Exception as e:
+            print(f"Error detecting product: {str(e)}")
+            return self._detect_product_fallback(message)
     
     def _should_offer_quote(self, enquiry: Enquiry, current_response: str) -> bool:
         """Determine if AI should offer to create a quote based on conversation context"""
@@ -1525,7 +1642,8 @@ AI: "Great choice! SS316 is corrosion resistant..." (discusses)
     def _check_user_intent(self, message: str) -> str:
         """Check user's intent when answering decision tree questions"""
         try:
-            response = self.client.chat.completions.create(
+            response = llm_cache.create(
+                self.client,
                 model=settings.OPENAI_MODEL,
                 messages=[
                     {
@@ -1574,7 +1692,8 @@ Examples:
     def _is_sideways_question(self, user_message: str, expected_type: str, expected_question: str) -> bool:
         """Detect if user is asking a question instead of answering the pending question"""
         try:
-            response = self.client.chat.completions.create(
+            response = llm_cache.create(
+                self.client,
                 model=settings.OPENAI_MODEL,
                 messages=[
                     {
@@ -1650,6 +1769,100 @@ Pending question: "What material would you prefer?"
             print(f"Error checking sideways: {str(e)}")
             return False  # Default to not sideways to avoid blocking valid answers
     
+    def _analyze_turn(
+        self,
+        user_message: str,
+        question: AIQuestion,
+        context_value: Any = None
+    ) -> Optional[Dict[str, Any]]:
+        """Analyze a decision tree turn in a single completion
+        
+        Replaces the separate _check_user_intent, _is_sideways_question, _user_wants_drawing
+        and parse_answer calls. context_value is set when the pending question is a
+        confirmation of a value extracted from the conversation. Returns None on failure
+        so the caller can fall back to the multi-call path.
+        """
+        from app.services.tree_engine import tree_engine
+        from app.services.answer_parser import answer_parser
+        
+        # A reply that is plainly just the answer ("25 sqm", "ya lah", an exact choice) or
+        # a plain yes to a confirmation is settled locally, without the analysis call
+        if context_value is not None:
+            local_answer = answer_parser.predict(user_message, 'boolean')
+            if local_answer is True:
+                return {'intent': 'answer', 'is_sideways': False, 'wants_drawing': False, 'parsed_answer': None, 'confirmed': True}
+        else:
+            local_answer = answer_parser.predict(user_message, question.type, question.choices, question.question)
+            if local_answer is not None:
+                return {'intent': 'answer', 'is_sideways': False, 'wants_drawing': False, 'parsed_answer': local_answer, 'confirmed': False}
+        
+        if question.type == 'choice' and question.choices:
+            answer_format = f'one of {json.dumps(question.choices)} (exact spelling; be flexible with slang and typos, e.g. "basketbal mate" → "Basketball"), or null'
+        elif question.type == 'number':
+            answer_format = "a number (no units), or null"
+        elif question.type == 'boolean':
+            answer_format = "true/false (\"nah\" means false), or null"
+        else:
+            answer_format = "the user's answer as a short string, or null"
+        
+        confirmation_text = ""
+        if context_value is not None:
+            confirmation_text = f"\nWe asked the user to confirm this value from earlier in the conversation: {json.dumps(context_value)}"
+        
+        try:
+            response = llm_cache.create(
+                self.client,
+                model=settings.OPENAI_MODEL,
+                messages=[
+                    {
+                        "role": "system",
+                        "content": f"""Analyze the user's reply to a pending quote question.
+
+Return JSON with exactly these keys:
+- "intent": "answer" | "skip" | "proceed_anyway"
+  - "answer": user is providing an answer ("53 square meters", "Apartment", "1 only")
+  - "skip": user wants to skip or doesn't know ("I don't know", "not sure", "skip this")
+  - "proceed_anyway": user wants the quote without answering ("just give me the quote")
+- "is_sideways": true if the user asks about a DIFFERENT topic instead of answering (e.g. "what materials do you offer?" when asked for height, "how much will this cost?", "tell me about your company"). False if they answer, ask to clarify the current question, say they don't know, or restate their quote request.
+- "wants_drawing": true only if the user asks to see a drawing, design, picture or what the product looks like.
+- "parsed_answer": the answer to the pending question as {answer_format}. Use null if the user did not answer it.
+- "confirmed": true if the user confirms the value we asked them to confirm ("yes", "correct", "yep"); false if they correct it or no confirmation was asked."""
+                    },
+                    {
+                        "role": "user",
+                        "content": f"Pending question: '{question.question}'\nExpected type: {question.type}{confirmation_text}\nUser said: '{user_message}'"
+                    }
+                ],
+                temperature=0,
+                response_format={"type": "json_object"},
+                max_tokens=150
+            )
+            
+            result = json.loads(response.choices[0].message.content)
+        except Exception as e:
+            print(f"Error analyzing turn: {str(e)}")
+            return None
+        
+        intent = result.get('intent')
+        if intent not in ('answer', 'skip', 'proceed_anyway'):
+            intent = 'answer'
+        
+        # Text answers are taken verbatim, exactly as parse_answer does
+        if question.type == 'text':
+            parsed_answer = user_message.strip() or None
+        else:
+            parsed_answer = tree_engine.coerce_answer(result.get('parsed_answer'), question.type, question.choices)
+        
+        turn = {
+            'intent': intent,
+            'is_sideways': bool(result.get('is_sideways', False)),
+            'wants_drawing': bool(result.get('wants_drawing', False)),
+            'parsed_answer': parsed_answer,
+            'confirmed': bool(result.get('confirmed', False)) and context_value is not None
+        }
+        print(f"Turn analysis: {turn}")
+        return turn
+    
     def _answer_sideways_question(self, question: str, enquiry: Enquiry, db: Session) -> str:
         """Answer user's sideways question briefly using KB and AI"""
         try:
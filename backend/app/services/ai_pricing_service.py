@@ -1,18 +1,19 @@
 from typing import List, Dict, Any, Optional, Tuple
-from openai import OpenAI
 from sqlalchemy.orm import Session
 import json
 import re
 from app.config import settings
 from app.models import Enquiry, KnowledgeChunk
 from app.services.vector_store import vector_store
+from app.services.llm_cache import llm_cache
+from app.services.llm_gateway import llm_gateway
 
 
 class AIPricingService:
     """AI-powered pricing decisions to replace hardcoded logic"""
     
     def __init__(self):
-        self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
+        self.client = llm_gateway.client
     
     def classify_service_type(self, item_name: str, collected_data: Dict[str, Any]) -> Dict[str, Any]:
         """Use AI to classify service type and extract relevant information"""
@@ -30,7 +31,8 @@ class AIPricingService:
             
             context = " ".join(context_parts)
             
-            response = self.client.chat.completions.create(
+            response = llm_cache.create(
+                self.client,
                 model=settings.OPENAI_MODEL,
                 messages=[
                     {
@@ -0,0 +1,229 @@
+import re
+import threading
+from collections import defaultdict
+from difflib import SequenceMatcher
+from typing import Any, Dict, List, Optional, Tuple
+from app.config import settings
+from app.services.price_index import STOPWORDS, UNIT_CONVERSIONS, normalize_text, normalize_unit
+
+
+# Words that carry no answer: Singlish particles, politeness, hedging and forms of address
+FILLER_WORDS = {
+    "lah", "la", "leh", "lor", "loh", "meh", "hor", "sia", "ah", "ar", "liao", "mah",
+    "please", "pls", "plz", "thanks", "thank", "thx", "ty",
+    "about", "around", "approx", "approximately", "roughly", "estimated", "est", "maybe", "abt", "say",
+    "bro", "brother", "brotha", "boss", "mate", "man", "idol", "uncle", "aunty", "auntie", "sir", "maam",
+    "ye", "i", "we", "want", "choose", "pick", "prefer", "take", "go", "with", "think", "guess",
+    "lets", "let's", "the", "a", "one", "just", "only", "will", "would", "like",
+}
+
+YES_PHRASES = {
+    "yes", "y", "yeah", "yea", "ya", "yah", "yep", "yup", "yes yes", "ya ya", "sure", "ok", "okay", "k",
+    "true", "correct", "confirm", "confirmed", "of course", "definitely", "absolutely", "need", "required",
+    "can", "can can", "sure can", "yalor", "ya lor", "steady", "ok can", "yes need", "ya need", "need it",
+}
+NO_PHRASES = {
+    "no", "n", "nope", "nah", "nay", "false", "no no", "cannot", "can not", "no need", "dont need", "don't need",
+    "dun need", "dont want", "don't want", "dun want", "not needed", "not required", "not necessary",
+    "none", "nil", "never", "nah no need", "no thanks", "no thank you", "not really", "dont", "don't", "dun",
+}
+NEGATION_WORDS = {"not", "no", "dont", "don't", "dun", "never", "without", "except", "instead", "nor", "cannot"}
+
+NUMBER_WORDS = {
+    "zero": 0, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+    "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "twenty": 20,
+}
+# Count questions ("how many staircase sets?") answered with nothing
+ZERO_PHRASES = {"none", "nil", "no", "zero", "no need", "not needed"}
+
+# Smaller length units customers use for heights, in metres
+METRIC_LENGTHS = {"mm": 0.001, "millimeter": 0.001, "millimetre": 0.001, "cm": 0.01, "centimeter": 0.01, "centimetre": 0.01}
+
+NUMBER_ANSWER_RE = re.compile(r"^(\d+(?:\.\d+)?|\.\d+)\s*(.*)$")
+# "(in square meters)" / "in metres?" in the question text names the unit it expects
+QUESTION_UNIT_RE = re.compile(r"\bin ([a-z²\. ]+?)\s*(?:[?)]|$)")
+
+
+def _words(text: str, keep=frozenset()) -> List[str]:
+    """Lowercase words of an answer with punctuation and filler words (other than `keep`) removed"""
+    text = (text or "").lower().replace("’", "'")
+    return [
+        word for word in re.findall(r"[a-z0-9'²\.]+", text)
+        if word.strip(".") and (word.strip(".") in keep or word.strip(".") not in FILLER_WORDS)
+    ]
+
+
+def _content_tokens(text: str) -> List[str]:
+    return [token for token in normalize_text(text).split() if token not in STOPWORDS]
+
+
+def _token_similarity(word: str, choice_tokens: List[str]) -> float:
+    """How well one answer word matches the closest word of a choice (exact, prefix, then edit ratio)"""
+    best = 0.0
+    for token in choice_tokens:
+        if word == token:
+            return 1.0
+        if len(word) >= 3 and token.startswith(word):
+            best = max(best, 0.95)
+        else:
+            best = max(best, SequenceMatcher(None, word, token).ratio())
+    return best
+
+
+class AnswerParser:
+    """Deterministic parsing of decision tree answers, ahead of the LLM
+
+    Handles numbers with units (converted to the unit the question asks for), yes/no
+    wording including common Singlish, and exact, partial or misspelt choices. Every
+    parse carries a confidence; callers use the value only at or above
+    ANSWER_PARSER_THRESHOLD and ask the LLM otherwise. Replies containing a question
+    mark or a negation never reach the threshold, since they may not be answers at all.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = defaultdict(int)
+        self.fallbacks = defaultdict(int)
+
+    def parse(self, answer_text: str, question_type: str, choices: List[str] = None, question_text: str = None) -> Tuple[Any, float]:
+        """(value, confidence in [0, 1]) for an answer; value is None when nothing was recognised"""
+        if question_type == 'number':
+            value, confidence = self._parse_number(answer_text, question_text)
+        elif question_type == 'boolean':
+            value, confidence = self._parse_boolean(answer_text)
+        elif question_type == 'choice' and choices:
+            value, confidence = self._parse_choice(answer_text, choices)
+        else:
+            return None, 0.0
+
+        if value is not None and "?" in (answer_text or ""):
+            confidence = min(confidence, 0.5)
+        return value, confidence
+
+    def predict(self, answer_text: str, question_type: str, choices: List[str] = None, question_text: str = None) -> Any:
+        """Confident local answer, or None to defer to the LLM"""
+        if not settings.ANSWER_PARSER_ENABLED or question_type not in ('number', 'boolean', 'choice'):
+            return None
+
+        value, confidence = self.parse(answer_text, question_type, choices, question_text)
+        with self._lock:
+            if value is not None and confidence >= settings.ANSWER_PARSER_THRESHOLD:
+                self.hits[question_type] += 1
+                return value
+            self.fallbacks[question_type] += 1
+        return None
+
+    # ------------------------------------------------------------------
+    # Question types
+    # ------------------------------------------------------------------
+
+    def _parse_number(self, answer_text: str, question_text: str = None) -> Tuple[Optional[float], float]:
+        raw = re.sub(r"(?<=\d),(?=\d{3}\b)", "", (answer_text or "").lower())
+        words = _words(raw, keep=NUMBER_WORDS.keys())
+        filtered = len(words) != len(raw.split())
+        text = " ".join(words).strip(" .")
+
+        if text in ZERO_PHRASES:
+            return 0.0, 0.9
+        if text in NUMBER_WORDS:
+            return float(NUMBER_WORDS[text]), 0.95
+
+        match = NUMBER_ANSWER_RE.match(text)
+        if not match:
+            return None, 0.0
+
+        quantity = float(match.group(1))
+        unit_text = match.group(2).strip(" .")
+        if not unit_text:
+            return quantity, 0.95 if filtered else 1.0
+        if re.search(r"\d", unit_text):
+            # "5m x 4m", "2 to 3 metres": left to the LLM
+            return None, 0.0
+
+        expected = self._expected_unit(question_text)
+        if unit_text in METRIC_LENGTHS:
+            if expected in (None, "m"):
+                return round(quantity * METRIC_LENGTHS[unit_text], 4), 0.95
+            return quantity, 0.6
+
+        unit = normalize_unit(unit_text)
+        if unit is None:
+            return quantity, 0.6
+        if expected is None or unit == expected:
+            return quantity, 0.95
+        factor = UNIT_CONVERSIONS.get((unit, expected))
+        if factor:
+            # Conversion factors are for prices per unit; quantities scale the other way
+            return round(quantity / factor, 2), 0.95
+        return quantity, 0.6
+
+    def _expected_unit(self, question_text: str = None) -> Optional[str]:
+        match = QUESTION_UNIT_RE.search((question_text or "").lower())
+        return normalize_unit(match.group(1)) if match else None
+
+    def _parse_boolean(self, answer_text: str) -> Tuple[Optional[bool], float]:
+        raw = " ".join(re.findall(r"[a-z']+", (answer_text or "").lower()))
+        words = _words(raw)
+        text = " ".join(words)
+        confidence = 0.95 if len(words) != len(raw.split()) else 1.0
+
+        if raw in YES_PHRASES or text in YES_PHRASES:
+            return True, confidence
+        if raw in NO_PHRASES or text in NO_PHRASES:
+            return False, confidence
+        # Strings of one-word yeses or noes ("ya correct", "ok can", "nope nah")
+        if words and all(word in YES_PHRASES for word in words):
+            return True, 0.95
+        if words and all(word in NO_PHRASES for word in words):
+            return False, 0.95
+        return None, 0.0
+
+    def _parse_choice(self, answer_text: str, choices: List[str]) -> Tuple[Optional[str], float]:
+        normalized = normalize_text(answer_text)
+        for choice in choices:
+            if normalized == normalize_text(choice):
+                return choice, 1.0
+
+        # Yes/No style choices answered with yes/no wording
+        boolean, confidence = self._parse_boolean(answer_text)
+        if boolean is not None:
+            for choice in choices:
+                if normalize_text(choice) in (YES_PHRASES if boolean else NO_PHRASES):
+                    return choice, confidence
+
+        words = [word for word in _content_tokens(" ".join(_words(answer_text))) if word]
+        if not words:
+            return None, 0.0
+
+        scored = []
+        for choice in choices:
+            choice_tokens = _content_tokens(choice)
+            if not choice_tokens:
+                continue
+            # Every answer word has to match the choice; the choice may have more words ("residential")
+            token_score = min(_token_similarity(word, choice_tokens) for word in words)
+            whole_score = SequenceMatcher(None, " ".join(words), " ".join(choice_tokens)).ratio()
+            scored.append((min(max(token_score, whole_score), 0.97), choice, choice_tokens))
+
+        if not scored:
+            return None, 0.0
+        scored.sort(key=lambda item: item[0], reverse=True)
+        confidence, choice, choice_tokens = scored[0]
+
+        if len(scored) > 1 and confidence - scored[1][0] < 0.1:
+            confidence = min(confidence, 0.5)
+        answer_words = re.findall(r"[a-z']+", (answer_text or "").lower().replace("’", "'"))
+        if any(word in NEGATION_WORDS and word not in choice_tokens for word in answer_words):
+            confidence = min(confidence, 0.5)
+        return choice, confidence
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Answers parsed locally vs. handed to the LLM in this process, by question type"""
+        return {
+            question_type: {"local_hits": self.hits[question_type], "llm_fallbacks": self.fallbacks[question_type]}
+            for question_type in ('number', 'boolean', 'choice')
+        }
+
+
+# Singleton instance
+answer_parser = AnswerParser()
@@ -3,19 +3,34 @@ import PyPDF2
 import csv
 import json
 from pathlib import Path
-from openai import OpenAI
+from openai import RateLimitError, APIConnectionError, APITimeoutError
 from app.config import settings
+from app.services.llm_gateway import llm_gateway
+
+
+# Appended to the extraction prompt when EXTRACTION_MODE is "multi_row"
+LINE_ITEMS_INSTRUCTIONS = """
+
+ALSO extract EVERY priced line item in the text (every row of every pricing table or estimate,
+not just the most specific one) as "line_items": an array of objects with these keys:
+- item_name: the item/service as written
+- material: material, finish or variant if the row names one, else null
+- quantity: numeric quantity on the row, else null
+- unit: pricing unit (e.g., per sqft, per sqm, per meter, per court, per unit)
+- unit_price: numeric price per unit, else null
+- total: numeric row total, else null
+Use an empty array when the text has no priced rows."""
 
 
 class DocumentParser:
     """Parse documents and extract text"""
     
     def __init__(self):
-        self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
+        self.client = llm_gateway.client
     
-    def parse_pdf(self, file_path: str) -> str:
-        """Extract text from PDF with fallback for corrupted files"""
-        text = ""
+    def parse_pdf_pages(self, file_path: str) -> List[str]:
+        """Extract text from PDF page by page, with fallback for corrupted files"""
+        pages = []
         
         # Try PyPDF2 first
         try:
@@ -23,8 +38,8 @@ class DocumentParser:
                 pdf_reader = PyPDF2.PdfReader(file)
                 for page_num, page in enumerate(pdf_reader.pages):
                     page_text = page.extract_text()
-                    text += f"\n--- Page {page_num + 1} ---\n{page_text}"
-            return text
+                    pages.append(f"\n--- Page {page_num + 1} ---\n{page_text}")
+            return pages
         except Exception as e:
             print(f"PyPDF2 failed: {str(e)}. Trying pdfplumber...")
         
@@ -34,8 +49,8 @@ class DocumentParser:
             with pdfplumber.open(file_path) as pdf:
                 for page_num, page in enumerate(pdf.pages):
                     page_text = page.extract_text() or ""
-                    text += f"\n--- Page {page_num + 1} ---\n{page_text}"
-            return text
+                    pages.append(f"\n--- Page {page_num + 1} ---\n{page_text}")
+            return pages
         except Exception as e:
             print(f"pdfplumber also failed: {str(e)}")
         
@@ -48,10 +63,14 @@ class DocumentParser:
                 text = content.decode('latin-1', errors='ignore')
                 # Filter to only printable characters
                 text = ''.join(char for char in text if char.isprintable() or char in '\n\r\t')
-                return f"⚠️ PDF may be corrupted. Extracted raw text:\n\n{text[:10000]}..."
+                return [f"⚠️ PDF may be corrupted. Extracted raw text:\n\n{text[:10000]}..."]
         except Exception as e:
             raise Exception(f"Error parsing PDF: Could not read with any method. {str(e)}")
     
+    def parse_pdf(self, file_path: str) -> str:
+        """Extract text from PDF with fallback for corrupted files"""
+        return "".join(self.parse_pdf_pages(file_path))
+    
     def parse_csv(self, file_path: str) -> str:
         """Extract text from CSV"""
         text = ""
@@ -78,17 +97,21 @@ class DocumentParser:
         except Exception as e:
             raise Exception(f"Error parsing TXT: {str(e)}")
     
-    def parse_document(self, file_path: str, file_type: str) -> str:
-        """Parse document based on type"""
+    def parse_pages(self, file_path: str, file_type: str) -> List[str]:
+        """Parse document based on type into pages (CSV and text files are a single page)"""
         if file_type.lower() == 'pdf':
-            return self.parse_pdf(file_path)
+            return self.parse_pdf_pages(file_path)
         elif file_type.lower() == 'csv':
-            return self.parse_csv(file_path)
+            return [self.parse_csv(file_path)]
         elif file_type.lower() in ['txt', 'text']:
-            return self.parse_txt(file_path)
+            return [self.parse_txt(file_path)]
         else:
             raise ValueError(f"Unsupported file type: {file_type}")
     
+    def parse_document(self, file_path: str, file_type: str) -> str:
+        """Parse document based on type"""
+        return "".join(self.parse_pages(file_path, file_type))
+    
     def chunk_text(self, text: str, chunk_size: int = 2000) -> List[str]:
         """Split text into chunks with overlap"""
         chunks = []
@@ -116,7 +139,10 @@ class DocumentParser:
         
         For pricing tables with multiple items, this extracts the MOST RELEVANT item.
         Priority: parquet/flooring services, then most specific match.
+        In "multi_row" EXTRACTION_MODE every priced row is also returned under line_items.
         """
+        multi_row = settings.EXTRACTION_MODE == "multi_row"
+        
         try:
             response = self.client.chat.completions.create(
                 model=settings.OPENAI_MODEL,
@@ -147,7 +173,7 @@ Extract the following information:
 5. Location (if mentioned)
 
 Return ONLY a JSON object with these keys: item_name, base_price, price_unit, conditions (array), location.
-If information is not available, use null. For base_price, extract only the numeric value."""
+If information is not available, use null. For base_price, extract only the numeric value.""" + (LINE_ITEMS_INSTRUCTIONS if multi_row else "")
                     },
                     {
                         "role": "user",
@@ -167,8 +193,14 @@ If information is not available, use null. For base_price, extract only the nume
                 except (ValueError, TypeError):
                     result['base_price'] = None
             
+            if multi_row:
+                result['line_items'] = self._clean_line_items(result.get('line_items'))
+            
             return result
             
+        except (RateLimitError, APIConnectionError, APITimeoutError):
+            # Transient - let the caller back off and retry
+            raise
         except Exception as e:
             print(f"Error extracting structured data: {str(e)}")
             return {
@@ -179,6 +211,40 @@ If information is not available, use null. For base_price, extract only the nume
                 'location': None
             }
     
+    def _clean_line_items(self, rows: Any) -> List[Dict[str, Any]]:
+        """Keep rows that have a name and a price; numbers coerced to float"""
+        def to_number(value):
+            if value is None or isinstance(value, bool):
+                return None
+            try:
+                return float(str(value).replace(',', '').replace('$', '').strip())
+            except ValueError:
+                return None
+        
+        cleaned = []
+        for row in rows if isinstance(rows, list) else []:
+            if not isinstance(row, dict) or not row.get('item_name'):
+                continue
+            
+            quantity = to_number(row.get('quantity'))
+            unit_price = to_number(row.get('unit_price'))
+            total = to_number(row.get('total'))
+            if unit_price is None and total is not None:
+                # Derive the unit price from the row total when the table only lists totals
+                unit_price = total / quantity if quantity else total
+            if unit_price is None:
+                continue
+            
+            cleaned.append({
+                'item_name': str(row['item_name']).strip(),
+                'material': row.get('material') or None,
+                'quantity': quantity,
+                'unit': row.get('unit') or None,
+                'unit_price': round(unit_price, 4),
+                'total': total
+            })
+        return cleaned
+    
     def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
         """Generate embeddings using OpenAI"""
         try:
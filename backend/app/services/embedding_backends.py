@@ -0,0 +1,191 @@
+import re
+import zlib
+from abc import ABC, abstractmethod
+from typing import List
+import numpy as np
+from app.config import settings
+
+
+class EmbeddingBackend(ABC):
+    """Turns texts into vectors for the vector store
+
+    remote backends call an API (batched by token budget, results worth caching);
+    local ones run in-process on the CPU.
+    """
+
+    name = ""
+    remote = False
+
+    @property
+    @abstractmethod
+    def model_name(self) -> str:
+        """Identifier stored with cached embeddings and used to name the collection"""
+
+    @abstractmethod
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """One vector per text, in order"""
+
+    def collection_suffix(self) -> str:
+        """Collections are per backend/model, since vectors of different models can't be mixed"""
+        label = self.model_name if self.model_name.startswith(self.name) else f"{self.name}-{self.model_name}"
+        return re.sub(r"[^a-zA-Z0-9_-]+", "-", label).strip("-").lower()
+
+
+class OpenAIEmbeddingBackend(EmbeddingBackend):
+    """OpenAI embeddings API, requests packed up to EMBEDDING_BATCH_MAX_TOKENS / _INPUTS"""
+
+    name = "openai"
+    remote = True
+
+    def __init__(self, model: str):
+        self.model = model
+        self._tokenizer = None
+
+    @property
+    def model_name(self) -> str:
+        return self.model
+
+    def count_tokens(self, text: str) -> int:
+        """Count tokens for the embedding model (falls back to a ~4 chars/token estimate)"""
+        if self._tokenizer is None:
+            try:
+                import tiktoken
+                self._tokenizer = tiktoken.encoding_for_model(self.model)
+            except Exception:
+                self._tokenizer = False
+
+        if self._tokenizer:
+            return len(self._tokenizer.encode(text))
+        return len(text) // 4 + 1
+
+    def _batches(self, texts: List[str]) -> List[List[str]]:
+        """Group texts into request batches sized by the token budget"""
+        max_tokens = settings.EMBEDDING_BATCH_MAX_TOKENS
+        max_inputs = settings.EMBEDDING_BATCH_MAX_INPUTS
+
+        batches = []
+        current_batch = []
+        current_tokens = 0
+        for text in texts:
+            tokens = self.count_tokens(text)
+            if current_batch and (current_tokens + tokens > max_tokens or len(current_batch) >= max_inputs):
+                batches.append(current_batch)
+                current_batch = []
+                current_tokens = 0
+            current_batch.append(text)
+            current_tokens += tokens
+        if current_batch:
+            batches.append(current_batch)
+        return batches
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        from app.services.llm_gateway import llm_gateway
+
+        embeddings = []
+        for batch in self._batches(texts):
+            response = llm_gateway.client.embeddings.create(input=batch, model=self.model)
+            # Results are returned with an index; keep them in input order
+            embeddings.extend(item.embedding for item in sorted(response.data, key=lambda item: item.index))
+        return embeddings
+
+
+class HashingEmbeddingBackend(EmbeddingBackend):
+    """Signed feature hashing of words, word bigrams and character trigrams
+
+    No model download and no fitting: each feature is hashed (crc32, stable across
+    processes) into one of `dimension` buckets with a +/- sign, counts are
+    sublinearly scaled (1 + log tf) and each row is L2-normalized so cosine distance
+    works. Character trigrams make it tolerant of typos and plurals. Lexical only -
+    it matches wording, not meaning, which suits price tables and product names.
+    """
+
+    name = "hashing"
+    WORD_RE = re.compile(r"[a-z0-9]+")
+    CHAR_NGRAM = 3
+    CHAR_WEIGHT = 0.5
+
+    def __init__(self, dimension: int):
+        self.dimension = dimension
+
+    @property
+    def model_name(self) -> str:
+        return f"hashing-{self.dimension}"
+
+    def _features(self, text: str):
+        """(feature, weight) pairs for a text"""
+        words = self.WORD_RE.findall(text.lower())
+        for word in words:
+            yield f"w:{word}", 1.0
+            padded = f"<{word}>"
+            for i in range(len(padded) - self.CHAR_NGRAM + 1):
+                yield f"c:{padded[i:i + self.CHAR_NGRAM]}", self.CHAR_WEIGHT
+        for first, second in zip(words, words[1:]):
+            yield f"b:{first} {second}", 1.0
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        rows, columns, values = [], [], []
+        for row, text in enumerate(texts):
+            for feature, weight in self._features(text):
+                hashed = zlib.crc32(feature.encode("utf-8"))
+                rows.append(row)
+                columns.append(hashed % self.dimension)
+                # Top bit decides the sign so colliding features tend to cancel out
+                values.append(weight if hashed & 0x80000000 else -weight)
+
+        matrix = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        if rows:
+            np.add.at(matrix, (np.asarray(rows), np.asarray(columns)), np.asarray(values, dtype=np.float32))
+
+        # Sublinear tf keeps repeated words from dominating, then L2-normalize every row
+        matrix = np.sign(matrix) * np.log1p(np.abs(matrix))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms == 0, 1, norms)
+        return matrix.tolist()
+
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    """Local sentence-transformers model (optional dependency, downloaded on first use)"""
+
+    name = "sentence_transformers"
+
+    def __init__(self, model: str):
+        self.model = model
+        self._encoder = None
+
+    @property
+    def model_name(self) -> str:
+        return self.model
+
+    def _get_encoder(self):
+        if self._encoder is None:
+            try:
+                from sentence_transformers import SentenceTransformer
+            except ImportError:
+                raise RuntimeError(
+                    "EMBEDDING_BACKEND=sentence_transformers needs the sentence-transformers package "
+                    "(pip install sentence-transformers)"
+                )
+            self._encoder = SentenceTransformer(self.model, device="cpu")
+        return self._encoder
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        embeddings = self._get_encoder().encode(
+            texts,
+            batch_size=64,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+        return embeddings.tolist()
+
+
+def get_embedding_backend(name: str = None) -> EmbeddingBackend:
+    """Build the backend named in EMBEDDING_BACKEND (or the given name)"""
+    name = (name or settings.EMBEDDING_BACKEND).lower()
+    if name == "openai":
+        return OpenAIEmbeddingBackend(settings.OPENAI_EMBEDDING_MODEL)
+    if name == "hashing":
+        return HashingEmbeddingBackend(settings.HASHING_EMBEDDING_DIMENSION)
+    if name in ("sentence_transformers", "sentence-transformers"):
+        return SentenceTransformerBackend(settings.SENTENCE_TRANSFORMER_MODEL)
+    raise ValueError(f"Unknown embedding backend '{name}' (expected openai, hashing or sentence_transformers)")
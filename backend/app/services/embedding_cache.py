@@ -0,0 +1,147 @@
+import hashlib
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from pathlib import Path
+from typing import Dict, List, Optional
+from app.config import settings
+
+
+class EmbeddingCache:
+    """Disk-backed, content-addressed embedding cache (SQLite) with size-bounded LRU eviction
+
+    Entries are keyed by (model, sha256 of normalized text) so re-embedding unchanged
+    chunk text or repeated customer queries never goes to the network.
+    """
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = None
+        self._entry_count = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Normalize text before hashing/embedding (unicode form and whitespace)"""
+        text = unicodedata.normalize("NFC", text)
+        return " ".join(text.split())
+
+    @staticmethod
+    def _key(model: str, normalized_text: str) -> str:
+        digest = hashlib.sha256(normalized_text.encode("utf-8")).hexdigest()
+        return f"{model}:{digest}"
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the SQLite database lazily (first use), creating the table if needed"""
+        if self._conn is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS embeddings (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    vector BLOB NOT NULL,
+                    last_used REAL NOT NULL
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_embeddings_last_used ON embeddings (last_used)")
+            self._entry_count = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            self._conn = conn
+        return self._conn
+
+    def get_many(self, model: str, texts: List[str]) -> Dict[str, List[float]]:
+        """Look up embeddings for normalized texts; returns {text: embedding} for hits only"""
+        if not texts:
+            return {}
+
+        keys = {self._key(model, text): text for text in set(texts)}
+        found = {}
+
+        with self._lock:
+            conn = self._connect()
+            key_list = list(keys)
+            # Stay well under SQLite's bound-parameter limit
+            for start in range(0, len(key_list), 500):
+                part = key_list[start:start + 500]
+                placeholders = ",".join("?" * len(part))
+                rows = conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    part
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[keys[key]] = vector.tolist()
+
+            if found:
+                # Touch hits so they survive LRU eviction
+                now = time.time()
+                conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, self._key(model, text)) for text in found]
+                )
+                conn.commit()
+
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+
+        return found
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        """Look up a single embedding"""
+        return self.get_many(model, [text]).get(text)
+
+    def put_many(self, model: str, items: Dict[str, List[float]]):
+        """Store embeddings for normalized texts and evict least recently used entries over the limit"""
+        if not items:
+            return
+
+        now = time.time()
+        rows = [
+            (self._key(model, text), model, array("f", embedding).tobytes(), now)
+            for text, embedding in items.items()
+        ]
+
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, vector, last_used) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            self._entry_count += len(rows)
+
+            if self._entry_count > self.max_entries:
+                self._entry_count = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+                overflow = self._entry_count - self.max_entries
+                if overflow > 0:
+                    conn.execute(
+                        "DELETE FROM embeddings WHERE key IN "
+                        "(SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                        (overflow,)
+                    )
+                    self._entry_count -= overflow
+
+            conn.commit()
+
+    def stats(self) -> Dict[str, int]:
+        """Cache statistics for the current process"""
+        return {
+            "entries": self._entry_count,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+
+# Singleton instance
+embedding_cache = EmbeddingCache(
+    path=settings.EMBEDDING_CACHE_PATH,
+    max_entries=settings.EMBEDDING_CACHE_MAX_ENTRIES
+)
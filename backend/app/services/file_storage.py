@@ -0,0 +1,297 @@
+from typing import List, Dict, Any, BinaryIO, Optional, Tuple
+from pathlib import Path
+import hashlib
+import os
+import uuid
+import zipfile
+import aiofiles
+from fastapi import UploadFile
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.models import Document, DocumentStatus
+
+
+# Read/write uploads in 1 MB pieces
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Allowance for multipart boundaries and headers on top of the file itself
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class FileTooLargeError(Exception):
+    """Upload exceeded the allowed size (the partial file has been removed)"""
+    pass
+
+
+class ZipLimitError(FileTooLargeError):
+    """Zip archive has more entries or more uncompressed content than allowed (nothing was extracted)"""
+    pass
+
+
+async def save_upload(upload: UploadFile, destination: Path, max_size: int) -> Tuple[int, str]:
+    """Stream an upload to disk while computing its SHA-256
+
+    Returns (size in bytes, hex digest). Raises FileTooLargeError as soon as the
+    stream passes max_size.
+    """
+    sha256 = hashlib.sha256()
+    size = 0
+
+    try:
+        async with aiofiles.open(destination, 'wb') as out:
+            while True:
+                chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+
+                size += len(chunk)
+                if size > max_size:
+                    raise FileTooLargeError(f"File too large. Max size: {max_size} bytes")
+
+                sha256.update(chunk)
+                await out.write(chunk)
+    except BaseException:
+        # Don't leave partial files behind
+        if os.path.exists(destination):
+            os.remove(destination)
+        raise
+
+    return size, sha256.hexdigest()
+
+
+def save_stream(source: BinaryIO, destination: Path, max_size: int) -> Tuple[int, str]:
+    """Blocking counterpart of save_upload for local file objects (zip members, server files)"""
+    sha256 = hashlib.sha256()
+    size = 0
+
+    try:
+        with open(destination, 'wb') as out:
+            for chunk in iter(lambda: source.read(UPLOAD_CHUNK_SIZE), b''):
+                size += len(chunk)
+                if size > max_size:
+                    raise FileTooLargeError(f"File too large. Max size: {max_size} bytes")
+
+                sha256.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        if os.path.exists(destination):
+            os.remove(destination)
+        raise
+
+    return size, sha256.hexdigest()
+
+
+def unique_upload_path(upload_dir: Path, filename: str) -> Tuple[str, Path]:
+    """uuid-prefixed filename and path for a new upload"""
+    unique_filename = f"{uuid.uuid4().hex}_{filename}"
+    return unique_filename, upload_dir / unique_filename
+
+
+def _store_local_file(
+    source: BinaryIO,
+    filename: str,
+    upload_dir: Path,
+    allowed_types: List[str],
+    stored: List[Dict[str, Any]],
+    skipped: List[Dict[str, str]]
+):
+    """Copy one local file object into the upload directory, recording the outcome"""
+    file_ext = filename.split('.')[-1].lower()
+    if file_ext not in allowed_types:
+        skipped.append({'filename': filename, 'reason': f"File type .{file_ext} not allowed"})
+        return
+
+    unique_filename, file_path = unique_upload_path(upload_dir, filename)
+    try:
+        file_size, content_hash = save_stream(source, file_path, settings.MAX_FILE_SIZE)
+    except FileTooLargeError as e:
+        skipped.append({'filename': filename, 'reason': str(e)})
+        return
+
+    stored.append({
+        'original_filename': filename,
+        'file_ext': file_ext,
+        'unique_filename': unique_filename,
+        'file_path': str(file_path),
+        'file_size': file_size,
+        'content_hash': content_hash
+    })
+
+
+def extract_zip_documents(
+    zip_path: Path,
+    upload_dir: Path,
+    allowed_types: List[str]
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, str]]]:
+    """Store every allowed document inside a zip archive as its own upload
+
+    Folder structure is flattened (only member base names are used, so entries can't
+    escape the upload directory). Returns (stored files, skipped files). Raises
+    ZipLimitError, before extracting anything, when the archive has more than
+    MAX_ZIP_MEMBERS entries or declares more than MAX_ZIP_UNCOMPRESSED_SIZE bytes
+    in total (zipfile never reads a member past its declared size).
+    """
+    stored, skipped = [], []
+
+    with zipfile.ZipFile(zip_path) as archive:
+        members = archive.infolist()
+        if len(members) > settings.MAX_ZIP_MEMBERS:
+            raise ZipLimitError(f"Zip archive has {len(members)} entries. Max entries: {settings.MAX_ZIP_MEMBERS}")
+
+        uncompressed_size = sum(info.file_size for info in members)
+        if uncompressed_size > settings.MAX_ZIP_UNCOMPRESSED_SIZE:
+            raise ZipLimitError(
+                f"Zip archive expands to {uncompressed_size} bytes. Max uncompressed size: {settings.MAX_ZIP_UNCOMPRESSED_SIZE} bytes"
+            )
+
+        for info in members:
+            filename = Path(info.filename).name
+            # Skip folders and OS metadata (__MACOSX/, .DS_Store, ...)
+            if info.is_dir() or not filename or filename.startswith('.') or info.filename.startswith('__MACOSX'):
+                continue
+
+            if info.file_size > settings.MAX_FILE_SIZE:
+                skipped.append({'filename': filename, 'reason': f"File too large. Max size: {settings.MAX_FILE_SIZE} bytes"})
+                continue
+
+            with archive.open(info) as source:
+                _store_local_file(source, filename, upload_dir, allowed_types, stored, skipped)
+
+    return stored, skipped
+
+
+def resolve_import_directory(directory: str) -> Path:
+    """Resolve a server-side import directory, which must live under BULK_IMPORT_DIR"""
+    root = Path(settings.BULK_IMPORT_DIR).resolve()
+    target = (root / directory).resolve()
+
+    if target != root and root not in target.parents:
+        raise ValueError(f"Import directory must be inside {settings.BULK_IMPORT_DIR}")
+    if not target.is_dir():
+        raise ValueError(f"Import directory not found: {directory}")
+
+    return target
+
+
+def import_directory_documents(
+    directory: Path,
+    upload_dir: Path,
+    allowed_types: List[str]
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, str]]]:
+    """Copy every allowed document under a server directory (recursively) into uploads
+
+    Files are copied rather than moved so the import folder is left untouched.
+    Returns (stored files, skipped files).
+    """
+    stored, skipped = [], []
+
+    for path in sorted(directory.rglob('*')):
+        if not path.is_file() or path.name.startswith('.'):
+            continue
+
+        with open(path, 'rb') as source:
+            _store_local_file(source, path.name, upload_dir, allowed_types, stored, skipped)
+
+    return stored, skipped
+
+
+def upload_size_limit(path: str) -> Optional[int]:
+    """Largest acceptable request body for an upload endpoint, None for other paths
+
+    Checked against Content-Length before the body is read, so clients sending
+    oversized files are turned away without the server buffering anything.
+    """
+    if path.rstrip('/') == '/api/documents/upload':
+        return settings.MAX_FILE_SIZE + MULTIPART_OVERHEAD
+    if path.rstrip('/') == '/api/documents/bulk-upload':
+        return settings.MAX_BULK_UPLOAD_SIZE + MULTIPART_OVERHEAD
+    if path.startswith('/api/enquiries/') and path.rstrip('/').endswith('/upload-image'):
+        return settings.MAX_IMAGE_SIZE + MULTIPART_OVERHEAD
+    return None
+
+
+def hash_file(file_path: str) -> str:
+    """SHA-256 of a file on disk"""
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def find_identical_document(db: Session, content_hash: str) -> Optional[Document]:
+    """Find an existing document with the same file content whose file is still on disk
+
+    Processed documents are preferred so their summary and vectors can be reused.
+    """
+    candidates = db.query(Document).filter(
+        Document.content_hash == content_hash
+    ).order_by(Document.status != DocumentStatus.PROCESSED, Document.id).all()
+
+    for document in candidates:
+        if os.path.exists(document.file_path):
+            return document
+    return None
+
+
+def _is_file_shared(db: Session, document: Document) -> bool:
+    """True if another document record points at the same file on disk"""
+    return db.query(Document).filter(
+        Document.file_path == document.file_path,
+        Document.id != document.id
+    ).first() is not None
+
+
+def _invalidate_parsed_text(db: Session, document: Document, content_hash: Optional[str]):
+    """Drop cached parsed text for a file hash no other document still has"""
+    from app.services.parsed_text_store import parsed_text_store
+
+    if not content_hash:
+        return
+
+    still_used = db.query(Document).filter(
+        Document.content_hash == content_hash,
+        Document.id != document.id
+    ).first()
+
+    if not still_used:
+        parsed_text_store.invalidate(content_hash)
+
+
+def write_document_content(db: Session, document: Document, content: str):
+    """Overwrite a document's file with edited text content (caller commits)
+
+    A file shared with identical uploads is copied-on-write so editing one
+    document never changes the others.
+    """
+    old_hash = document.content_hash
+    if not old_hash and os.path.exists(document.file_path):
+        old_hash = hash_file(document.file_path)
+
+    if _is_file_shared(db, document):
+        unique_filename = f"{uuid.uuid4().hex}_{document.original_filename}"
+        document.filename = unique_filename
+        document.file_path = str(Path(document.file_path).parent / unique_filename)
+
+    data = content.encode('utf-8')
+    with open(document.file_path, 'wb') as f:
+        f.write(data)
+
+    document.file_size = len(data)
+    document.content_hash = hashlib.sha256(data).hexdigest()
+
+    _invalidate_parsed_text(db, document, old_hash)
+
+
+def delete_document_file(db: Session, document: Document):
+    """Delete a document's file unless another document still shares it"""
+    if _is_file_shared(db, document):
+        return
+
+    _invalidate_parsed_text(db, document, document.content_hash)
+
+    try:
+        if os.path.exists(document.file_path):
+            os.remove(document.file_path)
+    except Exception as e:
+        print(f"Error deleting file: {str(e)}")
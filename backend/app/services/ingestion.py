@@ -0,0 +1,343 @@
+from typing import List, Dict, Any, Callable, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from openai import RateLimitError, APIConnectionError, APITimeoutError, InternalServerError
+from app.config import settings
+from app.services.document_parser import document_parser
+from app.services.embedding_cache import embedding_cache
+from app.services.llm_gateway import LLMGatewayBusyError
+from app.services.parsed_text_store import parsed_text_store
+from app.services.vector_store import vector_store
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at a per-minute rate"""
+
+    def __init__(self, rate_per_minute: float, capacity: float = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, amount: float = 1.0):
+        """Block until `amount` tokens are available, then take them"""
+        # A single request larger than the bucket can never fit - cap it at one full bucket
+        amount = min(amount, self.capacity)
+
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+
+                wait_time = (amount - self.tokens) / self.rate
+
+            time.sleep(wait_time)
+
+
+class OpenAIRateLimiter:
+    """Client-side limiter for the OpenAI requests-per-minute and tokens-per-minute limits"""
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+
+    def acquire(self, tokens: int, requests: int = 1):
+        self.requests.acquire(requests)
+        self.tokens.acquire(tokens)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 chars per token) used for rate limiting"""
+    return len(text) // 4 + 1
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """Transient OpenAI errors worth retrying: rate limits, timeouts, connection and 5xx errors, full gateway queue"""
+    if isinstance(error, (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError, LLMGatewayBusyError)):
+        return True
+    return 'rate_limit' in str(error).lower()
+
+
+def call_with_backoff(fn, *args, **kwargs):
+    """Call fn, retrying transient errors with exponential backoff and full jitter
+
+    Honors the Retry-After header when OpenAI sends one.
+    """
+    max_retries = settings.OPENAI_MAX_RETRIES
+
+    for attempt in range(max_retries + 1):
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            if attempt >= max_retries or not is_retryable_error(e):
+                raise
+
+            delay = min(settings.OPENAI_BACKOFF_MAX_SECONDS, settings.OPENAI_BACKOFF_BASE_SECONDS * (2 ** attempt))
+            delay = random.uniform(0, delay)
+
+            response = getattr(e, 'response', None)
+            retry_after = response.headers.get('retry-after') if response is not None else None
+            if retry_after:
+                try:
+                    delay = max(delay, float(retry_after))
+                except ValueError:
+                    pass
+
+            print(f"Transient OpenAI error ({type(e).__name__}), retrying in {delay:.1f}s (attempt {attempt + 1}/{max_retries})")
+            time.sleep(delay)
+
+
+def chunk_content_hash(chunk_text: str) -> str:
+    """SHA-256 of the normalized chunk text"""
+    normalized = embedding_cache.normalize(chunk_text)
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def chunk_ids(document_id: int, chunks: List[str]) -> List[Tuple[str, str]]:
+    """Stable, content-addressed ids for a document's chunks: [(chunk_id, content_hash)]
+
+    Repeated text within one document gets an occurrence suffix to keep ids unique.
+    """
+    seen = {}
+    ids = []
+    for chunk_text in chunks:
+        content_hash = chunk_content_hash(chunk_text)
+        seen[content_hash] = seen.get(content_hash, 0) + 1
+        chunk_id = f"doc_{document_id}_{content_hash[:16]}"
+        if seen[content_hash] > 1:
+            chunk_id = f"{chunk_id}_{seen[content_hash]}"
+        ids.append((chunk_id, content_hash))
+    return ids
+
+
+class IngestionPipeline:
+    """Parse → summary / structured extraction / embeddings (concurrently) → ChromaDB
+
+    Work for every document shares one bounded worker pool, and every OpenAI call
+    goes through a token-bucket limiter sized to the account's RPM/TPM limits.
+    """
+
+    def __init__(self):
+        self.limiter = OpenAIRateLimiter(settings.OPENAI_RPM_LIMIT, settings.OPENAI_TPM_LIMIT)
+        # Per-call work (LLM extraction, summaries, embeddings)
+        self.task_executor = ThreadPoolExecutor(
+            max_workers=settings.INGESTION_WORKERS,
+            thread_name_prefix="ingest-task"
+        )
+        # Whole documents (used by the job worker); kept separate so document threads never starve the task pool
+        self.document_executor = ThreadPoolExecutor(
+            max_workers=settings.INGESTION_DOCUMENT_WORKERS,
+            thread_name_prefix="ingest-doc"
+        )
+
+    def _empty_structured_data(self) -> Dict[str, Any]:
+        return {
+            'item_name': None,
+            'base_price': None,
+            'price_unit': None,
+            'conditions': [],
+            'location': None
+        }
+
+    def _extract_structured_data(self, chunk_text: str) -> Dict[str, Any]:
+        """Extract pricing data from a chunk (rate limited, retried with backoff)"""
+        self.limiter.acquire(estimate_tokens(chunk_text) + 500)
+        try:
+            return call_with_backoff(document_parser.extract_structured_data, chunk_text)
+        except Exception as e:
+            print(f"Error extracting structured data: {str(e)}")
+            return self._empty_structured_data()
+
+    def _generate_summary(self, text: str) -> str:
+        """Generate the document summary (rate limited)"""
+        self.limiter.acquire(estimate_tokens(text[:6000]) + 1000)
+        return document_parser.generate_summary(text)
+
+    def _embed_chunks(self, chunks: List[str]) -> List[List[float]]:
+        """Embed all chunk texts (rate limited and retried with backoff for remote backends)"""
+        if not vector_store.backend.remote:
+            return vector_store._get_embeddings(chunks)
+        tokens = sum(estimate_tokens(chunk) for chunk in chunks)
+        requests = max(1, math.ceil(tokens / settings.EMBEDDING_BATCH_MAX_TOKENS))
+        self.limiter.acquire(tokens, requests=requests)
+        return call_with_backoff(vector_store._get_embeddings, chunks)
+
+    def _build_chunk_metadata(
+        self,
+        document_id: int,
+        document_name: str,
+        idx: int,
+        content_hash: str,
+        structured_data: Optional[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """Build chunk metadata - ChromaDB only accepts str, int, float, bool"""
+        metadata = {
+            'document_id': document_id,
+            'document_name': document_name,
+            'chunk_index': idx,
+            'content_hash': content_hash,
+            'source': f"{document_name} chunk {idx+1}"
+        }
+
+        def safe_add_metadata(key, value, convert_fn=str):
+            """Safely add metadata only if value is not None and can be converted"""
+            if value is not None:
+                try:
+                    # Handle lists specially - convert to string
+                    if isinstance(value, list):
+                        if value:  # Only if list is not empty
+                            metadata[key] = ' | '.join(str(item) for item in value if item is not None)
+                    else:
+                        converted = convert_fn(value)
+                        # Ensure we don't add None after conversion
+                        if converted is not None:
+                            metadata[key] = converted
+                except (ValueError, TypeError):
+                    # Skip if conversion fails
+                    pass
+
+        # Add structured data to metadata
+        if structured_data:
+            safe_add_metadata('base_price', structured_data.get('base_price'), float)
+            safe_add_metadata('price_unit', structured_data.get('price_unit'), str)
+            safe_add_metadata('item_name', structured_data.get('item_name'), str)
+            safe_add_metadata('location', structured_data.get('location'), str)
+            safe_add_metadata('conditions', structured_data.get('conditions'), str)
+
+            # Every priced row of the chunk (ChromaDB metadata is flat, so stored as JSON)
+            line_items = structured_data.get('line_items')
+            if line_items is not None:
+                if line_items:
+                    metadata['line_items'] = json.dumps(line_items)
+                metadata['line_item_count'] = len(line_items)
+
+        return metadata
+
+    def _reuse_chunk_metadata(
+        self,
+        previous: Dict[str, Any],
+        document_id: int,
+        document_name: str,
+        idx: int,
+        content_hash: str
+    ) -> Dict[str, Any]:
+        """Keep the extracted pricing fields of an unchanged chunk, refresh its position"""
+        metadata = dict(previous)
+        metadata.update(self._build_chunk_metadata(document_id, document_name, idx, content_hash, None))
+        return metadata
+
+    def ingest_document(
+        self,
+        document_id: int,
+        document_name: str,
+        file_path: str,
+        file_type: str,
+        on_progress: Optional[Callable[[int, int], None]] = None
+    ) -> Dict[str, Any]:
+        """Parse a document and bring its chunks in the vector store up to date
+
+        Chunk ids are derived from the chunk content hash, so the new chunk set is
+        diffed against what is already stored: unchanged chunks only get their
+        position metadata refreshed, chunks whose text already exists under another
+        id reuse the extracted pricing data, and only new text is sent for LLM
+        extraction and embedding. Orphaned chunks are deleted last, so the previous
+        version stays searchable until the new one is complete.
+
+        Summary generation, structured extraction and embeddings run concurrently on
+        the worker pool. New chunks are written in windows of INGESTION_CHECKPOINT_CHUNKS
+        and on_progress is called with (completed_chunks, total_chunks) after each one;
+        since stored chunks are recognized by hash, an interrupted run simply resumes.
+
+        Returns {"text", "summary", "chunk_count", "changed_chunks", "deleted_chunks"};
+        the caller owns the DB updates.
+        """
+        # Parse (or load the cached text) and chunk document
+        text = parsed_text_store.get_text(file_path, file_type)
+        chunks = document_parser.chunk_text(text)
+        window_size = max(1, settings.INGESTION_CHECKPOINT_CHUNKS)
+
+        summary_future = self.task_executor.submit(self._generate_summary, text)
+
+        # Diff against the chunks already stored for this document
+        existing = vector_store.get_document_chunks(document_id)
+        existing_by_hash = {}
+        for chunk in existing.values():
+            existing_by_hash.setdefault(chunk_content_hash(chunk['content']), chunk['metadata'])
+
+        new_ids = []
+        unchanged_ids, unchanged_metadatas = [], []
+        changed = []  # (idx, chunk_text, chunk_id, content_hash, previous metadata or None)
+        for idx, (chunk_text, (chunk_id, content_hash)) in enumerate(zip(chunks, chunk_ids(document_id, chunks))):
+            new_ids.append(chunk_id)
+            if chunk_id in existing:
+                unchanged_ids.append(chunk_id)
+                unchanged_metadatas.append(self._reuse_chunk_metadata(
+                    existing[chunk_id]['metadata'], document_id, document_name, idx, content_hash
+                ))
+            else:
+                changed.append((idx, chunk_text, chunk_id, content_hash, existing_by_hash.get(content_hash)))
+
+        if unchanged_ids:
+            vector_store.update_chunks_metadata(unchanged_ids, unchanged_metadatas)
+
+        completed = len(unchanged_ids)
+        if on_progress:
+            on_progress(completed, len(chunks))
+
+        # Submit window by window so the first windows' embeddings aren't queued behind every extraction
+        windows = []
+        for window_start in range(0, len(changed), window_size):
+            window = changed[window_start:window_start + window_size]
+            extraction_futures = [
+                self.task_executor.submit(self._extract_structured_data, chunk_text) if previous is None else None
+                for _, chunk_text, _, _, previous in window
+            ]
+            embeddings_future = self.task_executor.submit(self._embed_chunks, [item[1] for item in window])
+            windows.append((window, extraction_futures, embeddings_future))
+
+        for window, extraction_futures, embeddings_future in windows:
+            chunk_batch = []
+            for (idx, chunk_text, chunk_id, content_hash, previous), future in zip(window, extraction_futures):
+                if previous is not None:
+                    metadata = self._reuse_chunk_metadata(previous, document_id, document_name, idx, content_hash)
+                else:
+                    metadata = self._build_chunk_metadata(
+                        document_id, document_name, idx, content_hash, future.result()
+                    )
+                chunk_batch.append({'id': chunk_id, 'content': chunk_text, 'metadata': metadata})
+
+            # Store the window in ChromaDB with its precomputed embeddings
+            vector_store.add_chunks(chunk_batch, embeddings=embeddings_future.result())
+
+            completed += len(chunk_batch)
+            if on_progress:
+                on_progress(completed, len(chunks))
+
+        # Drop chunks whose text no longer appears in the document
+        new_id_set = set(new_ids)
+        orphan_ids = [chunk_id for chunk_id in existing if chunk_id not in new_id_set]
+        if orphan_ids:
+            vector_store.delete_chunks(orphan_ids)
+
+        return {
+            'text': text,
+            'summary': summary_future.result(),
+            'chunk_count': len(chunks),
+            'changed_chunks': len(changed),
+            'deleted_chunks': len(orphan_ids)
+        }
+
+
+# Singleton instance
+ingestion_pipeline = IngestionPipeline()
@@ -0,0 +1,380 @@
+import math
+import re
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import SessionLocal
+from app.models import EnquiryMessage
+
+
+# Message shapes whose intent is unambiguous
+AFFIRMATIVE_RE = re.compile(
+    r"^(yes|yeah|yea|yep|yup|sure|ok|okay|k|confirm|confirmed|proceed|go ahead|alright|all right|"
+    r"let'?s do it|do it|please do|yes please|ok please|sounds good)( please)?( thanks| thank you)?$"
+)
+SMALL_TALK_RE = re.compile(
+    r"^(hi|hello|hey|hiya|good (morning|afternoon|evening)|thanks|thank you|thx|ty|cheers|"
+    r"ok thanks|ok thank you|great|cool|noted|bye|goodbye|no|nope|no thanks|no thank you)( there| so much| a lot)?$"
+)
+QUOTE_REQUEST_RE = re.compile(
+    r"\b(give|send|get|prepare|generate|create|make|draft|need|want|like|request|provide|do)\b"
+    r"(\s+\w+){0,4}?\s+(a\s+|the\s+|your\s+)?(quote|quotation|formal quote)s?\b"
+)
+QUOTE_ONLY_RE = re.compile(r"^(a\s+)?(quote|quotation)( please| pls| now)?$")
+NEGATION_RE = re.compile(r"\b(don'?t|do not|no need|not now|not yet|never mind|nevermind|later)\b")
+PRICE_QUESTION_RE = re.compile(r"\b(how much|price|prices|pricing|cost|costs|rate|rates)\b")
+QUOTE_NOUNS = r"quote|quotes|quotation|quotations"
+DRAWING_NOUNS = (
+    r"drawing|drawings|diagram|diagrams|blueprint|blueprints|schematic|schematics|picture|pictures|"
+    r"photo|photos|image|images|render|renders|visual|visuals|design|designs|sketch|sketches"
+)
+# "show me" / "can i see" only count with something to look at; on their own they
+# just as often ask for a price or the quote
+DRAWING_RE = re.compile(
+    rf"\b({DRAWING_NOUNS})\b"
+    r"|\bwhat (does|do) (it|they|this|that|the \w+( \w+)?) look like\b"
+    r"|\bhow (does|do) (it|they|this|that|the \w+( \w+)?) look\b"
+    r"|\bhow (it|they|this|that|the \w+( \w+)?) looks?\b"
+)
+
+
+def _negated_noun_re(nouns: str) -> re.Pattern:
+    """A negation up to three words before one of the nouns ("not a quote yet", "don't need the drawings")"""
+    return re.compile(rf"\b(not|no|don'?t|do not|dont|never|without)\b(\s+\S+){{0,3}}?\s+({nouns})\b")
+
+
+QUOTE_NEGATION_RE = _negated_noun_re(QUOTE_NOUNS)
+DRAWING_NEGATION_RE = _negated_noun_re(DRAWING_NOUNS)
+
+# Snake-case product identifiers and the phrases that name them
+PRODUCT_KEYWORDS = [
+    ('cat_ladder', ['cat ladder', 'access ladder', 'vertical ladder']),
+    ('court_marking', ['court marking', 'line marking', 'sports court']),
+    ('glass_partition', ['glass partition', 'glass panel', 'glass wall']),
+    ('handrail', ['handrail', 'railing', 'safety rail']),
+    ('skylight', ['skylight', 'roof window']),
+    ('wood_flooring', ['wood floor', 'wooden floor', 'woodfloor', 'parquet', 'engineered wood']),
+    ('vinyl_flooring', ['vinyl floor', 'vinyl sheet']),
+    ('cork_flooring', ['cork floor']),
+    ('spc_flooring', ['spc floor', 'spc', 'stone plastic composite']),
+    ('lvt_flooring', ['lvt floor', 'lvt', 'luxury vinyl tile']),
+    ('staircase', ['staircase', 'stairs']),
+    ('canopy', ['canopy', 'sunshade', 'awning']),
+    ('bike_rack', ['bike rack', 'bicycle parking', 'bicycle rack']),
+    ('artificial_grass', ['artificial grass', 'synthetic turf']),
+    ('led_lantern', ['led lantern', 'lantern']),
+]
+
+# Labelled examples (mirroring the LLM prompts) so the model is usable before any history is loaded
+SEED_EXAMPLES = {
+    'wants_quote': [
+        ("i need a quote for cat ladder installation", True),
+        ("give me a quote", True),
+        ("prepare a quote", True),
+        ("i'd like a quote", True),
+        ("can you quote me for parquet sanding", True),
+        ("please quote for court markings", True),
+        ("yes", True, True),
+        ("ok", True, True),
+        ("go ahead", True, True),
+        ("how much for 2m high cat ladder", False),
+        ("how much for cat ladder", False),
+        ("price for ss316 ladder", False),
+        ("cost of installation", False),
+        ("what's the pricing", False),
+        ("what services do you offer", False),
+        ("tell me about parquet flooring", False),
+        ("hello", False),
+        ("aluminum", False),
+        ("yes", False),
+        ("3 meters", False),
+    ],
+    'wants_drawing': [
+        ("show me how the ladder looks", True),
+        ("can i see a drawing", True),
+        ("what does the cat ladder look like", True),
+        ("show me the design", True),
+        ("do you have a picture of the canopy", True),
+        ("send me the technical drawing", True),
+        ("what materials do you have", False),
+        ("how much does it cost", False),
+        ("ok thanks", False),
+        ("thank you", False),
+        ("yes", False),
+        ("aluminum", False),
+        ("2m", False),
+        ("i need a quote for cat ladder", False),
+    ],
+}
+
+# Extra token marking that the assistant has just offered to prepare a quote
+QUOTE_OFFER_TOKEN = "__quote_offered__"
+
+
+def normalize_message(message: str) -> str:
+    """Lowercase, keep word characters/apostrophes and collapse whitespace"""
+    message = (message or "").lower().replace("’", "'")
+    message = re.sub(r"[^a-z0-9'\s]", " ", message)
+    return " ".join(message.split())
+
+
+def last_assistant_message(conversation_history: str) -> str:
+    """Last assistant line of an 'role: content' history string"""
+    for line in reversed((conversation_history or "").splitlines()):
+        if line.startswith("assistant:"):
+            return line[len("assistant:"):].strip()
+    return ""
+
+
+def offers_quote(assistant_message: str) -> bool:
+    """True if the assistant asked whether the customer wants a quote"""
+    text = (assistant_message or "").lower()
+    return "quote" in text and "?" in text
+
+
+class NaiveBayesModel:
+    """Multinomial naive Bayes over unigrams and bigrams, updated incrementally
+
+    Seed examples shape the probabilities but don't count towards
+    INTENT_CLASSIFIER_MIN_EXAMPLES: a model that has only seen the seeds never answers.
+    """
+
+    def __init__(self):
+        self.class_counts = defaultdict(int)
+        self.learned_counts = defaultdict(int)  # Examples from history and LLM answers, per class
+        self.token_counts = {True: defaultdict(int), False: defaultdict(int)}
+        self.token_totals = defaultdict(int)
+        self.vocabulary = set()
+
+    @staticmethod
+    def features(text: str, extra: Optional[List[str]] = None) -> List[str]:
+        words = text.split()
+        tokens = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        return tokens + (extra or [])
+
+    def add(self, tokens: List[str], label: bool, seed: bool = False):
+        label = bool(label)
+        self.class_counts[label] += 1
+        if not seed:
+            self.learned_counts[label] += 1
+        for token in tokens:
+            self.token_counts[label][token] += 1
+            self.token_totals[label] += 1
+            self.vocabulary.add(token)
+
+    def predict(self, tokens: List[str]) -> Optional[Tuple[bool, float]]:
+        """(label, probability), or None if the model has nothing to go on"""
+        if min(self.learned_counts[True], self.learned_counts[False]) < settings.INTENT_CLASSIFIER_MIN_EXAMPLES:
+            return None
+
+        known = [token for token in tokens if token in self.vocabulary]
+        if not known:
+            return None
+
+        total_docs = self.class_counts[True] + self.class_counts[False]
+        vocab_size = len(self.vocabulary)
+        scores = {}
+        for label in (True, False):
+            score = math.log(self.class_counts[label] / total_docs)
+            denominator = self.token_totals[label] + vocab_size
+            for token in known:
+                score += math.log((self.token_counts[label][token] + 1) / denominator)
+            scores[label] = score
+
+        # Softmax over the two log scores
+        top = max(scores.values())
+        weights = {label: math.exp(score - top) for label, score in scores.items()}
+        label = scores[True] >= scores[False]
+        return label, weights[label] / sum(weights.values())
+
+
+class IntentClassifier:
+    """CPU-only fast path for the chat intent checks (quote request, drawing request, product)
+
+    Unambiguous messages are settled by rules; the rest go to a naive Bayes model trained
+    from seed examples, rule-labelled EnquiryMessage history and every answer the LLM gives.
+    Callers fall back to the LLM whenever predict() returns None (confidence below
+    INTENT_CLASSIFIER_THRESHOLD, or fewer than INTENT_CLASSIFIER_MIN_EXAMPLES learned
+    examples per class).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.models = {intent: NaiveBayesModel() for intent in SEED_EXAMPLES}
+        self.rule_hits = defaultdict(int)
+        self.model_hits = defaultdict(int)
+        self.fallbacks = defaultdict(int)
+        self.history_examples = 0
+
+        for intent, examples in SEED_EXAMPLES.items():
+            for example in examples:
+                text, label = example[0], example[1]
+                quote_offered = len(example) > 2 and example[2]
+                self._add(intent, normalize_message(text), label, quote_offered, seed=True)
+
+    def _extra_tokens(self, quote_offered: bool) -> List[str]:
+        return [QUOTE_OFFER_TOKEN] if quote_offered else []
+
+    def _add(self, intent: str, text: str, label: bool, quote_offered: bool = False, seed: bool = False):
+        tokens = NaiveBayesModel.features(text, self._extra_tokens(quote_offered))
+        with self._lock:
+            self.models[intent].add(tokens, label, seed)
+
+    @staticmethod
+    def _negated(intent: str, text: str) -> bool:
+        noun_negation = QUOTE_NEGATION_RE if intent == 'wants_quote' else DRAWING_NEGATION_RE
+        return bool(NEGATION_RE.search(text) or noun_negation.search(text))
+
+    # ------------------------------------------------------------------
+    # Rules
+    # ------------------------------------------------------------------
+
+    def _rule_wants_quote(self, text: str, quote_offered: bool) -> Optional[bool]:
+        if not text:
+            return False
+        if self._negated('wants_quote', text):
+            return None
+        if QUOTE_ONLY_RE.match(text) or QUOTE_REQUEST_RE.search(text):
+            return True
+        if AFFIRMATIVE_RE.match(text):
+            return quote_offered
+        if SMALL_TALK_RE.match(text):
+            return False
+        if PRICE_QUESTION_RE.search(text) and 'quot' not in text:
+            return False
+        return None
+
+    def _rule_wants_drawing(self, text: str) -> Optional[bool]:
+        if not text:
+            return False
+        if DRAWING_RE.search(text):
+            return None if self._negated('wants_drawing', text) else True
+        if SMALL_TALK_RE.match(text) or AFFIRMATIVE_RE.match(text):
+            return False
+        # Short replies without any visual wording are answers to questions
+        if len(text.split()) <= 4:
+            return False
+        return None
+
+    def _rule_label(self, intent: str, text: str, quote_offered: bool) -> Optional[bool]:
+        if intent == 'wants_quote':
+            return self._rule_wants_quote(text, quote_offered)
+        return self._rule_wants_drawing(text)
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def predict(self, intent: str, message: str, context: str = "") -> Optional[bool]:
+        """Confident local answer for an intent, or None to defer to the LLM
+
+        context is the previous assistant message (used to read "yes"/"ok" correctly).
+        """
+        if not settings.INTENT_CLASSIFIER_ENABLED:
+            return None
+
+        text = normalize_message(message)
+        quote_offered = offers_quote(context)
+
+        label = self._rule_label(intent, text, quote_offered)
+        if label is not None:
+            self.rule_hits[intent] += 1
+            return label
+
+        # Bag-of-words can't read negation ("don't need a quote yet"), leave those to the LLM
+        prediction = None
+        if not self._negated(intent, text):
+            tokens = NaiveBayesModel.features(text, self._extra_tokens(quote_offered))
+            with self._lock:
+                prediction = self.models[intent].predict(tokens)
+
+        if prediction and prediction[1] >= settings.INTENT_CLASSIFIER_THRESHOLD:
+            self.model_hits[intent] += 1
+            return prediction[0]
+
+        self.fallbacks[intent] += 1
+        return None
+
+    def record(self, intent: str, message: str, label: bool, context: str = ""):
+        """Learn from an answer the LLM gave for a message the classifier deferred on"""
+        self._add(intent, normalize_message(message), bool(label), offers_quote(context))
+
+    def detect_product(self, message: str) -> Optional[str]:
+        """Product named in the message itself, or None if there is none or several"""
+        if not settings.INTENT_CLASSIFIER_ENABLED:
+            return None
+
+        text = f" {normalize_message(message)} "
+        found = {
+            product for product, phrases in PRODUCT_KEYWORDS
+            if any(f" {phrase}" in text for phrase in phrases)
+        }
+        if len(found) == 1:
+            self.rule_hits['product'] += 1
+            return found.pop()
+
+        self.fallbacks['product'] += 1
+        return None
+
+    def train_from_history(self, db: Session, limit: int = None) -> int:
+        """Add rule-labelled customer messages from past enquiries to the models
+
+        Only messages the rules label confidently are used; the model then generalises
+        to wording the rules don't cover. Returns the number of examples added.
+        """
+        limit = limit or settings.INTENT_CLASSIFIER_HISTORY_LIMIT
+        messages = db.query(EnquiryMessage).order_by(
+            EnquiryMessage.enquiry_id, EnquiryMessage.created_at, EnquiryMessage.id
+        ).limit(limit).all()
+
+        added = 0
+        previous_assistant = {}
+        for message in messages:
+            if message.role == 'assistant':
+                previous_assistant[message.enquiry_id] = message.content or ""
+                continue
+            if message.role != 'customer' or not message.content:
+                continue
+
+            text = normalize_message(message.content)
+            quote_offered = offers_quote(previous_assistant.get(message.enquiry_id, ""))
+            for intent in self.models:
+                label = self._rule_label(intent, text, quote_offered)
+                if label is not None:
+                    self._add(intent, text, label, quote_offered)
+                    added += 1
+
+        self.history_examples += added
+        return added
+
+    def train_in_background(self):
+        """Load EnquiryMessage history on a daemon thread so startup isn't delayed"""
+        def train():
+            db = SessionLocal()
+            try:
+                added = self.train_from_history(db)
+                print(f"Intent classifier trained on {added} examples from enquiry history")
+            except Exception as e:
+                print(f"Error training intent classifier: {str(e)}")
+            finally:
+                db.close()
+
+        threading.Thread(target=train, name="intent-classifier-training", daemon=True).start()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Where answers came from in this process (rules, model or LLM fallback)"""
+        intents = list(self.models) + ['product']
+        return {
+            intent: {
+                "rule_hits": self.rule_hits[intent],
+                "model_hits": self.model_hits[intent],
+                "llm_fallbacks": self.fallbacks[intent]
+            }
+            for intent in intents
+        }
+
+
+# Singleton instance
+intent_classifier = IntentClassifier()
@@ -0,0 +1,270 @@
+from typing import List, Optional
+from concurrent.futures import wait
+from datetime import datetime, timedelta
+import threading
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import SessionLocal
+from app.models import Document, ProcessingJob, ProcessingJobItem, JobStatus, JOB_DOCUMENT_STATUS
+from app.services.ingestion import ingestion_pipeline
+
+
+ACTIVE_JOB_STATUSES = (JobStatus.QUEUED, JobStatus.RUNNING)
+
+
+class JobQueue:
+    """Database-backed queue for document processing jobs
+
+    A job holds one item per document and items checkpoint how many chunks are stored.
+    A job whose worker died (stale heartbeat) is picked up again; chunks are content
+    addressed, so every document resumes after its last stored chunk window instead
+    of starting over.
+    """
+
+    def __init__(self):
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    # ------------------------------------------------------------------
+    # Producer side (called from request handlers)
+    # ------------------------------------------------------------------
+
+    def enqueue(
+        self,
+        db: Session,
+        job_type: str,
+        documents: List[Document],
+        created_by: Optional[int] = None
+    ) -> ProcessingJob:
+        """Create a job for the given documents and mark them as processing"""
+        job = ProcessingJob(job_type=job_type, status=JobStatus.QUEUED, created_by=created_by)
+        db.add(job)
+
+        for document in documents:
+            job.items.append(ProcessingJobItem(document_id=document.id, status=JobStatus.QUEUED))
+            document.status = JOB_DOCUMENT_STATUS[JobStatus.QUEUED]
+            document.error_message = None
+
+        db.commit()
+        db.refresh(job)
+        return job
+
+    def find_active_job(self, db: Session, document_id: int) -> Optional[ProcessingJob]:
+        """Return the queued/running job that already covers this document, if any"""
+        item = db.query(ProcessingJobItem).join(ProcessingJob).filter(
+            ProcessingJobItem.document_id == document_id,
+            ProcessingJobItem.status.in_(ACTIVE_JOB_STATUSES),
+            ProcessingJob.status.in_(ACTIVE_JOB_STATUSES)
+        ).order_by(ProcessingJob.id.desc()).first()
+
+        return item.job if item else None
+
+    # ------------------------------------------------------------------
+    # Worker side
+    # ------------------------------------------------------------------
+
+    def requeue_stale_jobs(self):
+        """Put running jobs whose worker stopped heartbeating back on the queue"""
+        db = SessionLocal()
+        try:
+            cutoff = datetime.utcnow() - timedelta(seconds=settings.JOB_STALE_AFTER_SECONDS)
+            stale_jobs = db.query(ProcessingJob).filter(
+                ProcessingJob.status == JobStatus.RUNNING,
+                ProcessingJob.heartbeat_at < cutoff
+            ).all()
+
+            for job in stale_jobs:
+                print(f"Resuming stale processing job {job.id} (last heartbeat {job.heartbeat_at})")
+                job.status = JobStatus.QUEUED
+
+            if stale_jobs:
+                db.commit()
+        finally:
+            db.close()
+
+    def claim_next_job(self) -> Optional[int]:
+        """Atomically move the oldest queued job to running; returns its id"""
+        db = SessionLocal()
+        try:
+            job = db.query(ProcessingJob).filter(
+                ProcessingJob.status == JobStatus.QUEUED
+            ).order_by(ProcessingJob.id).with_for_update(skip_locked=True).first()
+
+            if not job:
+                db.rollback()
+                return None
+
+            now = datetime.utcnow()
+            job.status = JobStatus.RUNNING
+            job.started_at = job.started_at or now
+            job.heartbeat_at = now
+            db.commit()
+            return job.id
+        finally:
+            db.close()
+
+    def _heartbeat(self, db: Session, job: ProcessingJob):
+        job.heartbeat_at = datetime.utcnow()
+        db.commit()
+
+    def run_job(self, job_id: int):
+        """Run every unfinished item of a job, several documents at a time"""
+        db = SessionLocal()
+        try:
+            job = db.query(ProcessingJob).filter(ProcessingJob.id == job_id).first()
+            pending_ids = [
+                item.id for item in job.items
+                if item.status in ACTIVE_JOB_STATUSES
+            ]
+
+            futures = {
+                ingestion_pipeline.document_executor.submit(self._run_item, job.job_type, item_id): item_id
+                for item_id in pending_ids
+            }
+
+            # Keep the heartbeat fresh while documents are being processed
+            not_done = set(futures)
+            while not_done:
+                _, not_done = wait(not_done, timeout=settings.JOB_STALE_AFTER_SECONDS / 4)
+                self._heartbeat(db, job)
+
+            # Items that raised past their own error handling (e.g. lost DB connection)
+            for future, item_id in futures.items():
+                error = future.exception()
+                if error is not None:
+                    print(f"Error processing job item {item_id}: {str(error)}")
+                    item = db.query(ProcessingJobItem).filter(ProcessingJobItem.id == item_id).first()
+                    item.status = JobStatus.FAILED
+                    item.error_message = str(error)
+                    item.finished_at = datetime.utcnow()
+                    if item.document:
+                        item.document.status = JOB_DOCUMENT_STATUS[JobStatus.FAILED]
+                        item.document.error_message = str(error)
+            db.commit()
+
+            db.refresh(job)
+            failed = [item for item in job.items if item.status == JobStatus.FAILED]
+
+            # A job only fails outright when none of its documents could be processed
+            job.status = JobStatus.FAILED if failed and len(failed) == len(job.items) else JobStatus.COMPLETED
+            if failed:
+                job.error_message = f"{len(failed)} of {len(job.items)} documents failed"
+            job.finished_at = datetime.utcnow()
+            db.commit()
+
+            print(f"Processing job {job.id} finished: {job.status.value}")
+
+        except Exception as e:
+            print(f"Error running processing job {job_id}: {str(e)}")
+            db.rollback()
+            job = db.query(ProcessingJob).filter(ProcessingJob.id == job_id).first()
+            if job:
+                job.status = JobStatus.FAILED
+                job.error_message = str(e)
+                job.finished_at = datetime.utcnow()
+                db.commit()
+        finally:
+            db.close()
+
+    def _run_item(self, job_type: str, item_id: int):
+        """Process one document of a job, checkpointing after every stored chunk window"""
+        db = SessionLocal()
+        try:
+            item = db.query(ProcessingJobItem).filter(ProcessingJobItem.id == item_id).first()
+            document = db.query(Document).filter(Document.id == item.document_id).first()
+
+            if not document:
+                item.status = JobStatus.FAILED
+                item.error_message = "Document not found"
+                item.finished_at = datetime.utcnow()
+                db.commit()
+                return
+
+            item.status = JobStatus.RUNNING
+            item.started_at = item.started_at or datetime.utcnow()
+            document.status = JOB_DOCUMENT_STATUS[JobStatus.RUNNING]
+            db.commit()
+
+            def checkpoint(completed_chunks: int, total_chunks: int):
+                item.completed_chunks = completed_chunks
+                item.total_chunks = total_chunks
+                db.commit()
+
+            try:
+                result = ingestion_pipeline.ingest_document(
+                    document.id,
+                    document.original_filename,
+                    document.file_path,
+                    document.file_type,
+                    on_progress=checkpoint
+                )
+            except Exception as e:
+                print(f"Error processing document {document.id}: {str(e)}")
+                db.rollback()
+                item.status = JobStatus.FAILED
+                item.error_message = str(e)
+                item.finished_at = datetime.utcnow()
+                document.status = JOB_DOCUMENT_STATUS[JobStatus.FAILED]
+                document.error_message = str(e)
+                db.commit()
+                return
+
+            item.status = JobStatus.COMPLETED
+            item.total_chunks = result['chunk_count']
+            item.completed_chunks = result['chunk_count']
+            item.finished_at = datetime.utcnow()
+            document.summary = result['summary']
+            document.status = JOB_DOCUMENT_STATUS[JobStatus.COMPLETED]
+            document.processed_at = datetime.utcnow()
+            document.error_message = None
+            db.commit()
+            db.refresh(document)
+            print(f"Processed document {document.id}: {document.original_filename}")
+
+            # Auto-detect and link products if this is a catalog/drawing
+            if job_type == "process":
+                from app.services.product_links import auto_link_products
+                try:
+                    auto_link_products(db, document, result['text'])
+                except Exception as e:
+                    print(f"Error auto-linking products: {str(e)}")
+                    # Don't fail the whole processing if auto-link fails
+        finally:
+            db.close()
+
+    def run_forever(self, stop_event: threading.Event = None):
+        """Worker loop: resume stale jobs, claim the next queued job and run it"""
+        stop_event = stop_event or self._stop_event
+        print("Processing job worker started")
+
+        while not stop_event.is_set():
+            try:
+                self.requeue_stale_jobs()
+                job_id = self.claim_next_job()
+            except Exception as e:
+                print(f"Error polling processing jobs: {str(e)}")
+                job_id = None
+
+            if job_id is None:
+                stop_event.wait(settings.JOB_POLL_INTERVAL_SECONDS)
+                continue
+
+            self.run_job(job_id)
+
+        print("Processing job worker stopped")
+
+    def start(self):
+        """Start the worker loop in a background thread of this process"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self.run_forever, name="job-worker", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Ask the background worker to stop after its current job"""
+        self._stop_event.set()
+
+
+# Singleton instance
+job_queue = JobQueue()
@@ -0,0 +1,261 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+from openai.types.chat import ChatCompletion
+from starlette.concurrency import run_in_threadpool
+from app.config import settings
+
+
+class LLMResponseCache:
+    """Response cache for deterministic (temperature=0) chat completions
+
+    Entries are keyed by a hash of (model, messages, params) and live in an in-process
+    LRU, optionally backed by SQLite so they survive restarts. Classifier calls that
+    see the same short answers ("yes", "ok", ...) over and over skip the network.
+    """
+
+    # How often (seconds) expired rows are purged from the persistent store
+    PURGE_INTERVAL = 3600
+
+    def __init__(self, max_entries: int, ttl_seconds: int, path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.path = path
+        self._lock = threading.Lock()  # In-process LRU and counters
+        self._db_lock = threading.Lock()  # The shared SQLite connection
+        self._entries = OrderedDict()
+        self._conn = None
+        self._last_purge = 0.0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    @staticmethod
+    def _normalize_messages(messages: Any) -> Any:
+        """Collapse whitespace in message text so trivially different prompts share an entry"""
+        normalized = []
+        for message in messages or []:
+            message = dict(message)
+            if isinstance(message.get("content"), str):
+                message["content"] = " ".join(message["content"].split())
+            normalized.append(message)
+        return normalized
+
+    def make_key(self, params: Dict[str, Any]) -> str:
+        """sha256 over model, normalized messages and every other request parameter"""
+        payload = dict(params)
+        payload["messages"] = self._normalize_messages(params.get("messages"))
+        encoded = json.dumps(payload, sort_keys=True, default=str, ensure_ascii=False)
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    def is_cacheable(self, params: Dict[str, Any]) -> bool:
+        """Only deterministic, non-streaming requests are served from the cache"""
+        return (
+            settings.LLM_CACHE_ENABLED
+            and params.get("temperature") == 0
+            and not params.get("stream")
+            and params.get("n", 1) == 1
+        )
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        """Open the SQLite store lazily (first use); None when running memory-only"""
+        if not self.path:
+            return None
+        if self._conn is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS llm_responses (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_responses_expires_at ON llm_responses (expires_at)")
+            self._conn = conn
+        return self._conn
+
+    def _remember(self, key: str, expires_at: float, response: ChatCompletion):
+        """Put an entry in the in-process LRU (caller holds the lock)"""
+        self._entries[key] = (expires_at, response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _memory_get(self, key: str, now: float) -> Optional[ChatCompletion]:
+        """Look up the in-process LRU (caller holds the lock)"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, response = entry
+            if expires_at > now:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return response
+            del self._entries[key]
+        return None
+
+    def get(self, key: str) -> Optional[ChatCompletion]:
+        """Look up a cached response, memory first, then the persistent store"""
+        now = time.time()
+
+        with self._lock:
+            response = self._memory_get(key, now)
+            if response is not None:
+                return response
+
+        # The LRU lock isn't held during SQLite I/O, so memory hits never wait on the disk
+        with self._db_lock:
+            try:
+                conn = self._connect()
+                row = conn.execute(
+                    "SELECT response, expires_at FROM llm_responses WHERE key = ? AND expires_at > ?",
+                    (key, now)
+                ).fetchone() if conn else None
+            except Exception as e:
+                print(f"Error reading LLM response cache: {str(e)}")
+                row = None
+
+        if row is not None:
+            try:
+                response = ChatCompletion.model_validate_json(row[0])
+            except Exception as e:
+                print(f"Discarding unreadable LLM cache entry: {str(e)}")
+            else:
+                with self._lock:
+                    self._remember(key, row[1], response)
+                    self.disk_hits += 1
+                return response
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, response: ChatCompletion):
+        """Store a response in memory and, if configured, on disk"""
+        expires_at = time.time() + self.ttl_seconds
+
+        with self._lock:
+            self._remember(key, expires_at, response)
+
+        with self._db_lock:
+            try:
+                conn = self._connect()
+                if conn is None:
+                    return
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_responses (key, model, response, expires_at) VALUES (?, ?, ?, ?)",
+                    (key, response.model, response.model_dump_json(), expires_at)
+                )
+                if time.time() - self._last_purge > self.PURGE_INTERVAL:
+                    conn.execute("DELETE FROM llm_responses WHERE expires_at <= ?", (time.time(),))
+                    self._last_purge = time.time()
+                conn.commit()
+            except Exception as e:
+                print(f"Error writing LLM response cache: {str(e)}")
+
+    @staticmethod
+    def _is_complete(response: ChatCompletion, params: Dict[str, Any]) -> bool:
+        """Don't cache truncated output or JSON-mode replies that don't parse"""
+        if not response.choices:
+            return False
+        choice = response.choices[0]
+        if choice.finish_reason != "stop" or choice.message.content is None:
+            return False
+
+        response_format = params.get("response_format") or {}
+        if response_format.get("type") == "json_object":
+            try:
+                json.loads(choice.message.content)
+            except ValueError:
+                return False
+        return True
+
+    def create(self, client, **params) -> ChatCompletion:
+        """Drop-in for client.chat.completions.create that serves repeats from the cache"""
+        if not self.is_cacheable(params):
+            self.bypassed += 1
+            return client.chat.completions.create(**params)
+
+        key = self.make_key(params)
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+
+        response = client.chat.completions.create(**params)
+        if self._is_complete(response, params):
+            self.put(key, response)
+        return response
+
+    async def acreate(self, client, **params) -> ChatCompletion:
+        """create() for an AsyncOpenAI client
+
+        Memory hits are served on the event loop; SQLite reads and writes block, so
+        they run in the threadpool.
+        """
+        if not self.is_cacheable(params):
+            self.bypassed += 1
+            return await client.chat.completions.create(**params)
+
+        key = self.make_key(params)
+        with self._lock:
+            cached = self._memory_get(key, time.time())
+        if cached is None:
+            cached = await run_in_threadpool(self.get, key) if self.path else self.get(key)
+        if cached is not None:
+            return cached
+
+        response = await client.chat.completions.create(**params)
+        if self._is_complete(response, params):
+            if self.path:
+                await run_in_threadpool(self.put, key, response)
+            else:
+                self.put(key, response)
+        return response
+
+    def clear(self):
+        """Drop every entry (memory and disk)"""
+        with self._lock:
+            self._entries.clear()
+        with self._db_lock:
+            try:
+                conn = self._connect()
+                if conn is not None:
+                    conn.execute("DELETE FROM llm_responses")
+                    conn.commit()
+            except Exception as e:
+                print(f"Error clearing LLM response cache: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Cache statistics for the current process"""
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            "enabled": settings.LLM_CACHE_ENABLED,
+            "persistent": bool(self.path),
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": hits,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0
+        }
+
+
+# Singleton instance
+llm_cache = LLMResponseCache(
+    max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.LLM_CACHE_TTL_SECONDS,
+    path=settings.LLM_CACHE_PATH or None
+)
@@ -0,0 +1,205 @@
+import asyncio
+import threading
+from collections import defaultdict
+from contextlib import contextmanager, asynccontextmanager
+from typing import Any, Dict
+import httpx
+from openai import OpenAI, AsyncOpenAI
+from app.config import settings
+
+
+class LLMGatewayBusyError(Exception):
+    """No request slot for the model freed up within LLM_QUEUE_TIMEOUT_SECONDS"""
+    pass
+
+
+def _http2_available() -> bool:
+    """HTTP/2 needs the optional h2 package (httpx[http2])"""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class _LimitedResource:
+    """Wraps a client resource (chat.completions, embeddings) with the per-model limits"""
+
+    def __init__(self, gateway: "LLMGateway", resource):
+        self._gateway = gateway
+        self._resource = resource
+
+    def create(self, **params):
+        model = params.get("model", "")
+        params = self._gateway.apply_timeout(model, params)
+        with self._gateway.slot(model):
+            return self._resource.create(**params)
+
+
+class _AsyncLimitedResource:
+    """Async counterpart of _LimitedResource"""
+
+    def __init__(self, gateway: "LLMGateway", resource):
+        self._gateway = gateway
+        self._resource = resource
+
+    async def create(self, **params):
+        model = params.get("model", "")
+        params = self._gateway.apply_timeout(model, params)
+        async with self._gateway.async_slot(model):
+            return await self._resource.create(**params)
+
+
+class _Namespace:
+    def __init__(self, **attrs):
+        self.__dict__.update(attrs)
+
+
+class GatewayClient:
+    """Drop-in for an OpenAI client exposing chat.completions, embeddings and the raw client"""
+
+    def __init__(self, gateway: "LLMGateway", client, limited_resource):
+        self.raw = client
+        self.chat = _Namespace(completions=limited_resource(gateway, client.chat.completions))
+        self.embeddings = limited_resource(gateway, client.embeddings)
+
+
+class LLMGateway:
+    """Single owner of the OpenAI clients used across the app
+
+    One keep-alive httpx connection pool (HTTP/2 when h2 is installed) per sync/async
+    client, so calls reuse connections instead of paying a TLS handshake each time.
+    Every request goes through a per-model concurrency limit: callers queue for a slot
+    (up to LLM_QUEUE_TIMEOUT_SECONDS) rather than piling onto the API. For streamed
+    completions the slot covers the request up to the first byte.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._client = None
+        self._async_client = None
+        self._semaphores = {}
+        self._async_semaphores = {}
+        self.in_flight = defaultdict(int)
+        self.requests = defaultdict(int)
+        self.rejected = defaultdict(int)
+
+    # ------------------------------------------------------------------
+    # Connection pool
+    # ------------------------------------------------------------------
+
+    def _http2(self) -> bool:
+        if settings.LLM_HTTP2 and not _http2_available():
+            print("LLM_HTTP2 is enabled but the h2 package is missing; using HTTP/1.1 keep-alive")
+            return False
+        return settings.LLM_HTTP2
+
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=settings.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY_SECONDS
+        )
+
+    def _timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(settings.LLM_TIMEOUT_SECONDS, connect=settings.LLM_CONNECT_TIMEOUT_SECONDS)
+
+    @property
+    def client(self) -> GatewayClient:
+        """Shared sync client (created on first use)"""
+        with self._lock:
+            if self._client is None:
+                http_client = httpx.Client(http2=self._http2(), limits=self._limits(), timeout=self._timeout())
+                raw = OpenAI(api_key=settings.OPENAI_API_KEY, http_client=http_client, timeout=self._timeout())
+                self._client = GatewayClient(self, raw, _LimitedResource)
+            return self._client
+
+    @property
+    def async_client(self) -> GatewayClient:
+        """Shared async client (created on first use)"""
+        with self._lock:
+            if self._async_client is None:
+                http_client = httpx.AsyncClient(http2=self._http2(), limits=self._limits(), timeout=self._timeout())
+                raw = AsyncOpenAI(api_key=settings.OPENAI_API_KEY, http_client=http_client, timeout=self._timeout())
+                self._async_client = GatewayClient(self, raw, _AsyncLimitedResource)
+            return self._async_client
+
+    # ------------------------------------------------------------------
+    # Per-model limits
+    # ------------------------------------------------------------------
+
+    def concurrency_limit(self, model: str) -> int:
+        return settings.LLM_MODEL_CONCURRENCY.get(model, settings.LLM_DEFAULT_CONCURRENCY)
+
+    def apply_timeout(self, model: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Use the model's configured timeout unless the caller passed one"""
+        model_timeout = settings.LLM_MODEL_TIMEOUTS.get(model)
+        if model_timeout is None or "timeout" in params:
+            return params
+        return {**params, "timeout": httpx.Timeout(model_timeout, connect=settings.LLM_CONNECT_TIMEOUT_SECONDS)}
+
+    def _semaphore(self, model: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            if model not in self._semaphores:
+                self._semaphores[model] = threading.BoundedSemaphore(self.concurrency_limit(model))
+            return self._semaphores[model]
+
+    def _async_semaphore(self, model: str) -> asyncio.Semaphore:
+        with self._lock:
+            if model not in self._async_semaphores:
+                self._async_semaphores[model] = asyncio.Semaphore(self.concurrency_limit(model))
+            return self._async_semaphores[model]
+
+    @contextmanager
+    def slot(self, model: str):
+        """Hold one of the model's request slots (blocking wait)"""
+        semaphore = self._semaphore(model)
+        if not semaphore.acquire(timeout=settings.LLM_QUEUE_TIMEOUT_SECONDS):
+            self.rejected[model] += 1
+            raise LLMGatewayBusyError(f"Too many concurrent requests for {model}")
+
+        self.in_flight[model] += 1
+        self.requests[model] += 1
+        try:
+            yield
+        finally:
+            self.in_flight[model] -= 1
+            semaphore.release()
+
+    @asynccontextmanager
+    async def async_slot(self, model: str):
+        """Hold one of the model's request slots (awaits a free one)"""
+        semaphore = self._async_semaphore(model)
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout=settings.LLM_QUEUE_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            self.rejected[model] += 1
+            raise LLMGatewayBusyError(f"Too many concurrent requests for {model}")
+
+        self.in_flight[model] += 1
+        self.requests[model] += 1
+        try:
+            yield
+        finally:
+            self.in_flight[model] -= 1
+            semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-model request counts for the current process"""
+        models = set(self.requests) | set(self.rejected)
+        return {
+            "http2": settings.LLM_HTTP2 and _http2_available(),
+            "models": {
+                model: {
+                    "limit": self.concurrency_limit(model),
+                    "in_flight": self.in_flight[model],
+                    "requests": self.requests[model],
+                    "rejected": self.rejected[model]
+                }
+                for model in sorted(models)
+            }
+        }
+
+
+# Singleton instance
+llm_gateway = LLMGateway()
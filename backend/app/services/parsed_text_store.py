@@ -0,0 +1,75 @@
+from typing import List, Optional
+from pathlib import Path
+import gzip
+import json
+import os
+import uuid
+from app.config import settings
+from app.services.document_parser import document_parser
+from app.services.file_storage import hash_file
+
+
+class ParsedTextStore:
+    """Extracted document text, parsed once and kept on disk (gzip JSON, one entry per file hash)
+
+    Entries are keyed by the SHA-256 of the file itself, so a changed file simply
+    misses the cache and is parsed again; invalidate() drops entries nothing uses.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+
+    def _entry_path(self, content_hash: str) -> Path:
+        return self.directory / f"{content_hash}.json.gz"
+
+    def _load(self, content_hash: str) -> Optional[List[str]]:
+        path = self._entry_path(content_hash)
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                return json.load(f)['pages']
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Discarding unreadable parsed text entry {path}: {str(e)}")
+            return None
+
+    def _save(self, content_hash: str, file_type: str, pages: List[str]):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._entry_path(content_hash)
+        # Write to a temp file and rename so readers never see a partial entry
+        tmp_path = path.with_name(f".{uuid.uuid4().hex}.tmp")
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            json.dump({'file_type': file_type, 'pages': pages}, f)
+        os.replace(tmp_path, path)
+
+    def get_pages(self, file_path: str, file_type: str) -> List[str]:
+        """Return the document's text per page, parsing the file only on a cache miss"""
+        content_hash = hash_file(file_path)
+
+        pages = self._load(content_hash)
+        if pages is not None:
+            return pages
+
+        pages = document_parser.parse_pages(file_path, file_type)
+        try:
+            self._save(content_hash, file_type, pages)
+        except Exception as e:
+            print(f"Error caching parsed text for {file_path}: {str(e)}")
+        return pages
+
+    def get_text(self, file_path: str, file_type: str) -> str:
+        """Return the full document text (pages joined as parse_document does)"""
+        return "".join(self.get_pages(file_path, file_type))
+
+    def invalidate(self, content_hash: Optional[str]):
+        """Drop the entry for a file hash"""
+        if not content_hash:
+            return
+        try:
+            os.remove(self._entry_path(content_hash))
+        except FileNotFoundError:
+            pass
+
+
+# Singleton instance
+parsed_text_store = ParsedTextStore(settings.PARSED_TEXT_DIR)
@@ -0,0 +1,339 @@
+import json
+import re
+import threading
+import time
+from difflib import SequenceMatcher
+from typing import Any, Dict, List, Optional, Tuple
+from app.config import settings
+from app.services.vector_store import vector_store
+
+
+STOPWORDS = {"a", "an", "and", "the", "of", "for", "with", "to", "in", "on", "per"}
+
+# Canonical unit -> spellings seen in price tables and customer answers
+UNIT_ALIASES = {
+    "sqft": ["sqft", "sq ft", "sq. ft", "sq.ft", "psf", "square feet", "square foot", "ft2", "ft²", "sf"],
+    "sqm": ["sqm", "sq m", "sq. m", "sq.m", "m2", "m²", "square meter", "square metre", "square meters", "square metres", "psm"],
+    "m": ["m", "meter", "metre", "meters", "metres", "lm", "linear meter", "linear metre", "rm", "running meter"],
+    "ft": ["ft", "foot", "feet", "linear ft", "linear foot", "linear feet"],
+    "court": ["court", "courts"],
+    "unit": ["unit", "units", "each", "ea", "pc", "pcs", "piece", "pieces", "item", "items", "set", "sets", "lot", "job"],
+}
+UNIT_LOOKUP = {alias: unit for unit, aliases in UNIT_ALIASES.items() for alias in aliases}
+
+# Price conversion factors: price per <from> * factor = price per <to>
+UNIT_CONVERSIONS = {
+    ("sqft", "sqm"): 10.7639,
+    ("sqm", "sqft"): 1 / 10.7639,
+    ("ft", "m"): 3.28084,
+    ("m", "ft"): 1 / 3.28084,
+}
+
+# Units where a missing quantity simply means one
+COUNT_UNITS = {"unit", "court"}
+
+# collected_data keys that carry the quantity, most specific first
+QUANTITY_KEYS = ["quantity_or_area", "total_area", "area", "quantity", "ladder_height", "height"]
+
+NUMBER_RE = re.compile(r"\d+(?:,\d{3})*(?:\.\d+)?")
+
+
+def normalize_text(text: Any) -> str:
+    """Lowercase, '&' -> 'and', punctuation stripped, whitespace collapsed"""
+    text = str(text or "").lower().replace("&", " and ")
+    text = re.sub(r"[^a-z0-9²]+", " ", text)
+    return " ".join(text.split())
+
+
+def item_key(text: Any) -> str:
+    """Order-insensitive lookup key: sorted content words ("Court Markings, Basketball" == "basketball court marking")"""
+    return " ".join(sorted(_tokens(normalize_text(text))))
+
+
+def _tokens(text: str) -> frozenset:
+    """Content words of a normalized string, with a naive plural strip"""
+    words = []
+    for word in text.split():
+        if word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.append(word)
+    return frozenset(words)
+
+
+def normalize_unit(unit: Any) -> Optional[str]:
+    """Map a unit spelling ("per sq ft", "/psf", "m²") to its canonical name, None if unknown"""
+    text = str(unit or "").lower().strip()
+    text = re.sub(r"^(per|/)\s*", "", text).strip(" ./")
+    if not text:
+        return None
+    if text in UNIT_LOOKUP:
+        return UNIT_LOOKUP[text]
+    return UNIT_LOOKUP.get(normalize_text(text))
+
+
+def convert_price(price: float, from_unit: str, to_unit: str) -> Optional[float]:
+    """Price per from_unit expressed per to_unit, None when the units aren't convertible"""
+    if from_unit == to_unit:
+        return price
+    factor = UNIT_CONVERSIONS.get((from_unit, to_unit))
+    return price * factor if factor else None
+
+
+def _actual_value(value: Any) -> Any:
+    """Unwrap context values stored as {'value': ..., 'from_context': ...}"""
+    if isinstance(value, dict) and 'value' in value:
+        return value['value']
+    return value
+
+
+def parse_quantity(collected: Dict[str, Any]) -> Optional[Tuple[float, Optional[str]]]:
+    """Deterministically read (quantity, canonical unit or None) from collected data
+
+    Values with an explicit unit win over bare numbers; anything with more than one
+    number ("5m x 4m") is left to the LLM. None means no usable quantity was found.
+    """
+    bare = None
+    for key in QUANTITY_KEYS:
+        value = _actual_value(collected.get(key))
+        if value is None or isinstance(value, bool):
+            continue
+        if isinstance(value, (int, float)):
+            bare = bare or (float(value), None)
+            continue
+
+        text = str(value).strip().lower()
+        numbers = NUMBER_RE.findall(text)
+        if len(numbers) != 1:
+            continue
+
+        quantity = float(numbers[0].replace(",", ""))
+        unit_text = NUMBER_RE.sub(" ", text).strip()
+        if not unit_text:
+            bare = bare or (quantity, None)
+            continue
+
+        unit = normalize_unit(unit_text)
+        if unit is None:
+            continue
+        return quantity, unit
+
+    return bare
+
+
+class PriceIndex:
+    """In-memory index of the prices extracted into chunk metadata at ingest time
+
+    One entry per (item, material, unit, price, source chunk), taken from every line
+    item extracted for a chunk as well as its headline item. Lookups go through an
+    exact dict on the normalized item name, then a fuzzy match over the entries that
+    share a word with the query; either way they take well under a millisecond.
+    Answers are only given when they are unambiguous: several different prices for
+    the same item (and material) return None so the caller falls back to the LLM.
+
+    The first lookup builds the index. After that it is rebuilt on a background
+    thread whenever this process writes to the vector store, and every
+    PRICE_INDEX_REFRESH_SECONDS to pick up writes from other processes; lookups keep
+    using the current index until the new one is swapped in.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        self.entries: List[Dict[str, Any]] = []
+        self.by_key: Dict[str, List[Dict[str, Any]]] = {}
+        self.by_token: Dict[str, set] = {}
+        self._built_version = None
+        self._built_at = 0.0
+        self.lookups = 0
+        self.exact_hits = 0
+        self.fuzzy_hits = 0
+        self.ambiguous = 0
+
+    @staticmethod
+    def _make_entry(chunk_id: str, metadata: Dict[str, Any], row: Dict[str, Any], row_index: Optional[int]) -> Optional[Dict[str, Any]]:
+        """Index entry for one priced item, None if it carries no usable price"""
+        item = row.get('item_name')
+        try:
+            price = float(row.get('price'))
+        except (TypeError, ValueError):
+            return None
+        if not item or price <= 0:
+            return None
+
+        key = item_key(item)
+        material = row.get('material')
+        conditions = metadata.get('conditions')
+        return {
+            'item': item,
+            'key': key,
+            'tokens': frozenset(key.split()),
+            'material': item_key(material) if material else None,
+            'unit': row.get('unit'),
+            'unit_key': normalize_unit(row.get('unit')),
+            'price': price,
+            'chunk_id': chunk_id,
+            'row': row_index,
+            'document_name': metadata.get('document_name'),
+            'source': metadata.get('source') or metadata.get('document_name', 'Knowledge Base'),
+            'conditions': [c.strip() for c in conditions.split('|') if c.strip()] if isinstance(conditions, str) else []
+        }
+
+    def _entries(self, chunk_id: str, metadata: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Entries for a chunk: every extracted line item, plus the chunk's headline item if no row covers it"""
+        entries = []
+
+        try:
+            line_items = json.loads(metadata['line_items']) if metadata.get('line_items') else []
+        except ValueError:
+            line_items = []
+        for row_index, row in enumerate(line_items):
+            entry = self._make_entry(chunk_id, metadata, {
+                'item_name': row.get('item_name'),
+                'material': row.get('material'),
+                'unit': row.get('unit'),
+                'price': row.get('unit_price')
+            }, row_index)
+            if entry:
+                entries.append(entry)
+
+        headline = self._make_entry(chunk_id, metadata, {
+            'item_name': metadata.get('item_name'),
+            'material': metadata.get('material'),
+            'unit': metadata.get('price_unit'),
+            'price': metadata.get('base_price')
+        }, None)
+        if headline and not any(
+            entry['key'] == headline['key'] and entry['price'] == headline['price'] for entry in entries
+        ):
+            entries.append(headline)
+
+        return entries
+
+    def rebuild(self):
+        """Rebuild the index from the metadata in the vector store"""
+        started = time.perf_counter()
+        version = vector_store.version
+
+        try:
+            metadata_by_id = vector_store.get_all_metadata()
+        except Exception as e:
+            print(f"Error building price index: {str(e)}")
+            return
+
+        entries, by_key, by_token = [], {}, {}
+        for chunk_id, metadata in metadata_by_id.items():
+            for entry in self._entries(chunk_id, metadata):
+                entries.append(entry)
+                by_key.setdefault(entry['key'], []).append(entry)
+                for token in entry['tokens']:
+                    by_token.setdefault(token, set()).add(entry['key'])
+
+        with self._lock:
+            self.entries, self.by_key, self.by_token = entries, by_key, by_token
+            self._built_version = version
+            self._built_at = time.time()
+
+        print(f"Price index built: {len(entries)} prices from {len(metadata_by_id)} chunks in {(time.perf_counter() - started) * 1000:.0f}ms")
+
+    def _ensure_fresh(self):
+        if not self._built_at:
+            # Nothing to answer from yet: build in the caller (concurrent first callers wait for it)
+            with self._rebuild_lock:
+                if not self._built_at:
+                    self.rebuild()
+            return
+
+        stale = (
+            self._built_version != vector_store.version
+            or time.time() - self._built_at > settings.PRICE_INDEX_REFRESH_SECONDS
+        )
+        # One rebuild at a time, off the request path
+        if stale and self._rebuild_lock.acquire(blocking=False):
+            threading.Thread(target=self._rebuild_in_background, name="price-index-rebuild", daemon=True).start()
+
+    def _rebuild_in_background(self):
+        try:
+            self.rebuild()
+        finally:
+            self._rebuild_lock.release()
+
+    def _score(self, query_key: str, query_tokens: frozenset, key: str, tokens: frozenset) -> float:
+        """Similarity of two item keys (0-1)"""
+        score = SequenceMatcher(None, query_key, key).ratio()
+        # Every word of a multi-word entry appears in the query ("parquet sanding and varnishing" vs "sanding varnishing")
+        if len(tokens) >= 2 and tokens <= query_tokens:
+            score = max(score, 0.9)
+        return score
+
+    def lookup(self, item_name: str, material: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Find the price for an item: {'entry', 'match': 'exact'|'fuzzy', 'score'} or None"""
+        if not settings.PRICE_INDEX_ENABLED or not item_name:
+            return None
+        self._ensure_fresh()
+
+        query_key = item_key(item_name)
+        query_tokens = frozenset(query_key.split())
+        self.lookups += 1
+
+        with self._lock:
+            candidates = self.by_key.get(query_key)
+            match, score = 'exact', 1.0
+
+            if not candidates:
+                keys = set()
+                for token in query_tokens:
+                    keys |= self.by_token.get(token, set())
+                scored = sorted(
+                    ((self._score(query_key, query_tokens, key, self.by_key[key][0]['tokens']), key) for key in keys),
+                    reverse=True
+                )
+                if not scored or scored[0][0] < settings.PRICE_INDEX_FUZZY_THRESHOLD:
+                    return None
+                score = scored[0][0]
+                # Keys scoring about as well as the best one are equally plausible
+                candidates = [
+                    entry for key_score, key in scored if key_score >= score - 0.05 for entry in self.by_key[key]
+                ]
+                match = 'fuzzy'
+
+        if material:
+            material_key = item_key(material)
+            with_material = [
+                entry for entry in candidates
+                if (entry['material'] and (entry['material'] in material_key or material_key in entry['material']))
+                or material_key in entry['key']
+            ]
+            if with_material:
+                candidates = with_material
+            elif any(entry['material'] for entry in candidates):
+                # Prices differ by material and none is the requested one
+                self.ambiguous += 1
+                return None
+
+        if len({(entry['price'], entry['unit_key']) for entry in candidates}) > 1:
+            self.ambiguous += 1
+            return None
+
+        if match == 'exact':
+            self.exact_hits += 1
+        else:
+            self.fuzzy_hits += 1
+        return {'entry': candidates[0], 'match': match, 'score': round(score, 3)}
+
+    def stats(self) -> Dict[str, Any]:
+        """Index size and hit counts for the current process"""
+        return {
+            "enabled": settings.PRICE_INDEX_ENABLED,
+            "entries": len(self.entries),
+            "items": len(self.by_key),
+            "lookups": self.lookups,
+            "exact_hits": self.exact_hits,
+            "fuzzy_hits": self.fuzzy_hits,
+            "ambiguous": self.ambiguous
+        }
+
+
+# Singleton instance
+price_index = PriceIndex()
@@ -0,0 +1,85 @@
+import json
+from sqlalchemy.orm import Session
+from app.models import Document, ProductDocument, ProductDocumentType
+from app.services.llm_gateway import llm_gateway
+
+
+def auto_link_products(db: Session, document: Document, document_text: str):
+    """Automatically detect products in document and create links"""
+    client = llm_gateway.client
+    
+    # Use AI to detect products and document type
+    prompt = f"""Analyze this document and identify:
+1. What products are mentioned (e.g., cat ladder, court marking, glass partition, flooring, railing, etc.)
+2. What type of document this is (catalog, technical_drawing, brochure, or spec_sheet)
+
+Document filename: {document.original_filename}
+Document text excerpt (first 2000 chars): {document_text[:2000]}
+
+Return JSON with:
+{{
+    "products": ["product1", "product2"],  // Use snake_case like "cat_ladder", "court_marking"
+    "document_type": "catalog" // or "technical_drawing", "brochure", "spec_sheet"
+}}
+
+Common products to look for:
+- cat_ladder, access_ladder
+- court_marking, line_marking  
+- glass_partition, glass_panel
+- handrail, safety_rail
+- flooring, vinyl_flooring, wood_flooring, cork_flooring, spc_flooring, lvt_flooring
+- staircase, staircase_railing
+- canopy, sunshade
+- bike_rack
+- led_lantern
+- artificial_grass
+- ezz_green (LED products)
+- rolling_tower, aluminium_tower
+
+If it's a general catalog covering multiple products, list all. If focused on one product, return just that one.
+If filename contains clear product names, prioritize those."""
+
+    try:
+        response = client.chat.completions.create(
+            model="gpt-4o",
+            messages=[
+                {"role": "system", "content": "You are a product categorization assistant."},
+                {"role": "user", "content": prompt}
+            ],
+            response_format={"type": "json_object"},
+            temperature=0,
+            max_tokens=200
+        )
+        
+        result = json.loads(response.choices[0].message.content)
+        products = result.get('products', [])
+        doc_type = result.get('document_type', 'catalog')
+        
+        print(f"Auto-detected products for {document.original_filename}: {products}, type: {doc_type}")
+        
+        # Create links for each detected product
+        for product_name in products:
+            # Check if link already exists
+            existing = db.query(ProductDocument).filter(
+                ProductDocument.product_name == product_name,
+                ProductDocument.document_id == document.id,
+                ProductDocument.document_type == doc_type
+            ).first()
+            
+            if not existing:
+                product_doc = ProductDocument(
+                    product_name=product_name,
+                    document_type=ProductDocumentType(doc_type),
+                    document_id=document.id,
+                    display_order=0,
+                    is_active=True
+                )
+                db.add(product_doc)
+                print(f"Auto-linked {product_name} to document {document.id}")
+        
+        db.commit()
+        
+    except Exception as e:
+        print(f"Error in auto product detection: {str(e)}")
+        # Don't raise - this is optional enhancement
+        pass
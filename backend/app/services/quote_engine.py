@@ -1,11 +1,29 @@
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Optional
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+import threading
 from sqlalchemy.orm import Session
+from app.config import settings
 from app.models import Enquiry, KnowledgeChunk, Quote
 from app.services.vector_store import vector_store
 from app.services.ai_pricing_service import ai_pricing_service
+from app.services.step_graph import StepGraph
+from app.services.rules_engine import rules_engine
+from app.services.price_index import price_index, parse_quantity, convert_price, COUNT_UNITS
 from app.schemas import QuoteAdjustment, DraftQuotePreview
 
 
+# Per-enquiry draft locks are striped over this many locks
+ENQUIRY_LOCK_STRIPES = 256
+
+# collected_data fields that can add charges on top of an indexed price - the ones the
+# classification and adjustment prompts read. Others (auto_requirements, site details...) don't.
+SURCHARGE_FIELDS = ('ladder_material', 'safety_cage', 'shop_drawings', 'pe_endorsement', 'additional_features', 'special_features')
+# Answers that decline an option, so it adds nothing
+DECLINED_VALUES = {'', 'no', 'false', 'none', 'nil', 'n/a', 'not required', 'not needed', 'no need'}
+
+
 class QuoteCalculationEngine:
     """Calculate quotes based on KB data and customer requirements"""
     
@@ -21,6 +39,13 @@ class QuoteCalculationEngine:
             'pricing_not_available': 'Pricing Not Available',
             'gst_notice': 'Price includes GST'
         }
+        # Runs the independent steps of the AI quote pipeline side by side
+        self.executor = ThreadPoolExecutor(
+            max_workers=settings.QUOTE_PIPELINE_WORKERS,
+            thread_name_prefix="quote-step"
+        )
+        # Fixed pool of locks shared out by enquiry id, so memory stays bounded however many enquiries there are
+        self._enquiry_locks = [threading.Lock() for _ in range(ENQUIRY_LOCK_STRIPES)]
     
     def _calculate_ai_driven_quote(
         self,
@@ -30,18 +55,13 @@ class QuoteCalculationEngine:
     ) -> DraftQuotePreview:
         """Calculate quote using AI-driven decisions instead of hardcoded logic"""
         
-        # Step 1: Classify the service using AI
         item_name = collected.get('item', self.config['default_item_name'])
-        service_info = ai_pricing_service.classify_service_type(item_name, collected)
-        
-        print(f"AI Service Classification: {service_info}")
         
-        # Step 2: Determine quantity and unit using AI
-        quantity, unit = ai_pricing_service.determine_quantity_and_unit(collected, service_info)
+        # Unambiguous price table matches are answered from the index without any LLM calls
+        indexed_quote = self._quote_from_price_index(db, item_name, collected)
+        if indexed_quote:
+            return indexed_quote
         
-        print(f"AI Quantity/Unit Determination: {quantity} {unit}")
-        
-        # Step 3: Search for relevant pricing chunks with enhanced query building
         # Build multiple search variations to maximize chances of finding relevant data
         search_queries = [item_name]
         
@@ -63,29 +83,51 @@ class QuoteCalculationEngine:
                 comprehensive_query += " " + " ".join(features)
         search_queries.append(comprehensive_query)
         
-        # Search with all queries and combine results
-        all_chunks = []
-        seen_chunk_ids = set()
-        for query in search_queries:
-            chunks = self._find_relevant_chunks(db, query)
-            for chunk in chunks:
-                chunk_id = chunk.get('id') or str(chunk.get('content', ''))[:50]
-                if chunk_id not in seen_chunk_ids:
-                    seen_chunk_ids.add(chunk_id)
-                    all_chunks.append(chunk)
+        def analyze(service_info, relevant_chunks):
+            if not relevant_chunks:
+                return None
+            return ai_pricing_service.analyze_pricing_chunks(relevant_chunks, service_info, collected)
+        
+        def adjust(service_info, relevant_chunks, pricing_analysis):
+            if not pricing_analysis or pricing_analysis['selected_index'] == -1:
+                return None
+            selected_chunk = relevant_chunks[pricing_analysis['selected_index']]
+            return ai_pricing_service.extract_pricing_adjustments(selected_chunk, service_info, collected)
+        
+        # Classification and the KB search are independent; quantity only needs the classification,
+        # and the adjustments only need the chunk the analysis selected
+        graph = StepGraph()
+        graph.add('service_info', lambda: ai_pricing_service.classify_service_type(item_name, collected))
+        # Search with all queries in one round trip; results come back rank-fused
+        graph.add('relevant_chunks', lambda: self._find_relevant_chunks_many(db, search_queries))
+        graph.add(
+            'quantity_unit',
+            lambda service_info: ai_pricing_service.determine_quantity_and_unit(collected, service_info),
+            depends_on=['service_info']
+        )
+        graph.add('pricing_analysis', analyze, depends_on=['service_info', 'relevant_chunks'])
+        graph.add('adjustment_data', adjust, depends_on=['service_info', 'relevant_chunks', 'pricing_analysis'])
+        
+        results = graph.run(self.executor)
+        timings = graph.timings
         
-        relevant_chunks = all_chunks[:self.config['search_limit']]  # Limit total results
+        print(f"Quote pipeline timings (ms): {timings}")
+        print(f"AI Service Classification: {results['service_info']}")
         
+        quantity, unit = results['quantity_unit']
+        
+        print(f"AI Quantity/Unit Determination: {quantity} {unit}")
+        
+        relevant_chunks = results['relevant_chunks']
         if not relevant_chunks:
-            return self._empty_quote(f"No pricing information found for {item_name}")
+            return self._empty_quote(f"No pricing information found for {item_name}", timings)
         
-        # Step 4: Use AI to analyze and select the best pricing option
-        pricing_analysis = ai_pricing_service.analyze_pricing_chunks(relevant_chunks, service_info, collected)
+        pricing_analysis = results['pricing_analysis']
         
         print(f"AI Pricing Analysis: {pricing_analysis}")
         
         if pricing_analysis['selected_index'] == -1:
-            return self._empty_quote(f"No suitable pricing found for {item_name}")
+            return self._empty_quote(f"No suitable pricing found for {item_name}", timings)
         
         # Get the selected chunk
         selected_chunk = relevant_chunks[pricing_analysis['selected_index']]
@@ -106,8 +148,7 @@ class QuoteCalculationEngine:
             base_price = base_price * conversion_factor
             unit = pricing_analysis.get('final_unit', unit)
         
-        # Step 5: Extract adjustments using AI
-        adjustment_data = ai_pricing_service.extract_pricing_adjustments(selected_chunk, service_info, collected)
+        adjustment_data = results['adjustment_data']
         
         # Step 6: Calculate final pricing
         pricing_calculation = ai_pricing_service.calculate_final_pricing(
@@ -153,15 +194,183 @@ class QuoteCalculationEngine:
             conditions=conditions,
             source_references=source_refs,
             missing_info=[],
-            can_submit=True
+            can_submit=True,
+            timings=timings
+        )
+    
+    def _quote_from_price_index(
+        self,
+        db: Session,
+        item_name: str,
+        collected: Dict[str, Any]
+    ) -> Optional[DraftQuotePreview]:
+        """Price an item straight from the price index; None when the LLM path should decide"""
+        import time
+        
+        started = time.perf_counter()
+        match = price_index.lookup(item_name, collected.get('material'))
+        if not match:
+            return None
+        
+        entry = match['entry']
+        price_unit = entry['unit_key']
+        
+        parsed = parse_quantity(collected)
+        if parsed is None:
+            if price_unit not in COUNT_UNITS:
+                return None
+            parsed = (1.0, price_unit)
+        quantity, unit = parsed
+        
+        # A bare number is taken to be in the price table's unit
+        unit = unit or price_unit
+        if not unit:
+            return None
+        
+        base_price = convert_price(entry['price'], price_unit, unit) if price_unit else entry['price']
+        if base_price is None:
+            # e.g. priced per unit but asked per sqft - needs the LLM's judgement
+            return None
+        base_price = round(base_price, 2)
+        
+        # Options that carry surcharges (safety cage, shop drawings, PE endorsement...): read the
+        # adjustments from the matched chunk as the LLM path does. Without any, no LLM call is made.
+        adjustment_data = {}
+        if self._requests_surcharges(collected):
+            selected_chunk = vector_store.get_chunk(entry['chunk_id'])
+            if not selected_chunk:
+                return None
+            service_info = ai_pricing_service.classify_service_type(item_name, collected)
+            adjustment_data = ai_pricing_service.extract_pricing_adjustments(selected_chunk, service_info, collected)
+        
+        gst_rate = self._rules_gst_rate(db)
+        if gst_rate is None:
+            gst_rate = adjustment_data.get('gst_rate', 0.09)
+        pricing_calculation = ai_pricing_service.calculate_final_pricing(
+            base_price, quantity, unit, adjustment_data.get('adjustments', []), gst_rate
+        )
+        
+        adjustments = [
+            QuoteAdjustment(
+                description=adj['description'],
+                amount=float(adj['amount']) if isinstance(adj['amount'], (int, float)) else 0,
+                type=adj['type']
+            )
+            for adj in pricing_calculation['adjustments']
+        ]
+        if pricing_calculation['gst_amount'] > 0:
+            adjustments.append(QuoteAdjustment(
+                description=f"GST ({pricing_calculation['gst_rate']*100:.0f}%)",
+                amount=pricing_calculation['gst_amount'],
+                type="fixed"
+            ))
+        
+        timings = {'price_index': round((time.perf_counter() - started) * 1000, 2)}
+        print(f"Price index {match['match']} match ({match['score']}): '{item_name}' -> '{entry['item']}' {entry['price']} {entry['unit']} [{entry['chunk_id']}]")
+        
+        return DraftQuotePreview(
+            item_name=item_name,
+            base_price=base_price,
+            unit=unit,
+            quantity=quantity,
+            adjustments=adjustments,
+            total_price=pricing_calculation['total_price'],
+            conditions=entry['conditions'] + adjustment_data.get('conditions', []) + [self.config['gst_notice']],
+            source_references=[entry['source']],
+            missing_info=[],
+            can_submit=True,
+            timings=timings
         )
     
+    @staticmethod
+    def _requests_surcharges(collected: Dict[str, Any]) -> bool:
+        """True if the customer chose any option that can add charges to the base price"""
+        for key in SURCHARGE_FIELDS:
+            value = collected.get(key)
+            if isinstance(value, dict):
+                value = value.get('value')
+            if value is None or value is False or value == [] or value == 0:
+                continue
+            if isinstance(value, str) and value.strip().lower() in DECLINED_VALUES:
+                continue
+            return True
+        return False
+    
     def calculate_draft_quote(
         self,
         db: Session,
         enquiry: Enquiry
     ) -> DraftQuotePreview:
-        """Calculate draft quote from enquiry using AI-driven decisions"""
+        """Calculate draft quote from enquiry using AI-driven decisions
+        
+        The result is stored on the enquiry with a fingerprint of its inputs and served
+        from there until collected_data, the tree or the knowledge base changes.
+        """
+        fingerprint = self.draft_fingerprint(db, enquiry)
+        
+        with self._enquiry_lock(enquiry.id):
+            # Re-read in case another request stored the draft while we waited for the lock
+            db.refresh(enquiry, ['draft_quote', 'draft_quote_fingerprint'])
+            if enquiry.draft_quote and enquiry.draft_quote_fingerprint == fingerprint:
+                print(f"Serving stored draft quote for enquiry {enquiry.id}")
+                return DraftQuotePreview(**enquiry.draft_quote)
+            
+            draft = self._compute_draft_quote(db, enquiry)
+            
+            # Only keep complete quotes; incomplete ones are cheap and may hide a transient failure
+            if draft.can_submit:
+                enquiry.draft_quote = draft.dict()
+                enquiry.draft_quote_fingerprint = fingerprint
+                db.commit()
+            
+            return draft
+    
+    def _enquiry_lock(self, enquiry_id: int) -> threading.Lock:
+        """Lock for an enquiry so concurrent requests for it compute the draft once
+        
+        Enquiries whose ids fall on the same stripe share a lock, which only means
+        their drafts are computed one after the other.
+        """
+        return self._enquiry_locks[hash(enquiry_id) % ENQUIRY_LOCK_STRIPES]
+    
+    def _kb_version(self, db: Session) -> List[Any]:
+        """Cheap marker that changes whenever documents, vectors or business rules change"""
+        from sqlalchemy import func
+        from app.models import Document
+        
+        documents = db.query(
+            func.count(Document.id), func.max(Document.id), func.max(Document.processed_at)
+        ).one()
+        
+        return [list(documents), rules_engine.fingerprint(db), vector_store.collection.count()]
+    
+    def draft_fingerprint(self, db: Session, enquiry: Enquiry) -> str:
+        """sha256 over collected_data, the tree version and the knowledge base version"""
+        from app.models import DecisionTree
+        
+        tree_version = None
+        if enquiry.service_tree_id:
+            tree_version = db.query(DecisionTree.updated_at).filter(
+                DecisionTree.id == enquiry.service_tree_id
+            ).scalar()
+        
+        # Underscore keys are conversation bookkeeping (tree cursor, flags), not quote inputs
+        collected = {key: value for key, value in (enquiry.collected_data or {}).items() if not key.startswith('_')}
+        payload = {
+            'collected_data': collected,
+            'service_tree_id': enquiry.service_tree_id,
+            'tree_version': tree_version,
+            'kb_version': self._kb_version(db)
+        }
+        encoded = json.dumps(payload, sort_keys=True, default=str)
+        return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+    
+    def _compute_draft_quote(
+        self,
+        db: Session,
+        enquiry: Enquiry
+    ) -> DraftQuotePreview:
+        """Run the pricing pipeline for an enquiry (no memoization)"""
         
         # Get collected data
         collected = enquiry.collected_data or {}
@@ -216,7 +425,7 @@ class QuoteCalculationEngine:
         
         # Keep all original tree data for AI to use
         for key, value in collected.items():
-            if key not in mapped_data and value:
+            if key not in mapped_data and value and not key.startswith('_'):
                 mapped_data[key] = value
         
         # Use AI-driven calculation - AI will search knowledge base and calculate pricing
@@ -322,17 +531,9 @@ class QuoteCalculationEngine:
         """Get GST rate from business rules or extract from original quote (no hardcoded values)"""
         
         # Try to get GST rate from business rules
-        from app.models import BusinessRule
-        
-        rules = db.query(BusinessRule).filter(
-            BusinessRule.is_active == True,
-            BusinessRule.region == 'SGP'
-        ).first()
-        
-        if rules and rules.rule_config:
-            gst_rate = rules.rule_config.get('gst_rate')
-            if gst_rate:
-                return float(gst_rate)
+        gst_rate = self._rules_gst_rate(db)
+        if gst_rate is not None:
+            return gst_rate
         
         # Fallback: Extract from original quote's GST adjustment
         for adj in base_quote.adjustments:
@@ -347,7 +548,11 @@ class QuoteCalculationEngine:
         # This should ideally never be reached as GST should come from business rules
         return 0.09
     
-    def _empty_quote(self, reason: str) -> DraftQuotePreview:
+    def _rules_gst_rate(self, db: Session) -> Optional[float]:
+        """GST rate configured in the business rules, if any (served from the rules cache)"""
+        return rules_engine.gst_rate(db, 'SGP')
+    
+    def _empty_quote(self, reason: str, timings: Optional[Dict[str, float]] = None) -> DraftQuotePreview:
         """Return an empty quote with error message"""
         return DraftQuotePreview(
             item_name=self.config['pricing_not_available'],
@@ -359,7 +564,8 @@ class QuoteCalculationEngine:
             conditions=[reason],
             source_references=[],
             missing_info=["Pricing information"],
-            can_submit=False
+            can_submit=False,
+            timings=timings
         )
     
     def _find_relevant_chunks(
@@ -379,11 +585,15 @@ class QuoteCalculationEngine:
         return vector_results
     
     
-
-    
-    
-    
-    
+    def _find_relevant_chunks_many(
+        self,
+        db: Session,
+        queries: List[str]
+    ) -> List[Dict]:
+        """Find relevant chunks for several query variations with a single vector search"""
+        
+        # One embedding request + one ChromaDB query, merged by reciprocal rank fusion
+        return vector_store.search_many(queries, limit=self.config['search_limit'])
     
     def create_quote_from_draft(
         self,
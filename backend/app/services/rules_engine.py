@@ -1,13 +1,147 @@
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Callable, Tuple
+import threading
+import time
 from sqlalchemy.orm import Session
+from app.config import settings
 from app.models import BusinessRule
 
 
+class CompiledRule:
+    """An active business rule with its handler bound to its rule_config"""
+    
+    __slots__ = ('id', 'rule_name', 'service_type', 'region', 'priority', 'rule_config', 'updated_at', 'apply')
+    
+    def __init__(self, rule: BusinessRule, apply: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]]):
+        self.id = rule.id
+        self.rule_name = rule.rule_name
+        self.service_type = rule.service_type
+        self.region = rule.region
+        self.priority = rule.priority
+        self.rule_config = rule.rule_config or {}
+        self.updated_at = rule.updated_at
+        self.apply = apply
+
+
 class RulesEngine:
-    """Business rules validation and application engine"""
+    """Business rules validation and application engine
+    
+    Active rules are loaded once into memory, compiled into handler closures and
+    indexed by service type and region, so evaluating them needs no queries. The
+    business_rules router calls invalidate() after every change; other processes
+    pick changes up within RULE_CACHE_REFRESH_SECONDS.
+    """
     
     def __init__(self):
-        pass
+        self._lock = threading.Lock()
+        self.version = 0  # Bumped by invalidate()
+        self._loaded_version = None
+        self._loaded_at = 0.0
+        self._rules: List[CompiledRule] = []
+        self._by_service: Dict[Optional[str], List[CompiledRule]] = {}
+        self._by_region: Dict[Optional[str], List[CompiledRule]] = {}
+        self._for_service: Dict[Optional[str], Tuple[CompiledRule, ...]] = {}
+        self.loads = 0
+        
+        # Handlers by rule_config["rule_type"]: each takes the rule_config and returns apply(collected_data)
+        # Add more rule types here as needed
+        self._compilers: Dict[str, Callable] = {
+            "ladder_safety_singapore": self._compile_ladder_safety_rules,
+        }
+    
+    def invalidate(self):
+        """Mark the cached rules stale (call after creating, updating, toggling or deleting a rule)"""
+        with self._lock:
+            self.version += 1
+    
+    def _load(self, db: Session):
+        """Query the active rules once and rebuild the indexes"""
+        rules = db.query(BusinessRule).filter(
+            BusinessRule.is_active == True
+        ).order_by(BusinessRule.priority.asc(), BusinessRule.id.asc()).all()
+        
+        compiled = []
+        for rule in rules:
+            rule_type = (rule.rule_config or {}).get("rule_type")
+            compiler = self._compilers.get(rule_type)
+            compiled.append(CompiledRule(rule, compiler(rule.rule_config) if compiler else None))
+        
+        by_service: Dict[Optional[str], List[CompiledRule]] = {}
+        by_region: Dict[Optional[str], List[CompiledRule]] = {}
+        for rule in compiled:
+            by_service.setdefault(rule.service_type, []).append(rule)
+            by_region.setdefault(rule.region, []).append(rule)
+        
+        return compiled, by_service, by_region
+    
+    def _ensure_loaded(self, db: Session):
+        version = self.version
+        stale = (
+            self._loaded_version != version
+            or time.time() - self._loaded_at > settings.RULE_CACHE_REFRESH_SECONDS
+        )
+        if not stale:
+            return
+        
+        # Until the first load everyone waits; afterwards one caller reloads while the rest use the current rules
+        first_load = self._loaded_version is None
+        if not self._lock.acquire(blocking=first_load):
+            return
+        try:
+            if self._loaded_version == self.version and time.time() - self._loaded_at <= settings.RULE_CACHE_REFRESH_SECONDS:
+                return
+            version = self.version
+            try:
+                compiled, by_service, by_region = self._load(db)
+            except Exception as e:
+                print(f"Error loading business rules: {str(e)}")
+                if first_load:
+                    raise
+                return
+            
+            self._rules, self._by_service, self._by_region = compiled, by_service, by_region
+            self._for_service = {}
+            self._loaded_version = version
+            self._loaded_at = time.time()
+            self.loads += 1
+        finally:
+            self._lock.release()
+    
+    def rules_for_service(self, db: Session, service_type: Optional[str]) -> Tuple[CompiledRule, ...]:
+        """Active rules for a service type plus the general (service_type NULL) ones, by priority"""
+        self._ensure_loaded(db)
+        
+        rules = self._for_service.get(service_type)
+        if rules is None:
+            merged = self._by_service.get(service_type, []) + (self._by_service.get(None, []) if service_type is not None else [])
+            rules = tuple(sorted(merged, key=lambda rule: (rule.priority, rule.id)))
+            self._for_service[service_type] = rules
+        return rules
+    
+    def rules_for_region(self, db: Session, region: Optional[str]) -> List[CompiledRule]:
+        """Active rules for a region, by priority"""
+        self._ensure_loaded(db)
+        return self._by_region.get(region, [])
+    
+    def gst_rate(self, db: Session, region: str = 'SGP') -> Optional[float]:
+        """GST rate from the first active rule of the region that configures one"""
+        for rule in self.rules_for_region(db, region):
+            gst_rate = rule.rule_config.get('gst_rate')
+            if gst_rate:
+                return float(gst_rate)
+        return None
+    
+    def fingerprint(self, db: Session) -> List[Any]:
+        """Marker that changes whenever an active rule is added, removed or edited"""
+        self._ensure_loaded(db)
+        rules = self._rules
+        return [len(rules), max((str(rule.updated_at) for rule in rules), default=None)]
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active_rules": len(self._rules),
+            "version": self.version,
+            "loads": self.loads
+        }
     
     def validate_and_apply_rules(
         self,
@@ -27,12 +161,8 @@ class RulesEngine:
         }
         """
         
-        # Get all active rules for this service type (or general rules)
-        rules = db.query(BusinessRule).filter(
-            BusinessRule.is_active == True
-        ).filter(
-            (BusinessRule.service_type == service_type) | (BusinessRule.service_type == None)
-        ).order_by(BusinessRule.priority.asc()).all()
+        # All active rules for this service type (or general rules), from the in-memory cache
+        rules = self.rules_for_service(db, service_type)
         
         result = {
             "requirements": [],
@@ -43,7 +173,7 @@ class RulesEngine:
         
         # Apply each rule
         for rule in rules:
-            rule_result = self._apply_single_rule(rule, collected_data)
+            rule_result = rule.apply(collected_data) if rule.apply else None
             
             # Merge results
             if rule_result:
@@ -54,37 +184,8 @@ class RulesEngine:
         
         return result
     
-    def _apply_single_rule(
-        self,
-        rule: BusinessRule,
-        collected_data: Dict[str, Any]
-    ) -> Optional[Dict[str, Any]]:
-        """Apply a single business rule to collected data"""
-        
-        rule_config = rule.rule_config
-        rule_type = rule_config.get("rule_type")
-        
-        # Route to specific rule handler based on type
-        if rule_type == "ladder_safety_singapore":
-            return self._apply_ladder_safety_rules(rule_config, collected_data)
-        
-        # Add more rule types here as needed
-        
-        return None
-    
-    def _apply_ladder_safety_rules(
-        self,
-        rule_config: Dict[str, Any],
-        collected_data: Dict[str, Any]
-    ) -> Dict[str, Any]:
-        """Apply ladder safety regulations based on configurable rule_config"""
-        
-        result = {
-            "requirements": [],
-            "conditions": [],
-            "adjustments": [],
-            "warnings": []
-        }
+    def _compile_ladder_safety_rules(self, rule_config: Dict[str, Any]) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+        """Ladder safety regulations from a configurable rule_config, read once into a closure"""
         
         # Get the regulations from rule config
         regulations = rule_config.get("fixed_ladder_rules_sg", {})
@@ -95,76 +196,85 @@ class RulesEngine:
         regulation_name = source_refs.get("wsh_reg", "Safety Regulations")
         standards_label = f"{region} standards" if region else "safety standards"
         
-        # Extract height from collected data
-        height = self._extract_height(collected_data)
-        
-        if height is None:
-            return result
-        
         # Rule 1: Safety cage requirement (fully configurable from rule_config)
         min_cage_height = regulations.get("min_cage_height_m")
-        if min_cage_height and height > min_cage_height:
-            # Get configurable search terms and labels
-            cage_config = regulations.get("cage_requirement", {})
-            item_name = cage_config.get("item_name", "safety cage")
-            search_terms = cage_config.get("search_terms", ["safety cage", "ladder cage", "cage for ladder"])
-            
-            result["requirements"].append({
-                "item": item_name,
-                "reason": f"{regulation_name} require {item_name} for ladders exceeding {min_cage_height}m",
-                "search_terms": search_terms,
-                "mandatory": True
-            })
-            result["conditions"].append(
-                f"{item_name.title()} required (ladder height {height}m exceeds {min_cage_height}m minimum per {regulation_name})"
-            )
+        cage_config = regulations.get("cage_requirement", {})
+        cage_item = cage_config.get("item_name", "safety cage")
+        cage_search_terms = cage_config.get("search_terms", ["safety cage", "ladder cage", "cage for ladder"])
         
         # Rule 2: Rest platform requirement (fully configurable)
         platform_rules = regulations.get("platform_rules", {})
         max_single_flight = platform_rules.get("insert_rest_platform_if_height_exceeds_m")
-        
-        if max_single_flight and height > max_single_flight:
-            platform_config = regulations.get("platform_requirement", {})
-            item_name = platform_config.get("item_name", "rest platform")
-            search_terms = platform_config.get("search_terms", ["rest platform", "ladder platform", "intermediate platform"])
-            
-            result["requirements"].append({
-                "item": item_name,
-                "reason": f"{item_name.title()} required for ladder heights exceeding {max_single_flight}m",
-                "search_terms": search_terms,
-                "mandatory": True
-            })
-            result["conditions"].append(
-                f"{item_name.title()} required (height {height}m exceeds {max_single_flight}m per regulations)"
-            )
+        platform_config = regulations.get("platform_requirement", {})
+        platform_item = platform_config.get("item_name", "rest platform")
+        platform_search_terms = platform_config.get("search_terms", ["rest platform", "ladder platform", "intermediate platform"])
         
         # Rule 3: Material validation (configurable materials list)
-        material = collected_data.get("material", "").lower()
         design_checks = regulations.get("design_checks", {})
         valid_materials = design_checks.get("verify_material_grade", [])
-        
-        if material and valid_materials:
-            # Check if material matches any valid option (case insensitive)
-            material_valid = any(
-                mat.lower() in material or material in mat.lower()
-                for mat in valid_materials
-            )
-            
-            if not material_valid:
-                warning_template = design_checks.get("material_warning_template", 
-                    "Material '{material}' should be verified against approved grades: {grades}")
-                result["warnings"].append(
-                    warning_template.format(material=material, grades=', '.join(valid_materials))
-                )
+        valid_materials_lower = [mat.lower() for mat in valid_materials]
+        warning_template = design_checks.get("material_warning_template", 
+            "Material '{material}' should be verified against approved grades: {grades}")
         
         # Rule 4: Exit handhold requirement (configurable)
+        handhold_condition = None
         if regulations.get("exit_handhold_required", False):
             handhold_config = regulations.get("exit_handhold_config", {})
-            condition_text = handhold_config.get("condition_text", 
+            handhold_condition = handhold_config.get("condition_text", 
                 f"Exit handhold required at top of ladder per {standards_label}")
-            result["conditions"].append(condition_text)
         
-        return result
+        def apply(collected_data: Dict[str, Any]) -> Dict[str, Any]:
+            result = {
+                "requirements": [],
+                "conditions": [],
+                "adjustments": [],
+                "warnings": []
+            }
+            
+            # Extract height from collected data
+            height = self._extract_height(collected_data)
+            
+            if height is None:
+                return result
+            
+            if min_cage_height and height > min_cage_height:
+                result["requirements"].append({
+                    "item": cage_item,
+                    "reason": f"{regulation_name} require {cage_item} for ladders exceeding {min_cage_height}m",
+                    "search_terms": list(cage_search_terms),
+                    "mandatory": True
+                })
+                result["conditions"].append(
+                    f"{cage_item.title()} required (ladder height {height}m exceeds {min_cage_height}m minimum per {regulation_name})"
+                )
+            
+            if max_single_flight and height > max_single_flight:
+                result["requirements"].append({
+                    "item": platform_item,
+                    "reason": f"{platform_item.title()} required for ladder heights exceeding {max_single_flight}m",
+                    "search_terms": list(platform_search_terms),
+                    "mandatory": True
+                })
+                result["conditions"].append(
+                    f"{platform_item.title()} required (height {height}m exceeds {max_single_flight}m per regulations)"
+                )
+            
+            material = collected_data.get("material", "").lower()
+            if material and valid_materials:
+                # Check if material matches any valid option (case insensitive)
+                material_valid = any(mat in material or material in mat for mat in valid_materials_lower)
+                
+                if not material_valid:
+                    result["warnings"].append(
+                        warning_template.format(material=material, grades=', '.join(valid_materials))
+                    )
+            
+            if handhold_condition is not None:
+                result["conditions"].append(handhold_condition)
+            
+            return result
+        
+        return apply
     
     def _extract_actual_value(self, data: Any) -> Any:
         """Extract actual value from context metadata or return as-is"""
@@ -0,0 +1,53 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+class StepGraph:
+    """A small dependency graph of pipeline steps
+
+    Each step is a function that takes the results of its dependencies (as keyword
+    arguments named after them) and returns its own result. Steps run on the given
+    executor as soon as everything they depend on has finished, so independent steps
+    overlap. Wall-clock time per step (ms) is recorded in `timings`.
+    """
+
+    def __init__(self):
+        self.steps: Dict[str, Tuple[Callable[..., Any], List[str]]] = {}
+        self.timings: Dict[str, float] = {}
+
+    def add(self, name: str, fn: Callable[..., Any], depends_on: Optional[List[str]] = None) -> "StepGraph":
+        for dep in depends_on or []:
+            if dep not in self.steps:
+                raise ValueError(f"Step '{name}' depends on unknown step '{dep}'")
+        self.steps[name] = (fn, list(depends_on or []))
+        return self
+
+    def _timed(self, name: str, fn: Callable[..., Any], kwargs: Dict[str, Any]) -> Any:
+        started = time.perf_counter()
+        try:
+            return fn(**kwargs)
+        finally:
+            self.timings[name] = round((time.perf_counter() - started) * 1000, 1)
+
+    def run(self, executor: ThreadPoolExecutor) -> Dict[str, Any]:
+        """Run every step and return {step name: result}; the first step error is re-raised"""
+        started = time.perf_counter()
+        results: Dict[str, Any] = {}
+        pending = dict(self.steps)
+        running = {}
+
+        while pending or running:
+            # Submit every step whose dependencies are all done
+            for name, (fn, deps) in list(pending.items()):
+                if all(dep in results for dep in deps):
+                    kwargs = {dep: results[dep] for dep in deps}
+                    running[executor.submit(self._timed, name, fn, kwargs)] = name
+                    del pending[name]
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[running.pop(future)] = future.result()
+
+        self.timings['total'] = round((time.perf_counter() - started) * 1000, 1)
+        return results
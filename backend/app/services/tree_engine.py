@@ -1,38 +1,92 @@
 from typing import Dict, Any, Optional, List
+import threading
 from sqlalchemy.orm import Session
 from app.models import DecisionTree, Enquiry
 from app.schemas import AIResponse, AIQuestion
 
 
+# collected_data key holding the enquiry's position in its tree (see DecisionTreeEngine._cursor)
+CURSOR_KEY = '_tree_cursor'
+
+class CompiledQuestion:
+    """One question of a compiled tree"""
+    
+    __slots__ = ('id', 'data', 'next', 'default_next', '_ai_question')
+    
+    def __init__(self, data: Dict[str, Any]):
+        self.id = data.get('id')
+        self.data = data
+        next_mapping = data.get('next')
+        # Only a non-empty dict branches; anything else ends the path after this question
+        self.next = next_mapping if next_mapping and isinstance(next_mapping, dict) else None
+        self.default_next = self.next.get('default') if self.next else None
+        self._ai_question = None
+    
+    def ai_question(self) -> AIQuestion:
+        """The question as served to the customer (built once, then shared)"""
+        if self._ai_question is None:
+            self._ai_question = AIQuestion(
+                key=self.data.get('id'),
+                question=self.data.get('question'),
+                type=self.data.get('type'),
+                choices=self.data.get('choices'),
+                required=self.data.get('required', True)
+            )
+        return self._ai_question
+
+
+class CompiledTree:
+    """A decision tree's question graph, precomputed once per tree version
+    
+    Treat as immutable: it is shared by every request using this version of the tree.
+    """
+    
+    __slots__ = ('tree_id', 'version', 'nodes', 'start_id', 'is_linear', 'linear_order')
+    
+    def __init__(self, tree: DecisionTree):
+        questions = (tree.tree_config or {}).get('questions', [])
+        
+        self.tree_id = tree.id
+        self.version = tree.updated_at
+        self.nodes = {}
+        for q in questions:
+            node = CompiledQuestion(q)
+            self.nodes[node.id] = node
+        
+        # Start with start_question or first question
+        self.start_id = (tree.tree_config or {}).get('start_question')
+        if not self.start_id and questions:
+            self.start_id = questions[0].get('id')
+        
+        # Linear trees (all next fields are null) ask every question in order, start first
+        self.is_linear = all(q.get('next') is None for q in questions)
+        self.linear_order = tuple(dict.fromkeys(
+            [self.start_id] + [q.get('id') for q in questions if q.get('id') and q.get('id') != self.start_id]
+        )) if self.start_id else ()
+
+
 class DecisionTreeEngine:
     """Execute decision trees - follow the flow, no AI freestyle"""
     
     def __init__(self):
-        pass
+        # Compiled trees by tree id (each remembers the updated_at it was built from)
+        self._compiled: Dict[int, CompiledTree] = {}
+        self._compiled_lock = threading.Lock()
     
-    def match_service(self, db: Session, customer_message: str) -> Optional[DecisionTree]:
-        """Use AI to classify which service the customer wants"""
-        from openai import OpenAI
+    def _match_service_request(self, trees: List[DecisionTree], customer_message: str) -> Dict[str, Any]:
+        """Completion parameters for classifying a message against the active trees"""
         from app.config import settings
         import json
         
-        # Get all active trees
-        trees = db.query(DecisionTree).filter(DecisionTree.is_active == True).all()
-        
-        if not trees:
-            return None
-        
         # Build service options
         service_options = {tree.service_name: tree.display_name for tree in trees}
         
-        try:
-            client = OpenAI(api_key=settings.OPENAI_API_KEY)
-            response = client.chat.completions.create(
-                model=settings.OPENAI_MODEL,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": f"""You are a service classifier. Match the customer's request to ONE of these services:
+        return dict(
+            model=settings.OPENAI_MODEL,
+            messages=[
+                {
+                    "role": "system",
+                    "content": f"""You are a service classifier. Match the customer's request to ONE of these services:
 
 {json.dumps(service_options, indent=2)}
 
@@ -45,30 +99,99 @@ Matching Rules:
 - "hello", "hi", general questions → {{"service": null}}
 
 Be flexible with spelling, punctuation, and partial matches. Match based on INTENT, not exact words."""
-                    },
-                    {
-                        "role": "user",
-                        "content": customer_message
-                    }
-                ],
-                temperature=0,
-                response_format={"type": "json_object"}
-            )
-            
-            result = json.loads(response.choices[0].message.content)
-            service_name = result.get('service')
+                },
+                {
+                    "role": "user",
+                    "content": customer_message
+                }
+            ],
+            temperature=0,
+            response_format={"type": "json_object"}
+        )
+    
+    def _matched_tree(self, db: Session, response) -> Optional[DecisionTree]:
+        """Look up the tree named in a match_service completion"""
+        import json
+        
+        result = json.loads(response.choices[0].message.content)
+        service_name = result.get('service')
+        
+        if service_name:
+            return db.query(DecisionTree).filter(
+                DecisionTree.service_name == service_name,
+                DecisionTree.is_active == True
+            ).first()
+        return None
+    
+    def match_service(self, db: Session, customer_message: str) -> Optional[DecisionTree]:
+        """Use AI to classify which service the customer wants"""
+        from app.services.llm_cache import llm_cache
+        from app.services.llm_gateway import llm_gateway
+        
+        # Get all active trees
+        trees = db.query(DecisionTree).filter(DecisionTree.is_active == True).all()
+        
+        if not trees:
+            return None
+        
+        try:
+            response = llm_cache.create(llm_gateway.client, **self._match_service_request(trees, customer_message))
+            return self._matched_tree(db, response)
             
-            if service_name:
-                return db.query(DecisionTree).filter(
-                    DecisionTree.service_name == service_name,
-                    DecisionTree.is_active == True
-                ).first()
+        except Exception as e:
+            print(f"Error matching service: {str(e)}")
+        
+        return None
+    
+    async def match_service_async(self, db: Session, customer_message: str) -> Optional[DecisionTree]:
+        """match_service using the async client (database reads run in the threadpool)"""
+        from starlette.concurrency import run_in_threadpool
+        from app.services.llm_cache import llm_cache
+        from app.services.llm_gateway import llm_gateway
+        
+        trees = await run_in_threadpool(
+            lambda: db.query(DecisionTree).filter(DecisionTree.is_active == True).all()
+        )
+        
+        if not trees:
+            return None
+        
+        try:
+            response = await llm_cache.acreate(
+                llm_gateway.async_client,
+                **self._match_service_request(trees, customer_message)
+            )
+            return await run_in_threadpool(self._matched_tree, db, response)
             
         except Exception as e:
             print(f"Error matching service: {str(e)}")
         
         return None
     
+    def compile(self, tree: DecisionTree) -> CompiledTree:
+        """Compiled form of a tree, cached per (tree.id, updated_at)"""
+        if tree.id is None:
+            return CompiledTree(tree)
+        
+        version = tree.updated_at
+        compiled = self._compiled.get(tree.id)
+        if compiled is None or compiled.version != version:
+            compiled = CompiledTree(tree)
+            
+            # Trees saved before validation existed may still be broken; say so once per version
+            from app.services.tree_validator import tree_validator
+            report = tree_validator.validate(tree.tree_config)
+            if not report['valid']:
+                print(f"Decision tree {tree.id} ({tree.service_name}) is invalid: {'; '.join(report['errors'])}")
+            with self._compiled_lock:
+                self._compiled[tree.id] = compiled
+        return compiled
+    
+    def invalidate(self, tree_id: int):
+        """Drop the compiled form of a tree (call after it is updated or deleted)"""
+        with self._compiled_lock:
+            self._compiled.pop(tree_id, None)
+    
     def get_next_question(
         self,
         tree: DecisionTree,
@@ -76,24 +199,15 @@ Be flexible with spelling, punctuation, and partial matches. Match based on INTE
     ) -> Optional[AIQuestion]:
         """Get the next unanswered question from the tree (supports branching)"""
         
-        questions = tree.tree_config.get('questions', [])
-        
-        # Build question lookup dict
-        question_dict = {q.get('id'): q for q in questions}
+        compiled = self.compile(tree)
         
         # Determine which question to ask next
-        next_question_id = self._find_next_question_id(questions, question_dict, collected_data, tree.tree_config)
+        next_question_id = self._find_next_question_id(compiled, collected_data)
         
         if next_question_id:
-            q = question_dict.get(next_question_id)
-            if q:
-                return AIQuestion(
-                    key=q.get('id'),
-                    question=q.get('question'),
-                    type=q.get('type'),
-                    choices=q.get('choices'),
-                    required=q.get('required', True)
-                )
+            node = compiled.nodes.get(next_question_id)
+            if node:
+                return node.ai_question()
         
         return None
     
@@ -124,105 +238,102 @@ Be flexible with spelling, punctuation, and partial matches. Match based on INTE
     
     def _find_next_question_id(
         self,
-        questions: List[Dict],
-        question_dict: Dict[str, Dict],
-        collected_data: Dict[str, Any],
-        tree_config: Dict[str, Any]
+        compiled: CompiledTree,
+        collected_data: Dict[str, Any]
     ) -> Optional[str]:
         """Find the next question ID based on branching logic or linear flow"""
         
         # If no data collected yet, start with start_question or first question
         if not collected_data:
-            start_id = tree_config.get('start_question')
-            if start_id:
-                return start_id
-            return questions[0].get('id') if questions else None
-        
-        # Build the path of questions that should be asked based on branching logic
-        question_path = self._build_question_path(questions, question_dict, collected_data, tree_config)
+            return compiled.start_id
         
-        # Find first unanswered question in the path
-        for q_id in question_path:
-            if not self._is_question_answered(collected_data, q_id):
-                return q_id
-        
-        return None
+        return self._first_unanswered(compiled, collected_data)
     
-    def _build_question_path(
-        self,
-        questions: List[Dict],
-        question_dict: Dict[str, Dict],
-        collected_data: Dict[str, Any],
-        tree_config: Dict[str, Any]
-    ) -> List[str]:
-        """Build the path of questions to ask based on answers given"""
-        
-        path = []
-        
-        # Start with start_question or first question
-        start_id = tree_config.get('start_question')
-        if not start_id and questions:
-            start_id = questions[0].get('id')
-        
-        if not start_id:
-            return path
+    def _next_on_path(self, compiled: CompiledTree, q_id: str, position: int, collected_data: Dict[str, Any]) -> Optional[str]:
+        """The question after an answered one (position = its index on the path), None where the path ends"""
+        # Linear trees (all next fields are null) ask every question in sequence
+        if compiled.is_linear:
+            return compiled.linear_order[position + 1] if position + 1 < len(compiled.linear_order) else None
+        
+        node = compiled.nodes.get(q_id)
+        if not node:
+            return None
         
-        current_id = start_id
-        path.append(current_id)
+        answer = self._get_actual_value(collected_data.get(q_id))
+        if answer is None or node.next is None:
+            # No answer to branch on, or no branching: the path ends here
+            return None
         
-        # Check if this is a linear tree (all next fields are null)
-        is_linear = all(q.get('next') is None for q in questions)
+        # Convert answer to string for lookup, with a 'default' path for text/number inputs
+        key = str(answer)
+        if isinstance(answer, bool) and key not in node.next:
+            # Booleans are documented (and validated) as "true"/"false" branches
+            key = key.lower()
+        next_id = node.next.get(key) or node.default_next
+        return next_id if next_id and next_id in compiled.nodes else None
+    
+    def _cursor(self, compiled: CompiledTree, collected_data: Dict[str, Any]) -> Dict[str, Any]:
+        """The enquiry's position in the tree, stored in collected_data under CURSOR_KEY
+        
+        {"tree_id", "version", "path": [answered question ids, in order], "current": next question id}.
+        A cursor from another tree or tree version is discarded and the path replayed from the start.
+        """
+        cursor = collected_data.get(CURSOR_KEY)
+        if (
+            isinstance(cursor, dict)
+            and cursor.get('tree_id') == compiled.tree_id
+            and cursor.get('version') == str(compiled.version)
+        ):
+            return cursor
+        
+        cursor = {
+            'tree_id': compiled.tree_id,
+            'version': str(compiled.version),
+            'path': [],
+            'current': compiled.start_id
+        }
+        collected_data[CURSOR_KEY] = cursor
+        return cursor
+    
+    def _first_unanswered(self, compiled: CompiledTree, collected_data: Dict[str, Any]) -> Optional[str]:
+        """First unanswered question on the path the answers select, None when the path is complete
         
-        if is_linear:
-            # For linear trees, include all questions in sequence
-            for question in questions:
-                q_id = question.get('id')
-                if q_id and q_id != start_id:
-                    path.append(q_id)
-            return path
+        Resumes from the stored cursor, so a turn only looks at the questions answered
+        since the last call (normally one) rather than replaying the whole path.
+        """
+        cursor = self._cursor(compiled, collected_data)
+        path = cursor['path']
+        current_id = cursor['current']
         
-        # Follow the branch based on answers (for branching trees)
         while current_id:
-            current_q = question_dict.get(current_id)
-            if not current_q:
-                break
-            
-            # Check if this question has been answered
-            answer = collected_data.get(current_id)
-            
-            # Handle context data - extract actual value
-            if isinstance(answer, dict):
-                if answer.get('from_context') and not answer.get('confirmed'):
-                    # Context value not yet confirmed, stop here
-                    break
-                answer = self._get_actual_value(answer)
+            if not self._is_question_answered(collected_data, current_id):
+                return current_id
             
-            if answer is None:
-                # Not answered yet, stop here
-                break
+            if len(path) >= len(compiled.nodes):
+                # Longer than a path without repeats can be: a cycle (trees saved before validation)
+                print(f"Decision tree {compiled.tree_id}: cycle at '{current_id}', ending the path")
+                cursor['current'] = None
+                return None
             
-            # Check if there's a next question based on the answer
-            next_mapping = current_q.get('next')
-            if next_mapping and isinstance(next_mapping, dict):
-                # Convert answer to string for lookup
-                answer_str = str(answer)
-                next_id = next_mapping.get(answer_str)
-                
-                # Also check for a 'default' path for text/number inputs
-                if not next_id and 'default' in next_mapping:
-                    next_id = next_mapping.get('default')
-                
-                if next_id and next_id in question_dict:
-                    path.append(next_id)
-                    current_id = next_id
-                else:
-                    # No valid next question
-                    break
-            else:
-                # No branching, we're done
-                break
+            next_id = self._next_on_path(compiled, current_id, len(path), collected_data)
+            path.append(current_id)
+            cursor['current'] = current_id = next_id
         
-        return path
+        return None
+    
+    def record_answer(self, collected_data: Dict[str, Any], q_id: str, value: Any):
+        """Store an answer, rewinding the cursor if it changes a question already on the path
+        
+        Answers to the current question need no special handling; use this for anything
+        that may overwrite an earlier answer so the path is re-evaluated from that point.
+        """
+        collected_data[q_id] = value
+        
+        cursor = collected_data.get(CURSOR_KEY)
+        if isinstance(cursor, dict) and q_id in cursor.get('path', []):
+            position = cursor['path'].index(q_id)
+            del cursor['path'][position:]
+            cursor['current'] = q_id
     
     def is_complete(
         self,
@@ -231,36 +342,27 @@ Be flexible with spelling, punctuation, and partial matches. Match based on INTE
     ) -> bool:
         """Check if all required questions in the current branch path are answered"""
         
-        questions = tree.tree_config.get('questions', [])
-        question_dict = {q.get('id'): q for q in questions}
-        tree_config = tree.tree_config
-        
-        # Build the path of questions based on current answers
-        question_path = self._build_question_path(questions, question_dict, collected_data, tree_config)
-        
-        # Check if all questions in the path are answered
-        for q_id in question_path:
-            if not self._is_question_answered(collected_data, q_id):
-                return False
-        
-        # Also check if there's a next question - if yes, we're not complete
-        next_q = self.get_next_question(tree, collected_data)
-        if next_q:
-            return False
-        
-        return True
+        return self._first_unanswered(self.compile(tree), collected_data) is None
     
-    def parse_answer(self, answer_text: str, question_type: str, choices: List[str] = None) -> Any:
-        """Parse customer's natural language answer"""
-        from openai import OpenAI
+    def parse_answer(self, answer_text: str, question_type: str, choices: List[str] = None, question: str = None) -> Any:
+        """Parse customer's natural language answer
+        
+        question (the question text) lets numbers be converted to the unit it asks for.
+        """
         from app.config import settings
+        from app.services.answer_parser import answer_parser
+        from app.services.llm_cache import llm_cache
+        from app.services.llm_gateway import llm_gateway
         import json
         
         print(f"Parsing answer: '{answer_text}' | Type: {question_type} | Choices: {choices}")
         
+        # Plain numbers, yes/no and exact or near-exact choices don't need the LLM
+        local_answer = answer_parser.predict(answer_text, question_type, choices, question)
+        if local_answer is not None:
+            return local_answer
+        
         try:
-            client = OpenAI(api_key=settings.OPENAI_API_KEY)
-            
             if question_type == 'number':
                 prompt = f"Extract the numeric value from: '{answer_text}'. Return JSON: {{\"value\": number}}"
             elif question_type == 'boolean':
@@ -289,7 +391,8 @@ If completely unclear, return {{\"value\": null}}"""
             else:
                 prompt = f"Extract the answer from: '{answer_text}'. Return JSON: {{\"value\": \"text\"}}"
             
-            response = client.chat.completions.create(
+            response = llm_cache.create(
+                llm_gateway.client,
                 model=settings.OPENAI_MODEL,
                 messages=[
                     {"role": "system", "content": "You are a precise answer parser."},
@@ -325,6 +428,39 @@ If completely unclear, return {{\"value\": null}}"""
                 return None
             else:
                 return answer_text
+    
+    def coerce_answer(self, value: Any, question_type: str, choices: List[str] = None) -> Any:
+        """Normalize an answer value extracted elsewhere (e.g. a combined turn analysis) to the question type"""
+        if value is None:
+            return None
+        
+        if question_type == 'number':
+            if isinstance(value, bool):
+                return None
+            try:
+                return float(value)
+            except (TypeError, ValueError):
+                import re
+                match = re.search(r'(\d+(?:\.\d+)?)', str(value))
+                return float(match.group(1)) if match else None
+        elif question_type == 'boolean':
+            if isinstance(value, bool):
+                return value
+            text = str(value).strip().lower()
+            if text in ('yes', 'y', 'true'):
+                return True
+            if text in ('no', 'n', 'false'):
+                return False
+            return None
+        elif question_type == 'choice' and choices:
+            # Only accept one of the offered choices (exact spelling from the tree)
+            for choice in choices:
+                if str(value).strip().lower() == choice.lower():
+                    return choice
+            return None
+        
+        cleaned = str(value).strip()
+        return cleaned or None
 
 
 # Singleton instance
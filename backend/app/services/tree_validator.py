@@ -0,0 +1,148 @@
+from typing import Dict, Any, List
+from app.config import settings
+
+
+class TreeValidator:
+    """Static checks for a decision tree config, run before it is saved
+
+    Follows the same rules as the tree engine at runtime: a tree with no `next`
+    fields at all is linear (every question in list order), otherwise each
+    question leads only where its `next` mapping points and a question without
+    one ends its branch.
+    """
+
+    def validate(self, tree_config: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Returns:
+        {
+            "valid": bool,
+            "errors": ["..."],            # problems that make the tree unusable
+            "warnings": ["..."],          # suspicious but workable
+            "max_path_length": int,       # most questions a customer can be asked (None with cycles)
+            "question_count": int
+        }
+        """
+        questions = [q for q in (tree_config or {}).get('questions') or [] if isinstance(q, dict)]
+        errors: List[str] = []
+        warnings: List[str] = []
+
+        ids = [q.get('id') for q in questions]
+        by_id = {}
+        for q_id, q in zip(ids, questions):
+            if not q_id:
+                errors.append("Every question needs an id")
+            elif q_id in by_id:
+                errors.append(f"Duplicate question id '{q_id}'")
+            else:
+                by_id[q_id] = q
+
+        start_id = (tree_config or {}).get('start_question') or (ids[0] if ids else None)
+        if not questions:
+            errors.append("Tree has no questions")
+        elif start_id not in by_id:
+            errors.append(f"start_question '{start_id}' is not a question id")
+
+        is_linear = all(q.get('next') is None for q in questions)
+        if is_linear:
+            max_path_length = len(by_id)
+        else:
+            edges = {q_id: self._check_branches(q, by_id, errors, warnings) for q_id, q in by_id.items()}
+            max_path_length = None
+            if start_id in by_id:
+                reached, longest, cycles = self._walk(start_id, edges)
+
+                for cycle in cycles:
+                    errors.append(f"Cycle: {' → '.join(cycle)}")
+
+                unreachable = [q_id for q_id in by_id if q_id not in reached]
+                if unreachable:
+                    errors.append(f"Unreachable from '{start_id}': {', '.join(unreachable)}")
+
+                if not cycles:
+                    max_path_length = longest[start_id]
+
+        limit = settings.DECISION_TREE_MAX_PATH_LENGTH
+        if max_path_length and limit and max_path_length > limit:
+            errors.append(f"Longest path asks {max_path_length} questions (limit {limit})")
+
+        return {
+            "valid": not errors,
+            "errors": errors,
+            "warnings": warnings,
+            "max_path_length": max_path_length,
+            "question_count": len(questions)
+        }
+
+    def _check_branches(self, question: Dict[str, Any], by_id: Dict[str, Dict], errors: List[str], warnings: List[str]) -> List[str]:
+        """Check one question's `next` mapping, returning the question ids it can lead to"""
+        q_id = question.get('id')
+        next_mapping = question.get('next')
+        if not next_mapping or not isinstance(next_mapping, dict):
+            return []
+
+        targets = []
+        for answer, target in next_mapping.items():
+            if target not in by_id:
+                errors.append(f"'{q_id}' → '{target}' (for answer '{answer}') is not a question id")
+            elif target not in targets:
+                targets.append(target)
+
+        has_default = 'default' in next_mapping
+        answers = [key for key in next_mapping if key != 'default']
+        q_type = question.get('type')
+
+        if q_type == 'choice' and question.get('choices'):
+            choices = [str(choice) for choice in question['choices']]
+            for answer in answers:
+                if answer not in choices:
+                    errors.append(f"'{q_id}' branches on '{answer}', which is not one of its choices")
+            if not has_default:
+                for choice in choices:
+                    if choice not in next_mapping:
+                        errors.append(f"'{q_id}' has no branch for choice '{choice}' (add it to next or set a 'default')")
+        elif q_type == 'boolean':
+            lowered = {answer.lower() for answer in answers}
+            for answer in answers:
+                if answer.lower() not in ('true', 'false'):
+                    errors.append(f"'{q_id}' branches on '{answer}', but boolean answers are 'true' or 'false'")
+            if not has_default:
+                for value in ('true', 'false'):
+                    if value not in lowered:
+                        errors.append(f"'{q_id}' has no branch for '{value}' (add it to next or set a 'default')")
+        elif not has_default:
+            warnings.append(f"'{q_id}' is a {q_type} question without a 'default' branch; other answers end the path")
+
+        return targets
+
+    def _walk(self, start_id: str, edges: Dict[str, List[str]]):
+        """Depth-first walk from the start: (reached ids, longest path from each id, cycles found)"""
+        VISITING, DONE = 1, 2
+        state = {start_id: VISITING}
+        longest: Dict[str, int] = {}
+        cycles: List[List[str]] = []
+        trail = [start_id]
+        stack = [(start_id, iter(edges[start_id]))]
+
+        while stack:
+            node, children = stack[-1]
+            child = next(children, None)
+
+            if child is None:
+                stack.pop()
+                trail.pop()
+                state[node] = DONE
+                # Children still being visited close a cycle and don't count
+                longest[node] = 1 + max((longest[c] for c in edges[node] if c in longest), default=0)
+                continue
+
+            if state.get(child) == VISITING:
+                cycles.append(trail[trail.index(child):] + [child])
+            elif child not in state:
+                state[child] = VISITING
+                trail.append(child)
+                stack.append((child, iter(edges[child])))
+
+        return set(state), longest, cycles
+
+
+tree_validator = TreeValidator()
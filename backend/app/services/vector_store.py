@@ -1,17 +1,19 @@
 import chromadb
 from chromadb.config import Settings
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from app.config import settings as app_settings
 import uuid
-from openai import OpenAI
+from app.services.embedding_cache import embedding_cache
+from app.services.embedding_backends import EmbeddingBackend, get_embedding_backend
 
 
 class VectorStore:
-    """ChromaDB vector store for fast semantic search using OpenAI embeddings"""
+    """ChromaDB vector store for fast semantic search (OpenAI or local embeddings, see EMBEDDING_BACKEND)"""
     
-    def __init__(self):
-        self.openai_client = OpenAI(api_key=app_settings.OPENAI_API_KEY)
-        self.embedding_model = "text-embedding-ada-002"
+    def __init__(self, backend: EmbeddingBackend = None):
+        self.backend = backend or get_embedding_backend()
+        self.embedding_model = self.backend.model_name
+        self.version = 0  # Bumped on every write in this process (lets derived indexes know they're stale)
         
         self.client = chromadb.PersistentClient(
             path=app_settings.CHROMA_PERSIST_DIR,
@@ -21,25 +23,53 @@ class VectorStore:
             )
         )
         self.collection = self.client.get_or_create_collection(
-            name=app_settings.CHROMA_COLLECTION_NAME,
+            name=self.collection_name(self.backend),
             metadata={"hnsw:space": "cosine"}
         )
     
+    @staticmethod
+    def collection_name(backend: EmbeddingBackend) -> str:
+        """Collection for a backend - the original name for the default OpenAI model, suffixed for the rest"""
+        if backend.name == "openai" and backend.model_name == "text-embedding-ada-002":
+            return app_settings.CHROMA_COLLECTION_NAME
+        return f"{app_settings.CHROMA_COLLECTION_NAME}__{backend.collection_suffix()}"[:63]
+    
     def _get_embedding(self, text: str) -> List[float]:
-        """Generate embedding using OpenAI's text-embedding-ada-002"""
+        """Embed one text with the configured backend (remote results go through the local cache)"""
+        return self._get_embeddings([text])[0]
+    
+    def _get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Embed many texts in as few backend calls as possible
+        
+        For remote backends, texts already in the local embedding cache are not sent
+        again; local backends are cheaper to run than to look up.
+        """
         import logging
         logger = logging.getLogger(__name__)
         
-        text = text.replace("\n", " ")
-        logger.info(f"🤖 Generating embedding using OpenAI model: {self.embedding_model}")
+        texts = [embedding_cache.normalize(text) for text in texts]
         
-        response = self.openai_client.embeddings.create(
-            input=[text],
-            model=self.embedding_model
-        )
+        if not self.backend.remote:
+            return self.backend.embed(texts)
         
-        logger.info(f"✅ Successfully generated embedding with dimension: {len(response.data[0].embedding)}")
-        return response.data[0].embedding
+        use_cache = app_settings.EMBEDDING_CACHE_ENABLED
+        known = embedding_cache.get_many(self.embedding_model, texts) if use_cache else {}
+        
+        # Only embed unique texts that missed the cache
+        missing = list(dict.fromkeys(text for text in texts if text not in known))
+        if known:
+            logger.info(f"⚡ {len(texts) - len(missing)} of {len(texts)} embeddings served from local cache")
+        
+        if missing:
+            logger.info(f"🤖 Generating {len(missing)} embeddings using {self.backend.name} model: {self.embedding_model}")
+            generated = dict(zip(missing, self.backend.embed(missing)))
+            known.update(generated)
+            
+            if use_cache:
+                embedding_cache.put_many(self.embedding_model, generated)
+            
+            logger.info(f"✅ Generated {len(missing)} embeddings")
+        return [known[text] for text in texts]
     
     def add_chunk(
         self,
@@ -47,19 +77,45 @@ class VectorStore:
         content: str,
         metadata: Dict[str, Any]
     ) -> str:
-        """Add a chunk to the vector store with OpenAI embedding"""
-        # Generate embedding using OpenAI
-        embedding = self._get_embedding(content)
-        
-        # Add to ChromaDB collection
-        self.collection.add(
-            ids=[chunk_id],
-            documents=[content],
-            embeddings=[embedding],
-            metadatas=[metadata]
+        """Add a chunk to the vector store with its embedding"""
+        return self.add_chunks([{
+            'id': chunk_id,
+            'content': content,
+            'metadata': metadata
+        }])[0]
+    
+    def add_chunks(
+        self,
+        batch: List[Dict[str, Any]],
+        embeddings: List[List[float]] = None
+    ) -> List[str]:
+        """Add many chunks at once - batched embedding requests and a single ChromaDB write
+        
+        Each item in batch is a dict with keys: id, content, metadata.
+        Pass embeddings to reuse vectors that were already computed for these contents.
+        """
+        if not batch:
+            return []
+        
+        ids = [item['id'] for item in batch]
+        documents = [item['content'] for item in batch]
+        metadatas = [item['metadata'] for item in batch]
+        
+        # Generate embeddings (few requests for the whole batch)
+        if embeddings is None:
+            embeddings = self._get_embeddings(documents)
+        
+        # Write to ChromaDB in one call - upsert so a resumed job can rewrite the
+        # window it stored right before being interrupted
+        self.collection.upsert(
+            ids=ids,
+            documents=documents,
+            embeddings=embeddings,
+            metadatas=metadatas
         )
+        self.version += 1
         
-        return chunk_id
+        return ids
     
     def search(
         self,
@@ -67,8 +123,8 @@ class VectorStore:
         limit: int = 5,
         filters: Dict[str, Any] = None
     ) -> List[Dict[str, Any]]:
-        """Search for similar chunks using OpenAI embeddings"""
-        # Generate query embedding using OpenAI
+        """Search for similar chunks by embedding similarity"""
+        # Generate query embedding
         query_embedding = self._get_embedding(query)
         
         where = filters if filters else None
@@ -93,21 +149,162 @@ class VectorStore:
         
         return formatted_results
     
+    def search_many(
+        self,
+        queries: List[str],
+        limit: int = 5,
+        filters: Dict[str, Any] = None,
+        rrf_k: int = 60
+    ) -> List[Dict[str, Any]]:
+        """Search with several query variations in one round trip and fuse the rankings
+        
+        All queries are embedded in a single request and sent to ChromaDB as one
+        query with multiple query_embeddings. Per-query rankings are merged with
+        reciprocal rank fusion: score = sum(1 / (rrf_k + rank)) over every query a
+        chunk appears in, so chunks that rank well for many variations come first.
+        """
+        # Drop empty and duplicate queries, keeping order
+        queries = list(dict.fromkeys(q for q in queries if q and q.strip()))
+        if not queries:
+            return []
+        
+        query_embeddings = self._get_embeddings(queries)
+        
+        where = filters if filters else None
+        
+        results = self.collection.query(
+            query_embeddings=query_embeddings,
+            n_results=limit,
+            where=where
+        )
+        
+        # Reciprocal rank fusion across the per-query result lists
+        fused = {}
+        for q_idx in range(len(results['ids'] or [])):
+            for rank, chunk_id in enumerate(results['ids'][q_idx]):
+                distance = results['distances'][q_idx][rank] if results.get('distances') else None
+                entry = fused.get(chunk_id)
+                if entry is None:
+                    entry = {
+                        'id': chunk_id,
+                        'content': results['documents'][q_idx][rank],
+                        'metadata': results['metadatas'][q_idx][rank],
+                        'distance': distance,
+                        'rrf_score': 0.0
+                    }
+                    fused[chunk_id] = entry
+                elif distance is not None and (entry['distance'] is None or distance < entry['distance']):
+                    entry['distance'] = distance
+                entry['rrf_score'] += 1.0 / (rrf_k + rank + 1)
+        
+        ranked = sorted(
+            fused.values(),
+            key=lambda item: (-item['rrf_score'], item['distance'] if item['distance'] is not None else float('inf'))
+        )
+        
+        return ranked[:limit]
+    
     def delete_chunk(self, vector_id: str):
         """Delete a chunk from the vector store"""
         self.collection.delete(ids=[vector_id])
+        self.version += 1
     
     def delete_document_chunks(self, document_id: int):
         """Delete all chunks for a document"""
         self.collection.delete(
             where={"document_id": document_id}
         )
+        self.version += 1
+    
+    def delete_chunks(self, chunk_ids: List[str]):
+        """Delete specific chunks by id"""
+        if chunk_ids:
+            self.collection.delete(ids=chunk_ids)
+            self.version += 1
+    
+    def get_document_chunks(self, document_id: int) -> Dict[str, Dict[str, Any]]:
+        """Get the stored chunks of a document: {chunk_id: {'content', 'metadata'}}"""
+        results = self.collection.get(
+            where={"document_id": document_id},
+            include=["documents", "metadatas"]
+        )
+        
+        return {
+            chunk_id: {'content': content, 'metadata': metadata or {}}
+            for chunk_id, content, metadata in zip(
+                results['ids'], results['documents'], results['metadatas']
+            )
+        }
+    
+    def get_chunk(self, chunk_id: str) -> Optional[Dict[str, Any]]:
+        """A stored chunk by id: {'id', 'content', 'metadata'}, None if it no longer exists"""
+        results = self.collection.get(ids=[chunk_id], include=["documents", "metadatas"])
+        if not results['ids']:
+            return None
+        return {'id': chunk_id, 'content': results['documents'][0], 'metadata': results['metadatas'][0] or {}}
+    
+    def copy_document_chunks(
+        self,
+        source_document_id: int,
+        target_document_id: int,
+        target_document_name: str
+    ) -> int:
+        """Copy a document's chunks (text, metadata and embeddings) to another document
+        
+        Used for byte-identical uploads so they don't pay for extraction and embedding again.
+        Returns the number of chunks copied.
+        """
+        results = self.collection.get(
+            where={"document_id": source_document_id},
+            include=["documents", "metadatas", "embeddings"]
+        )
+        
+        if not results['ids']:
+            return 0
+        
+        source_prefix = f"doc_{source_document_id}_"
+        ids = []
+        metadatas = []
+        for chunk_id, metadata in zip(results['ids'], results['metadatas']):
+            ids.append(f"doc_{target_document_id}_{chunk_id[len(source_prefix):]}")
+            metadata = dict(metadata or {})
+            metadata['document_id'] = target_document_id
+            metadata['document_name'] = target_document_name
+            metadata['source'] = f"{target_document_name} chunk {metadata.get('chunk_index', 0) + 1}"
+            metadatas.append(metadata)
+        
+        self.collection.upsert(
+            ids=ids,
+            documents=results['documents'],
+            embeddings=[list(embedding) for embedding in results['embeddings']],
+            metadatas=metadatas
+        )
+        self.version += 1
+        
+        return len(ids)
+    
+    def update_chunks_metadata(self, chunk_ids: List[str], metadatas: List[Dict[str, Any]]):
+        """Replace the metadata of existing chunks without re-embedding them"""
+        if chunk_ids:
+            self.collection.update(ids=chunk_ids, metadatas=metadatas)
+            self.version += 1
+    
+    def get_all_metadata(self) -> Dict[str, Dict[str, Any]]:
+        """Metadata of every stored chunk: {chunk_id: metadata} (no documents or embeddings)"""
+        results = self.collection.get(include=["metadatas"])
+        return {
+            chunk_id: metadata or {}
+            for chunk_id, metadata in zip(results['ids'], results['metadatas'])
+        }
     
     def get_collection_stats(self) -> Dict[str, Any]:
         """Get collection statistics"""
         return {
             "count": self.collection.count(),
-            "name": self.collection.name
+            "name": self.collection.name,
+            "embedding_backend": self.backend.name,
+            "embedding_model": self.embedding_model,
+            "embedding_cache": embedding_cache.stats()
         }
 
 
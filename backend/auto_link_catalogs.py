@@ -1,13 +1,12 @@
 """Auto-link catalog PDFs to products based on filename analysis"""
 from app.database import SessionLocal
 from app.models import Document, ProductDocument, ProductDocumentType
-from openai import OpenAI
-from app.config import settings
+from app.services.llm_gateway import llm_gateway
 import json
 
 def auto_link_all_catalogs():
     db = SessionLocal()
-    client = OpenAI(api_key=settings.OPENAI_API_KEY)
+    client = llm_gateway.client
     
     # Get all documents with "catalog" or "catalogue" in filename
     catalogs = db.query(Document).filter(
@@ -0,0 +1,40 @@
+"""Compute content hashes for documents uploaded before upload deduplication"""
+import os
+from app.database import SessionLocal
+from app.models import Document
+from app.services.file_storage import hash_file
+
+
+def backfill_content_hashes():
+    db = SessionLocal()
+    
+    documents = db.query(Document).filter(Document.content_hash.is_(None)).all()
+    print(f"Found {len(documents)} documents without a content hash")
+    
+    hashed = 0
+    for doc in documents:
+        if not os.path.exists(doc.file_path):
+            print(f"✗ File missing for {doc.original_filename}: {doc.file_path}")
+            continue
+        
+        try:
+            doc.content_hash = hash_file(doc.file_path)
+            hashed += 1
+        except Exception as e:
+            print(f"✗ Error hashing {doc.original_filename}: {str(e)}")
+    
+    db.commit()
+    
+    # Report byte-identical documents
+    seen = {}
+    for doc in db.query(Document).filter(Document.content_hash.isnot(None)).order_by(Document.id).all():
+        if doc.content_hash in seen:
+            print(f"• {doc.original_filename} (#{doc.id}) is identical to #{seen[doc.content_hash]}")
+        else:
+            seen[doc.content_hash] = doc.id
+    
+    db.close()
+    print(f"\nDone! Hashed {hashed} documents")
+
+if __name__ == "__main__":
+    backfill_content_hashes()
@@ -0,0 +1,53 @@
+"""Extract every priced line item for chunks ingested before multi-row extraction"""
+import json
+from app.config import settings
+from app.services.vector_store import vector_store
+from app.services.document_parser import document_parser
+from app.services.ingestion import ingestion_pipeline, call_with_backoff, estimate_tokens
+from app.services.price_index import price_index
+
+
+def backfill_line_items():
+    if settings.EXTRACTION_MODE != "multi_row":
+        print("EXTRACTION_MODE is not 'multi_row' - nothing to do")
+        return
+
+    results = vector_store.collection.get(include=["documents", "metadatas"])
+    pending = [
+        (chunk_id, content, metadata or {})
+        for chunk_id, content, metadata in zip(results['ids'], results['documents'], results['metadatas'])
+        if 'line_item_count' not in (metadata or {})
+    ]
+    print(f"Found {len(pending)} chunks not yet extracted row by row")
+
+    def extract(content):
+        ingestion_pipeline.limiter.acquire(estimate_tokens(content) + 500)
+        return call_with_backoff(document_parser.extract_structured_data, content)
+
+    updated = 0
+    futures = [(chunk_id, metadata, ingestion_pipeline.task_executor.submit(extract, content)) for chunk_id, content, metadata in pending]
+    for chunk_id, metadata, future in futures:
+        try:
+            line_items = future.result().get('line_items')
+        except Exception as e:
+            print(f"✗ Error extracting {chunk_id}: {str(e)}")
+            continue
+
+        if line_items is None:
+            continue
+
+        # A zero count marks chunks without priced rows as done too
+        metadata = dict(metadata)
+        if line_items:
+            metadata['line_items'] = json.dumps(line_items)
+        metadata['line_item_count'] = len(line_items)
+        vector_store.update_chunks_metadata([chunk_id], [metadata])
+        if line_items:
+            updated += 1
+            print(f"✓ {metadata.get('source', chunk_id)}: {len(line_items)} line items")
+
+    price_index.rebuild()
+    print(f"\nDone! Added line items to {updated} chunks")
+
+if __name__ == "__main__":
+    backfill_line_items()
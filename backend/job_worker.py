@@ -0,0 +1,17 @@
+"""Run the document processing job worker as a standalone process
+
+Usage: python job_worker.py
+
+Set JOB_WORKER_ENABLED=false for the API server when processing jobs this way,
+so documents are only processed by dedicated worker processes.
+"""
+from app.database import init_db
+from app.services.job_queue import job_queue
+
+
+if __name__ == "__main__":
+    init_db()
+    try:
+        job_queue.run_forever()
+    except KeyboardInterrupt:
+        print("Worker interrupted")
@@ -0,0 +1,62 @@
+"""Copy the knowledge base into the collection of another embedding backend
+
+Re-embeds every stored chunk (text and metadata are copied as-is) with the target
+backend, e.g. before switching EMBEDDING_BACKEND from openai to hashing:
+
+    python migrate_embeddings.py --from openai --to hashing
+"""
+import argparse
+import time
+from app.config import settings
+from app.services.embedding_backends import get_embedding_backend
+from app.services.vector_store import VectorStore
+from app.services.ingestion import call_with_backoff
+
+
+def migrate_embeddings(source_name: str, target_name: str, batch_size: int = 256, reset: bool = False):
+    source_backend = get_embedding_backend(source_name)
+    target_backend = get_embedding_backend(target_name)
+    source_collection_name = VectorStore.collection_name(source_backend)
+    target_collection_name = VectorStore.collection_name(target_backend)
+
+    if source_collection_name == target_collection_name:
+        print("Source and target use the same collection - nothing to do")
+        return
+
+    target = VectorStore(target_backend)
+    source = target.client.get_collection(source_collection_name)
+
+    if reset and target.collection.count():
+        print(f"Clearing {target_collection_name} ({target.collection.count()} chunks)")
+        target.client.delete_collection(target_collection_name)
+        target = VectorStore(target_backend)
+
+    total = source.count()
+    print(f"Migrating {total} chunks: {source_collection_name} ({source_backend.model_name}) → {target_collection_name} ({target_backend.model_name})")
+
+    started = time.time()
+    migrated = 0
+    for offset in range(0, total, batch_size):
+        page = source.get(include=["documents", "metadatas"], limit=batch_size, offset=offset)
+        batch = [
+            {'id': chunk_id, 'content': content or "", 'metadata': metadata or {}}
+            for chunk_id, content, metadata in zip(page['ids'], page['documents'], page['metadatas'])
+        ]
+        call_with_backoff(target.add_chunks, batch)
+        migrated += len(batch)
+        print(f"  {migrated}/{total}")
+
+    print(f"\nDone! Migrated {migrated} chunks in {time.time() - started:.1f}s")
+    if settings.EMBEDDING_BACKEND != target_name:
+        print(f"Set EMBEDDING_BACKEND={target_name} to search the new collection")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--from", dest="source", default="openai", help="Backend to copy from (default: openai)")
+    parser.add_argument("--to", dest="target", default=settings.EMBEDDING_BACKEND, help="Backend to copy to (default: EMBEDDING_BACKEND)")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--reset", action="store_true", help="Empty the target collection first")
+    args = parser.parse_args()
+
+    migrate_embeddings(args.source, args.target, args.batch_size, args.reset)
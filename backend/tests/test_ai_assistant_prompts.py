@@ -0,0 +1,58 @@
+from types import SimpleNamespace
+import pytest
+from app.services.ai_assistant import ai_assistant
+
+
+PRODUCT_IDS = [
+    "cat_ladder", "court_marking", "glass_partition", "handrail", "skylight",
+    "wood_flooring", "vinyl_flooring", "cork_flooring", "spc_flooring", "lvt_flooring",
+    "staircase", "canopy", "bike_rack", "artificial_grass", "led_lantern",
+]
+
+
+def _system_prompt(request):
+    return request["messages"][0]["content"]
+
+
+@pytest.fixture
+def enquiry():
+    return SimpleNamespace(initial_message="I need a cat ladder", messages=[])
+
+
+def test_product_prompt_lists_full_product_ids(enquiry):
+    prompt = _system_prompt(ai_assistant._detect_product_request("show me the drawing", enquiry))
+    
+    for product_id in PRODUCT_IDS:
+        assert f'- "{product_id}" - ' in prompt
+    assert '{"product": "cat_ladder"}' in prompt
+
+
+def test_quote_intent_prompt_is_intact():
+    prompt = _system_prompt(ai_assistant._quote_intent_request("how much?"))
+    
+    assert 'Return JSON: {"wants_quote": true/false}' in prompt
+    assert "CRITICAL:" in prompt
+    assert "IMPORTANT:" in prompt
+    assert '- "I need a quote for cat ladder installation" → {"wants_quote": true}' in prompt
+
+
+def test_drawing_intent_prompt_is_intact(enquiry):
+    prompt = _system_prompt(ai_assistant._drawing_intent_request("show me", enquiry))
+    
+    assert 'Return JSON: {"wants_drawing": true/false}' in prompt
+    assert "User wants drawing if they:" in prompt
+    assert '- "show me how the ladder looks" → {"wants_drawing": true}' in prompt
+
+
+@pytest.mark.parametrize("build", [
+    lambda enquiry: ai_assistant._quote_intent_request("hi"),
+    lambda enquiry: ai_assistant._drawing_intent_request("hi", enquiry),
+    lambda enquiry: ai_assistant._detect_product_request("hi", enquiry),
+])
+def test_prompt_list_items_keep_their_bullets(build, enquiry):
+    # Every list line of the prompts starts with "- " (a lost indent would cut it off)
+    lines = _system_prompt(build(enquiry)).splitlines()
+    items = [line for line in lines if '→' in line or line.startswith('- ')]
+    
+    assert items
+    assert all(line.startswith('- ') for line in items)
@@ -0,0 +1,84 @@
+import pytest
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import sessionmaker
+from app.models import Base, User, Document, DocumentStatus, ProcessingJob, ProcessingJobItem, JobStatus
+from app.routers import admin, documents
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'app.db'}")
+
+    @event.listens_for(engine, "connect")
+    def enforce_foreign_keys(dbapi_connection, connection_record):
+        dbapi_connection.execute("PRAGMA foreign_keys=ON")
+
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+@pytest.fixture(autouse=True)
+def no_vector_store(monkeypatch):
+    monkeypatch.setattr(documents.vector_store, "delete_document_chunks", lambda document_id: None)
+    monkeypatch.setattr(documents.vector_store.collection, "delete", lambda **kwargs: None)
+
+
+def _processed_document(db, tmp_path, name="prices.txt"):
+    admin_user = db.query(User).first()
+    if admin_user is None:
+        admin_user = User(email="admin@example.com", hashed_password="x")
+        db.add(admin_user)
+        db.commit()
+
+    file_path = tmp_path / name
+    file_path.write_text("ladder 100")
+    document = Document(
+        filename=name, original_filename=name, file_path=str(file_path), file_type="txt",
+        file_size=10, content_hash=name, uploaded_by=admin_user.id, status=DocumentStatus.PROCESSED
+    )
+    job = ProcessingJob(job_type="process", status=JobStatus.COMPLETED, created_by=admin_user.id)
+    db.add_all([document, job])
+    db.flush()
+    db.add(ProcessingJobItem(job_id=job.id, document_id=document.id, status=JobStatus.COMPLETED))
+    db.commit()
+    return document, admin_user
+
+
+def test_delete_processed_document(db, tmp_path):
+    document, admin_user = _processed_document(db, tmp_path)
+
+    documents.delete_document(document.id, admin_user, db)
+
+    assert db.query(Document).count() == 0
+    assert db.query(ProcessingJobItem).count() == 0
+    assert db.query(ProcessingJob).count() == 1
+
+
+def test_admin_delete_processed_document(db, tmp_path):
+    document, admin_user = _processed_document(db, tmp_path)
+
+    admin.delete_document(document.id, admin_user, db)
+
+    assert db.query(Document).count() == 0
+    assert db.query(ProcessingJobItem).count() == 0
+
+
+def test_cleanup_all_processed_documents(db, tmp_path):
+    _processed_document(db, tmp_path, "a.txt")
+    _, admin_user = _processed_document(db, tmp_path, "b.txt")
+
+    documents.cleanup_all_documents(admin_user, db)
+
+    assert db.query(Document).count() == 0
+    assert db.query(ProcessingJobItem).count() == 0
+
+
+def test_database_cascades_job_items(db, tmp_path):
+    document, _ = _processed_document(db, tmp_path)
+
+    db.execute(text("DELETE FROM documents WHERE id = :id"), {"id": document.id})
+    db.commit()
+
+    assert db.query(ProcessingJobItem).count() == 0
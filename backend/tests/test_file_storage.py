@@ -0,0 +1,45 @@
+import zipfile
+import pytest
+from app.config import settings
+from app.services.file_storage import extract_zip_documents, ZipLimitError
+
+
+def _zip(path, members):
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, content in members.items():
+            archive.writestr(name, content)
+    return path
+
+
+def test_extracts_allowed_documents(tmp_path):
+    zip_path = _zip(tmp_path / "docs.zip", {"prices/a.txt": "ladder 100", "b.exe": "x"})
+    upload_dir = tmp_path / "uploads"
+    upload_dir.mkdir()
+
+    stored, skipped = extract_zip_documents(zip_path, upload_dir, ["txt"])
+
+    assert [item["original_filename"] for item in stored] == ["a.txt"]
+    assert [item["filename"] for item in skipped] == ["b.exe"]
+
+
+def test_rejects_archive_with_too_many_members(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "MAX_ZIP_MEMBERS", 2)
+    zip_path = _zip(tmp_path / "docs.zip", {f"{i}.txt": "x" for i in range(3)})
+    upload_dir = tmp_path / "uploads"
+    upload_dir.mkdir()
+
+    with pytest.raises(ZipLimitError):
+        extract_zip_documents(zip_path, upload_dir, ["txt"])
+    assert not any(upload_dir.iterdir())
+
+
+def test_rejects_archive_that_expands_too_far(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "MAX_ZIP_UNCOMPRESSED_SIZE", 1000)
+    # Highly compressible: a few bytes on disk, 2000 once extracted
+    zip_path = _zip(tmp_path / "docs.zip", {"a.txt": "0" * 1000, "b.txt": "0" * 1000})
+    upload_dir = tmp_path / "uploads"
+    upload_dir.mkdir()
+
+    with pytest.raises(ZipLimitError):
+        extract_zip_documents(zip_path, upload_dir, ["txt"])
+    assert not any(upload_dir.iterdir())
@@ -0,0 +1,52 @@
+import pytest
+from app.services.intent_classifier import IntentClassifier
+
+
+@pytest.fixture
+def classifier():
+    return IntentClassifier()
+
+
+@pytest.mark.parametrize("message", [
+    "let me know the price for cat ladder",
+    "show me the price",
+    "can i see the quote",
+    "don't need the drawings, just the price",
+])
+def test_not_confidently_a_drawing_request(classifier, message):
+    assert classifier.predict('wants_drawing', message) is not True
+
+
+@pytest.mark.parametrize("message", [
+    "can i see a drawing",
+    "show me the design",
+    "what does the cat ladder look like",
+    "show me how the ladder looks",
+    "do you have a picture of the canopy",
+])
+def test_drawing_requests(classifier, message):
+    assert classifier.predict('wants_drawing', message) is True
+
+
+@pytest.mark.parametrize("message", [
+    "i want to know more, not a quote yet",
+    "no quote needed, just browsing",
+    "can you give me a rough idea",
+])
+def test_not_confidently_a_quote_request(classifier, message):
+    assert classifier.predict('wants_quote', message) is not True
+
+
+def test_quote_requests(classifier):
+    assert classifier.predict('wants_quote', "give me a quote for parquet sanding") is True
+    assert classifier.predict('wants_quote', "ok", context="Would you like a quote?") is True
+
+
+def test_seed_only_model_defers_to_llm(classifier):
+    assert classifier.predict('wants_quote', "can you give me a rough idea") is None
+
+    for _ in range(5):
+        classifier.record('wants_quote', "can you give me a rough idea", True)
+        classifier.record('wants_quote', "what colours are available", False)
+
+    assert classifier.predict('wants_quote', "can you give me a rough idea") is True
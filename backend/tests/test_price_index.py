@@ -0,0 +1,36 @@
+import threading
+
+from app.services import price_index as price_index_module
+from app.services.price_index import PriceIndex
+
+
+def _metadata(price):
+    return {'chunk_1': {'item_name': 'Aluminium Ladder', 'base_price': price, 'price_unit': 'per metre', 'document_name': 'ladders.pdf'}}
+
+
+def test_first_lookup_builds_then_refreshes_in_background(monkeypatch):
+    store = price_index_module.vector_store
+    metadata = {'value': _metadata(100)}
+    rebuild_started, release_rebuild = threading.Event(), threading.Event()
+
+    def get_all_metadata():
+        if metadata['value']['chunk_1']['base_price'] == 120:
+            rebuild_started.set()
+            release_rebuild.wait(5)
+        return metadata['value']
+
+    monkeypatch.setattr(store, 'get_all_metadata', get_all_metadata)
+    index = PriceIndex()
+
+    assert index.lookup('aluminium ladder')['entry']['price'] == 100
+
+    # A write to the vector store triggers a rebuild that must not block the lookup
+    metadata['value'] = _metadata(120)
+    monkeypatch.setattr(store, 'version', store.version + 1)
+    assert index.lookup('aluminium ladder')['entry']['price'] == 100
+    assert rebuild_started.wait(5)
+
+    release_rebuild.set()
+    with index._rebuild_lock:
+        pass
+    assert index.lookup('aluminium ladder')['entry']['price'] == 120
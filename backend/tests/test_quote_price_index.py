@@ -0,0 +1,113 @@
+from app.services import quote_engine as quote_engine_module
+from app.services.quote_engine import quote_engine
+
+
+ENTRY = {
+    'chunk_id': 'doc1_chunk_0',
+    'item': 'aluminium ladder',
+    'price': 100.0,
+    'unit': 'per metre',
+    'unit_key': 'm',
+    'conditions': ['Price valid for 30 days'],
+    'source': 'ladders.pdf',
+}
+
+
+def _patch(monkeypatch, calls):
+    monkeypatch.setattr(quote_engine_module.price_index, 'lookup', lambda item, material=None: {
+        'entry': ENTRY, 'match': 'exact', 'score': 1.0
+    })
+    monkeypatch.setattr(quote_engine, '_rules_gst_rate', lambda db: 0.09)
+    monkeypatch.setattr(quote_engine_module.vector_store, 'get_chunk', lambda chunk_id: {
+        'id': chunk_id, 'content': 'Safety cage +$500', 'metadata': {}
+    })
+
+    def classify(item_name, collected):
+        calls.append('classify')
+        return {'service_type': 'ladder'}
+
+    def extract(chunk, service_info, collected):
+        calls.append('extract')
+        return {
+            'adjustments': [{'description': 'Safety cage', 'amount': 500, 'type': 'fixed', 'applies_to': 'base'}],
+            'conditions': ['Safety cage required above 3m'],
+            'gst_rate': 0.09,
+        }
+
+    monkeypatch.setattr(quote_engine_module.ai_pricing_service, 'classify_service_type', classify)
+    monkeypatch.setattr(quote_engine_module.ai_pricing_service, 'extract_pricing_adjustments', extract)
+
+
+def test_plain_item_skips_adjustment_steps(monkeypatch):
+    calls = []
+    _patch(monkeypatch, calls)
+
+    quote = quote_engine._quote_from_price_index(None, 'aluminium ladder', {'item': 'aluminium ladder', 'ladder_height': '5'})
+
+    assert calls == []
+    assert quote.total_price == 545.0
+    assert [adj.description for adj in quote.adjustments] == ['GST (9%)']
+
+
+def test_surcharge_fields_keep_adjustments(monkeypatch):
+    calls = []
+    _patch(monkeypatch, calls)
+
+    quote = quote_engine._quote_from_price_index(
+        None, 'aluminium ladder', {'item': 'aluminium ladder', 'ladder_height': '5', 'safety_cage': True}
+    )
+
+    assert calls == ['classify', 'extract']
+    assert quote.total_price == 1090.0
+    assert [adj.description for adj in quote.adjustments] == ['Safety cage', 'GST (9%)']
+    assert 'Safety cage required above 3m' in quote.conditions
+
+
+def test_missing_chunk_defers_to_llm_path(monkeypatch):
+    calls = []
+    _patch(monkeypatch, calls)
+    monkeypatch.setattr(quote_engine_module.vector_store, 'get_chunk', lambda chunk_id: None)
+
+    assert quote_engine._quote_from_price_index(None, 'aluminium ladder', {'item': 'aluminium ladder', 'shop_drawings': True}) is None
+
+
+class FakeSession:
+    def __init__(self, tree):
+        self.tree = tree
+
+    def query(self, model):
+        return self
+
+    def filter(self, *criteria):
+        return self
+
+    def first(self):
+        return self.tree
+
+
+def test_tree_enquiry_quoted_from_index_without_llm(monkeypatch):
+    from app.models import DecisionTree, Enquiry
+
+    calls = []
+    _patch(monkeypatch, calls)
+    monkeypatch.setattr(quote_engine, '_find_relevant_chunks', lambda db, query: [])
+    tree = DecisionTree(id=1, service_name='cat_ladder', display_name='Aluminium Ladder', tree_config={})
+    collected = {
+        'item': 'aluminium ladder',
+        'ladder_height': '5',
+        'material': 'aluminium',
+        'safety_cage': False,
+        'shop_drawings': 'no',
+        'site_address': 'Jurong',
+        'auto_requirements': [{'item': 'landing platform', 'search_terms': ['landing platform'], 'reason': 'height above 6m'}],
+        'auto_conditions': ['Site access to be arranged by customer'],
+        '_tree_cursor': {'index': 4},
+    }
+    enquiry = Enquiry(id=1, service_tree_id=1, collected_data=collected)
+
+    quote = quote_engine._compute_draft_quote(FakeSession(tree), enquiry)
+
+    assert calls == []
+    assert quote.base_price == 100.0
+    assert quote.total_price == 545.0
+    assert 'Site access to be arranged by customer' in quote.conditions
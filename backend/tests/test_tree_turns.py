@@ -0,0 +1,86 @@
+import pytest
+from app.config import settings
+from app.models import DecisionTree, Enquiry, EnquiryMessage
+from app.services.ai_assistant import ai_assistant
+from app.services.tree_engine import tree_engine
+
+
+TREE_CONFIG = {
+    "questions": [
+        {"id": "area", "question": "What is the area (in square meters)?", "type": "number", "required": True},
+        {"id": "finish", "question": "Which finish?", "type": "choice", "choices": ["Matte", "Gloss"], "required": False},
+    ]
+}
+
+
+class FakeSession:
+    def __init__(self, enquiry):
+        self.enquiry = enquiry
+
+    def commit(self):
+        pass
+
+    def expire(self, instance):
+        pass
+
+    def query(self, model):
+        return self
+
+    def filter_by(self, **kwargs):
+        return self
+
+    def first(self):
+        return self.enquiry
+
+
+@pytest.fixture
+def turn(monkeypatch):
+    monkeypatch.setattr(settings, "TREE_TURN_MODE", "combined")
+    monkeypatch.setattr(tree_engine, "parse_answer", lambda *args: pytest.fail("combined mode called parse_answer"))
+    result = {}
+    monkeypatch.setattr(ai_assistant, "_analyze_turn", lambda message, question, context_value=None: result)
+    return result
+
+
+def _enquiry(collected):
+    enquiry = Enquiry(id=1, initial_message="Quote for flooring", collected_data=collected)
+    enquiry.messages = [EnquiryMessage(role="assistant", content="What is the area?")]
+    return enquiry
+
+
+def test_combined_mode_stores_analyzed_answer(turn):
+    turn.update(intent="answer", is_sideways=False, wants_drawing=False, parsed_answer=40.0, confirmed=False)
+    enquiry = _enquiry({})
+    tree = DecisionTree(service_name="flooring", display_name="Flooring", tree_config=TREE_CONFIG)
+
+    response = ai_assistant._process_with_tree(FakeSession(enquiry), enquiry, tree, "40 sqm")
+
+    assert enquiry.collected_data["area"] == 40.0
+    assert response.questions[0].key == "finish"
+
+
+def test_combined_mode_skips_optional_question(turn, monkeypatch):
+    from app.services.rules_engine import rules_engine
+    monkeypatch.setattr(rules_engine, "validate_and_apply_rules", lambda db, service_type, collected: {})
+    monkeypatch.setattr(ai_assistant, "_generate_tree_summary", lambda tree, collected: "Summary")
+    turn.update(intent="skip", is_sideways=False, wants_drawing=False, parsed_answer=None, confirmed=False)
+    enquiry = _enquiry({"area": 40.0})
+    tree = DecisionTree(service_name="flooring", display_name="Flooring", tree_config=TREE_CONFIG)
+
+    response = ai_assistant._process_with_tree(FakeSession(enquiry), enquiry, tree, "not sure")
+
+    assert enquiry.collected_data["finish"] == ""
+    assert response.draft_available
+
+
+def test_combined_mode_answers_sideways_question(turn, monkeypatch):
+    turn.update(intent="answer", is_sideways=True, wants_drawing=False, parsed_answer=None, confirmed=False)
+    monkeypatch.setattr(ai_assistant, "_answer_sideways_question", lambda question, enquiry, db: "We install within two weeks.")
+    enquiry = _enquiry({})
+    tree = DecisionTree(service_name="flooring", display_name="Flooring", tree_config=TREE_CONFIG)
+
+    response = ai_assistant._process_with_tree(FakeSession(enquiry), enquiry, tree, "how long does install take?")
+
+    assert response.message.startswith("We install within two weeks.")
+    assert response.questions[0].key == "area"
+    assert "area" not in enquiry.collected_data
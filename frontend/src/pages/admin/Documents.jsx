@@ -111,6 +111,17 @@ export default function AdminDocuments() {
     }
   };
 
+  // Poll a background processing job until it completes or fails
+  const waitForJob = async (jobId, intervalMs = 2000) => {
+    while (true) {
+      const response = await api.get(`/documents/jobs/${jobId}`);
+      if (response.data.status === 'completed' || response.data.status === 'failed') {
+        return response.data;
+      }
+      await new Promise(resolve => setTimeout(resolve, intervalMs));
+    }
+  };
+
   const handleReprocessAll = async () => {
     if (!confirm('Reprocess all documents to extract pricing data?\n\nThis will re-analyze all documents using AI. It may take a few minutes.')) {
       return;
@@ -122,12 +133,20 @@ export default function AdminDocuments() {
       const response = await api.post('/documents/reprocess-all');
       console.log('Reprocess response:', response.data);
       
-      // Refresh the documents list
+      if (!response.data.job_id) {
+        alert(response.data.message);
+        return;
+      }
+      
+      // Refresh the documents list so they show as processing
       await fetchDocuments();
       
-      const message = `Reprocessed ${response.data.processed_count} of ${response.data.total_documents} documents!`;
-      if (response.data.failed_count) {
-        alert(`${message}\n\nFailed: ${response.data.failed_count} documents`);
+      const job = await waitForJob(response.data.job_id);
+      await fetchDocuments();
+      
+      const message = `Reprocessed ${job.completed_documents} of ${job.total_documents} documents!`;
+      if (job.failed_documents) {
+        alert(`${message}\n\nFailed: ${job.failed_documents} documents`);
       } else {
         alert(message);
       }
@@ -218,7 +237,11 @@ export default function AdminDocuments() {
 
         const processPromises = batch.map(async (doc) => {
           try {
-            await api.post(`/documents/${doc.id}/process`);
+            const response = await api.post(`/documents/${doc.id}/process`);
+            const job = await waitForJob(response.data.id);
+            if (job.status !== 'completed') {
+              throw new Error(job.error_message || 'Processing failed');
+            }
             console.log('Processed document:', doc.id);
             successCount++;
           } catch (err) {
@@ -286,10 +309,18 @@ export default function AdminDocuments() {
             const response = await api.post(`/documents/upload`, formData);
             console.log('File uploaded:', response.data.original_filename);
             
-            // Process the document immediately
-            if (response.data.id) {
+            // Identical to an already processed document - summary and vectors were reused
+            if (response.data.status === 'processed') {
+              console.log('Reused processed data for duplicate upload:', response.data.id);
+              successCount++;
+            } else if (response.data.id) {
+              // Process the document immediately
               try {
-                await api.post(`/documents/${response.data.id}/process`);
+                const processResponse = await api.post(`/documents/${response.data.id}/process`);
+                const job = await waitForJob(processResponse.data.id);
+                if (job.status !== 'completed') {
+                  throw new Error(job.error_message || 'Processing failed');
+                }
                 console.log('Document processed:', response.data.id);
                 successCount++;
               } catch (processError) {